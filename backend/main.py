@@ -13,16 +13,33 @@ print("MODEL PATH FROM ENV AFTER LOADING:", os.getenv("MODEL_PATH"))
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import data_api, predict, chat
+from routers import data_api, predict, chat, chat_ws
 from routes.users import router as users_router
 from routes.orders import router as orders_router
 from routes.chat_history import router as chat_history_router
 from routes.chat_sessions import router as chat_sessions_router  # ← NEW
-from utils.mongo import ensure_indexes
+from routes.images import router as images_router
+from routes.metrics import router as metrics_router, prometheus_router
+from routes.analytics import router as analytics_router
+from utils.mongo import ensure_indexes, db
+from utils.mongo_monitor import command_monitor, RouteContextMiddleware
+from utils.tracing import TracingMiddleware
+from utils.uploads import UploadLimitMiddleware
+from utils.write_buffer import chat_write_buffer
+from utils.retention import retention_loop
+from utils.suggest import popularity_loop
+from utils.jobs import wait_for_jobs
+from utils.prediction_log import prediction_logger
+from utils.embedding_index import embedding_index, wait_for_indexing
+import asyncio
 
 # from routers import data
 app = FastAPI(title="DogBreedChat Backend")
 
+# 413 for oversized image uploads before the body is spooled
+# (added before the CORS middlewares so they wrap it and its 413 carries CORS headers)
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -40,16 +57,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
+# Per-stage timings → Server-Timing header + /metrics histograms
+app.add_middleware(TracingMiddleware)
+
+# Tags every Mongo command with the route that issued it
+# (added last so it wraps TracingMiddleware and the route label is set first)
+app.add_middleware(RouteContextMiddleware)
+
 # app.include_router(data.router, prefix="/api/data", tags=["data"])
 app.include_router(predict.router, prefix="/api/predict", tags=["predict"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
+app.include_router(chat_ws.router, prefix="/api/chat", tags=["chat"])
 app.include_router(data_api.router, prefix="/api/data", tags=["data"])
 app.include_router(users_router)
 app.include_router(orders_router)
 app.include_router(chat_history_router)
 app.include_router(chat_sessions_router)  # ← NEW
+app.include_router(images_router)
+app.include_router(metrics_router)
+app.include_router(prometheus_router)
+app.include_router(analytics_router)
 
 @app.get("/")
 def root():
@@ -57,4 +87,20 @@ def root():
 
 @app.on_event("startup")
 async def startup_event():
-    await ensure_indexes()
\ No newline at end of file
+    command_monitor.attach(asyncio.get_running_loop(), db)
+    await ensure_indexes()
+    chat_write_buffer.start()
+    prediction_logger.start()
+    app.state.retention_task = asyncio.create_task(retention_loop())
+    app.state.suggest_task = asyncio.create_task(popularity_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.retention_task.cancel()
+    app.state.suggest_task.cancel()
+    await chat_write_buffer.stop()
+    await prediction_logger.stop()
+    await wait_for_jobs()
+    await wait_for_indexing()
+    if embedding_index is not None:
+        embedding_index.close()
\ No newline at end of file
@@ -1,103 +1,371 @@
 # backend/models/dog_model.py
-import io
+"""
+Dog breed classifier.
+
+Single mode (default): one model from `model_path`, built as MODEL_ARCH
+and fed MODEL_INPUT px images (normalized unless MODEL_NORMALIZE=0). The
+defaults match the efficientnetv2 checkpoint the app ships with; set
+MODEL_ARCH=mobilenetv3_large_100 MODEL_INPUT=224 MODEL_NORMALIZE=0 for
+the mobilenet one. Checkpoints load strictly: a wrong architecture fails
+at start-up instead of serving a half-random network.
+
+Cascade mode (MODEL_CASCADE=1): a small, fast tier answers when it is
+sure (top-1 confidence and top-1/top-2 margin clear the calibrated
+thresholds) and only uncertain images escalate to the larger tier.
+Thresholds come from CASCADE_CALIBRATION_PATH, written offline by
+scripts/calibrate_cascade.py; answers per tier are exported on /metrics.
+
+Outputs go through one batched head: logits are divided by the tier's
+temperature (fitted offline by scripts/fit_temperature.py, read from
+TEMPERATURE_CALIBRATION_PATH), softmaxed and reduced with torch.topk, so
+only (batch, k) values ever reach the host; breed names come from a
+class-indexed array. Fit temperatures before calibrating the cascade,
+whose thresholds apply to the calibrated probabilities.
+
+Each forward pass also yields the penultimate-layer features (the input
+of the classifier head). The first tier's features, which every image
+gets, are returned as the embedding for the similar-dogs index
+(utils/embedding_index.py).
+"""
 import os
 import json
-from PIL import Image
+import time
+from collections import Counter
+
 import torch
 import torch.nn.functional as F
 import timm
 import numpy as np
-from torchvision import transforms
+
+from models.preprocessing import (
+    IMAGE_SIZE, IMAGENET_MEAN, IMAGENET_STD, INPUT_MEAN, INPUT_SIZE,
+    MODEL_CASCADE, MODEL_INPUT, MODEL_NORMALIZE, load_class_map, load_rgb, rgb_to_array
+)
+from utils.tracing import stage, register_gauge
+from utils.speculative import check_cancelled
+
+MODEL_ARCH = os.getenv("MODEL_ARCH", "efficientnetv2_rw_s")
+# MODEL_INPUT / MODEL_NORMALIZE / MODEL_CASCADE are read in models/preprocessing.py
+MODEL_SMALL_PATH = os.getenv("MODEL_SMALL_PATH", "../models/dog_breed_model_1.pth")
+MODEL_SMALL_ARCH = os.getenv("MODEL_SMALL_ARCH", "mobilenetv3_large_100")
+MODEL_LARGE_PATH = os.getenv("MODEL_LARGE_PATH", "../models/best_top1_90.4645_ep5.pth")
+MODEL_LARGE_ARCH = os.getenv("MODEL_LARGE_ARCH", "efficientnetv2_rw_s")
+MODEL_LARGE_INPUT = int(os.getenv("MODEL_LARGE_INPUT", "384"))
+CASCADE_CALIBRATION_PATH = os.getenv("CASCADE_CALIBRATION_PATH", "../models/cascade_calibration.json")
+# Used until a calibration file exists
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.85"))
+CASCADE_MIN_MARGIN = float(os.getenv("CASCADE_MIN_MARGIN", "0.0"))
+# {"<checkpoint file name>": {"temperature": T, ...}}
+TEMPERATURE_CALIBRATION_PATH = os.getenv("TEMPERATURE_CALIBRATION_PATH", "../models/temperature_calibration.json")
+
+# Every DogModel created, for the /metrics gauges
+_instances = []
+
+
+class ModelTier:
+    """One network of the cascade plus how to feed it."""
+
+    def __init__(self, name: str, arch: str, path: str, input_size: int = IMAGE_SIZE,
+                 normalize: bool = False):
+        self.name = name
+        self.arch = arch
+        self.path = path
+        self.input_size = input_size
+        self.mean = IMAGENET_MEAN if normalize else None
+        self.std = IMAGENET_STD if normalize else None
+        self.model = None  # lazy load
+        self.load_seconds = 0.0
+        # Accept this tier's answer when both clear; the last tier always answers
+        self.min_confidence = 0.0
+        self.min_margin = 0.0
+        # Softmax temperature (1.0 = uncalibrated)
+        self.temperature = 1.0
+
+    @property
+    def takes_default_input(self) -> bool:
+        """True if the INPUT_SHAPE array (models/preprocessing.py) is this tier's input."""
+        return self.input_size == INPUT_SIZE and self.mean == INPUT_MEAN
+
+    def prepare(self, img) -> np.ndarray:
+        return rgb_to_array(img, self.input_size, self.mean, self.std)
 
 
 class DogModel:
-    def __init__(self, model_path: str, class_indices_path: str, device: str = "cpu"):
+    def __init__(self, model_path: str, class_indices_path: str, device: str = "cpu",
+                 cascade: bool = MODEL_CASCADE):
         self.device = torch.device(device)
         self.model_path = model_path
+        _instances.append(self)
 
         # -------------------------------
         # Load class index
         # -------------------------------
-        self.idx2class = self._load_class_map(class_indices_path)
+        self.idx2class = load_class_map(class_indices_path)
+        # Breed name → class index (the similar-dogs index stores indices)
+        self.class2idx = {v: k for k, v in self.idx2class.items()}
         self.num_classes = len(self.idx2class)
+        # Class index → breed name, indexed with the top-k indices in one go.
+        # The head has num_classes outputs (checkpoints load strictly), so
+        # every index it returns is covered
+        self.class_names = np.array(
+            [self.idx2class.get(i, "Unknown") for i in range(max(self.idx2class, default=-1) + 1)],
+            dtype=object
+        )
 
         # -------------------------------
-        # Model config (NEW MODEL)
+        # Model config
         # -------------------------------
-        self.model_name = "mobilenetv3_large_100"
-        self.model = None  # lazy load
+        # Preprocessing (Resize + ToTensor [+ Normalize]) lives in
+        # models/preprocessing.py so the inference client can run it without torch
+        if cascade:
+            self.tiers = [
+                ModelTier("small", MODEL_SMALL_ARCH, MODEL_SMALL_PATH),
+                ModelTier("large", MODEL_LARGE_ARCH, MODEL_LARGE_PATH, MODEL_LARGE_INPUT, normalize=True)
+            ]
+            self._load_calibration(CASCADE_CALIBRATION_PATH)
+        else:
+            self.tiers = [ModelTier("single", MODEL_ARCH, model_path, MODEL_INPUT, normalize=MODEL_NORMALIZE)]
+        self._load_temperatures(TEMPERATURE_CALIBRATION_PATH)
 
-        # -------------------------------
-        # Preprocessing (MobileNetV3)
-        # -------------------------------
-        self.preprocess = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor()
-        ])
+        self.answered_by = Counter()
+
+    @property
+    def model_name(self) -> str:
+        return "+".join(t.arch for t in self.tiers)
+
+    @property
+    def model(self):
+        """First tier's network (None until loaded)."""
+        return self.tiers[0].model
 
     # -------------------------------------------------
-    # Load class index JSON
-    # Expected format:
-    # { "affenpinscher": 0, "afghan_hound": 1, ... }
+    # Cascade thresholds (scripts/calibrate_cascade.py)
     # -------------------------------------------------
-    def _load_class_map(self, path: str):
+    def _load_calibration(self, path: str):
+        small = self.tiers[0]
+        small.min_confidence = CASCADE_MIN_CONFIDENCE
+        small.min_margin = CASCADE_MIN_MARGIN
+
+        if not os.path.exists(path):
+            print(f"⚠️ No cascade calibration at {path}; using confidence ≥ {small.min_confidence}")
+            return
+
         with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+            calib = json.load(f)
+        small.min_confidence = float(calib["min_confidence"])
+        small.min_margin = float(calib.get("min_margin", 0.0))
+        print(f"🔹 Cascade thresholds: confidence ≥ {small.min_confidence:.3f}, "
+              f"margin ≥ {small.min_margin:.3f} (expected escalation "
+              f"{calib.get('escalation_rate', float('nan')):.1%})")
+
+    # -------------------------------------------------
+    # Temperature scaling (scripts/fit_temperature.py)
+    # -------------------------------------------------
+    def _load_temperatures(self, path: str):
+        if not os.path.exists(path):
+            return
 
-        # Convert → {index: breed_name}
-        idx2class = {int(v): k.replace("_", " ") for k, v in data.items()}
-        return idx2class
+        with open(path, "r", encoding="utf-8") as f:
+            calib = json.load(f)
+        for tier in self.tiers:
+            entry = calib.get(os.path.basename(tier.path))
+            if entry:
+                tier.temperature = float(entry["temperature"])
+                print(f"🔹 {tier.name} temperature: {tier.temperature:.3f}")
 
     # -------------------------------------------------
     # Lazy model loader
     # -------------------------------------------------
-    def _load_model(self):
-        if self.model is not None:
+    def _load_tier(self, tier: ModelTier):
+        if tier.model is not None:
             return
 
-        if not os.path.exists(self.model_path):
-            raise FileNotFoundError(f"Model file not found: {self.model_path}")
+        if not os.path.exists(tier.path):
+            raise FileNotFoundError(f"Model file not found: {tier.path}")
 
-        print("🔹 Loading dog breed model...")
+        print(f"🔹 Loading dog breed model ({tier.name}: {tier.arch})...")
+        start = time.perf_counter()
 
         model = timm.create_model(
-            self.model_name,
+            tier.arch,
             pretrained=False,
             num_classes=self.num_classes
         )
 
-        ckpt = torch.load(self.model_path, map_location=self.device)
+        ckpt = torch.load(tier.path, map_location=self.device)
 
         # Support different checkpoint styles
-        state = ckpt.get("state", ckpt) if isinstance(ckpt, dict) else ckpt
-        model.load_state_dict(state, strict=False)
+        state = ckpt
+        if isinstance(ckpt, dict):
+            state = ckpt.get("state", ckpt.get("model_state", ckpt))
+        try:
+            model.load_state_dict(state, strict=True)
+        except RuntimeError as e:
+            # Missing / unexpected keys or shape mismatches: the checkpoint
+            # was trained as a different architecture (or class count)
+            raise RuntimeError(
+                f"Checkpoint {tier.path} does not match {tier.arch} with {self.num_classes} classes "
+                f"(set the tier's *_ARCH env var): {e}"
+            ) from e
 
         model.to(self.device)
         model.eval()
 
-        self.model = model
-        print("✅ Dog breed model loaded successfully")
+        tier.model = model
+        tier.load_seconds = time.perf_counter() - start
+        print(f"✅ Dog breed model loaded successfully in {tier.load_seconds:.1f}s")
+
+    def _load_model(self):
+        for tier in self.tiers:
+            self._load_tier(tier)
+
+    def _run_tier(self, tier: ModelTier, x: np.ndarray) -> np.ndarray:
+        """Full calibrated probability vector for one image (offline scripts)."""
+        logits, _ = self._forward(tier, x)
+        return torch.softmax(logits / tier.temperature, dim=1)[0].cpu().numpy()
+
+    def _forward(self, tier: ModelTier, x: np.ndarray):
+        """(logits, penultimate features) tensors for a (3, H, W) or (B, 3, H, W) array."""
+        if tier.model is None:
+            with stage("model_load"):
+                self._load_tier(tier)
+
+        model = tier.model
+        # from_numpy shares the buffer: no copy of the input
+        batch = torch.from_numpy(x)
+        if batch.ndim == 3:
+            batch = batch.unsqueeze(0)
+
+        with stage(f"inference_{tier.name}"), torch.no_grad():
+            features = model.forward_features(batch.to(self.device))
+            # Same as model(x), split before the classifier (eval: no dropout)
+            embedding = model.forward_head(features, pre_logits=True)
+            return model.get_classifier()(embedding), embedding
+
+    @staticmethod
+    def _head(tier: ModelTier, logits, k: int):
+        """Calibrated softmax + top-k on the tensor side; only (B, k) is copied out."""
+        with stage("output_head"), torch.no_grad():
+            probs = torch.softmax(logits / tier.temperature, dim=1)
+            top_p, top_i = torch.topk(probs, min(k, probs.shape[1]), dim=1)
+            return top_p.cpu().numpy(), top_i.cpu().numpy()
+
+    @staticmethod
+    def _confident(tier: ModelTier, top_p: np.ndarray) -> np.ndarray:
+        """Per row of sorted top-k probabilities: may this tier answer?"""
+        second = top_p[:, 1] if top_p.shape[1] > 1 else 0.0
+        return (top_p[:, 0] >= tier.min_confidence) & (top_p[:, 0] - second >= tier.min_margin)
+
+    def _results(self, top_p: np.ndarray, top_i: np.ndarray, topk: int) -> list[dict]:
+        names = self.class_names[top_i[:topk]]
+        return [{"breed": b, "confidence": p} for b, p in zip(names.tolist(), top_p[:topk].tolist())]
 
     # -------------------------------------------------
     # Predict from image bytes
     # -------------------------------------------------
-    def predict_from_bytes(self, image_bytes: bytes, topk: int = 5):
-        self._load_model()
+    # `cancel` (threading.Event) is set when a speculative run is no
+    # longer wanted; it is checked before the expensive steps.
+    def predict_from_bytes(self, image_bytes: bytes, topk: int = 5, cancel=None):
+        return self.classify_bytes(image_bytes, topk, cancel)[0]
+
+    def classify_bytes(self, image_bytes: bytes, topk: int = 5, cancel=None):
+        """(predictions, answering tier, first-tier embedding)."""
+        with stage("preprocess"):
+            img = load_rgb(image_bytes)
+
+        results, tiers, embeddings = self._cascade(lambda tier, rows: tier.prepare(img)[None], 1, topk, cancel)
+        return results[0], tiers[0], embeddings[0]
+
+    def predict_batch(self, images: list[bytes], topk: int = 5, cancel=None):
+        """
+        predict_from_bytes() for many images: one forward pass per tier.
+        For offline callers; the API and the inference server still
+        classify one image per request.
+        """
+        with stage("preprocess"):
+            imgs = [load_rgb(b) for b in images]
+
+        def inputs(tier: ModelTier, rows):
+            return np.stack([tier.prepare(imgs[r]) for r in rows])
+
+        return self._cascade(inputs, len(imgs), topk, cancel)[0]
+
+    # -------------------------------------------------
+    # Predict from a preprocessed INPUT_SHAPE float32 array
+    # (the inference server passes a view over shared memory).
+    # Tiers that need a different input are fed from `image_bytes()`,
+    # which is only called if such a tier actually runs.
+    # -------------------------------------------------
+    def predict_array(self, x: np.ndarray, topk: int = 5, cancel=None, image_bytes=None):
+        return self.classify_array(x, topk, cancel, image_bytes)[0]
+
+    def classify_array(self, x: np.ndarray, topk: int = 5, cancel=None, image_bytes=None):
+        """predict_array() plus the answering tier and the first-tier embedding."""
+        img = None
+
+        def inputs(tier: ModelTier, rows):
+            nonlocal img
+            if tier.takes_default_input:
+                return x[None]
+            if image_bytes is None:
+                raise ValueError(f"Tier '{tier.name}' needs the source image")
+            if img is None:
+                img = load_rgb(image_bytes())
+            return tier.prepare(img)[None]
+
+        results, tiers, embeddings = self._cascade(inputs, 1, topk, cancel)
+        return results[0], tiers[0], embeddings[0]
+
+    def _cascade(self, inputs, n: int, topk: int, cancel):
+        """
+        Run `n` images through the tiers; `inputs(tier, rows)` returns the
+        (len(rows), 3, H, W) batch for the images still unanswered.
+        Returns (results, answering tier per image, first-tier embeddings).
+        """
+        k = max(topk, 2)  # the cascade looks at the top-2 margin
+        out_p = np.zeros((n, k), dtype=np.float32)
+        out_i = np.zeros((n, k), dtype=np.int64)
+        answered = [None] * n
+        embeddings = None
+
+        pending = np.arange(n)
+        for tier in self.tiers:
+            check_cancelled(cancel)
+            with stage("preprocess"):
+                x = inputs(tier, pending)
+            logits, features = self._forward(tier, x)
+            if embeddings is None:
+                embeddings = features.cpu().numpy()
+
+            top_p, top_i = self._head(tier, logits, k)
+            done = np.ones(len(pending), dtype=bool) if tier is self.tiers[-1] else self._confident(tier, top_p)
+
+            rows = pending[done]
+            out_p[rows, :top_p.shape[1]] = top_p[done]
+            out_i[rows, :top_i.shape[1]] = top_i[done]
+            for r in rows.tolist():
+                answered[r] = tier.name
+
+            pending = pending[~done]
+            if len(pending) == 0:
+                break
 
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        x = self.preprocess(img).unsqueeze(0).to(self.device)
+        self.answered_by.update(answered)
+        width = min(topk, self.num_classes)
+        results = [self._results(out_p[r], out_i[r], width) for r in range(n)]
+        return results, answered, embeddings
 
-        with torch.no_grad():
-            outputs = self.model(x)
-            probs = torch.softmax(outputs, dim=1)[0].cpu().numpy()
 
-        topk_idx = probs.argsort()[-topk:][::-1]
+def _tier_samples(attr):
+    return [
+        ({"model": t.arch, "tier": t.name, "path": os.path.basename(t.path)}, attr(t))
+        for m in _instances for t in m.tiers
+    ]
 
-        results = []
-        for idx in topk_idx:
-            results.append({
-                "breed": self.idx2class.get(int(idx), "Unknown"),
-                "confidence": float(probs[idx])
-            })
 
-        return results
\ No newline at end of file
+register_gauge("dogbreed_model_loaded", "1 once the model weights are in memory",
+               lambda: _tier_samples(lambda t: int(t.model is not None)))
+register_gauge("dogbreed_model_load_seconds", "How long the lazy model load took",
+               lambda: _tier_samples(lambda t: t.load_seconds))
+register_gauge("dogbreed_model_answers", "Predictions answered per cascade tier",
+               lambda: [({"tier": t.name}, m.answered_by[t.name]) for m in _instances for t in m.tiers])
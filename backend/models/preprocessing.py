@@ -0,0 +1,76 @@
+# backend/models/preprocessing.py
+"""
+Torch-free image preprocessing for the breed classifier.
+
+Produces the same float32 CHW array as
+transforms.Compose([Resize((size, size)), ToTensor(), Normalize(...)]) so
+API workers can prepare inputs for the inference server without importing
+torch (along with the class-index map both sides share).
+
+The model input settings live here, not in models/dog_model.py, because
+the API workers and the inference server both read them: INPUT_SHAPE (and
+INPUT_MEAN / INPUT_STD) describe the first tier's input, which the client
+writes into shared memory and the server feeds to that tier as is. That
+is the single model's MODEL_INPUT / MODEL_NORMALIZE, or the cascade's
+small tier (224, no Normalize). Later tiers are prepared from the source
+image.
+"""
+import io
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Single model: defaults match the efficientnetv2 checkpoint the app ships with
+MODEL_INPUT = int(os.getenv("MODEL_INPUT", "384"))
+MODEL_NORMALIZE = os.getenv("MODEL_NORMALIZE", "1") == "1"
+MODEL_CASCADE = os.getenv("MODEL_CASCADE", "0") == "1"
+# The cascade's small (mobilenetv3) tier
+IMAGE_SIZE = 224
+
+# First tier's input: the shared-memory array in remote mode
+INPUT_SIZE, INPUT_NORMALIZE = (IMAGE_SIZE, False) if MODEL_CASCADE else (MODEL_INPUT, MODEL_NORMALIZE)
+INPUT_SHAPE = (3, INPUT_SIZE, INPUT_SIZE)
+INPUT_DTYPE = np.float32
+INPUT_MEAN = IMAGENET_MEAN if INPUT_NORMALIZE else None
+INPUT_STD = IMAGENET_STD if INPUT_NORMALIZE else None
+
+
+def load_class_map(path: str) -> dict[int, str]:
+    """class_indices.json ({"german_shepherd": 12, ...}) → {12: "german shepherd"}."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {int(v): k.replace("_", " ") for k, v in data.items()}
+
+
+def load_rgb(image_bytes: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+
+def rgb_to_array(img: Image.Image, size: int = IMAGE_SIZE, mean=None, std=None,
+                 out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Resize to (size, size) and scale to [0, 1] as a (3, size, size) float32
+    array, then normalize with mean/std when given. When `out` is given
+    (e.g. a view over shared memory) the result is written into it.
+    """
+    # torchvision's Resize on a PIL image is a PIL bilinear resize
+    img = img.resize((size, size), Image.BILINEAR)
+
+    hwc = np.asarray(img, dtype=np.uint8)
+    if out is None:
+        out = np.empty((3, size, size), dtype=INPUT_DTYPE)
+    np.divide(hwc.transpose(2, 0, 1), 255, out=out, casting="unsafe")
+    if mean is not None:
+        out -= np.asarray(mean, dtype=INPUT_DTYPE)[:, None, None]
+        out /= np.asarray(std, dtype=INPUT_DTYPE)[:, None, None]
+    return out
+
+
+def image_to_array(image_bytes: bytes, out: np.ndarray | None = None) -> np.ndarray:
+    """Decode + the first tier's INPUT_SHAPE input."""
+    return rgb_to_array(load_rgb(image_bytes), INPUT_SIZE, INPUT_MEAN, INPUT_STD, out=out)
@@ -1,10 +1,18 @@
 # backend/routers/chat.py
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+import asyncio
 import os
 
-from services.gemini_service import ask_gemini, is_dog_image
+from services.gemini_service import ask_gemini, is_dog_image, summarize_conversation
 from utils.json_loader import JSONStore
-from models.dog_model import DogModel
+from services.inference_client import get_dog_model
+from utils.prediction_log import prediction_logger
+from utils.tracing import stage, register_gauge
+from utils.uploads import read_image_upload, downscale_image
+from utils.speculative import run_gated, GateError
+from utils.chat_memory import chat_memory
+from utils.embedding_index import index_upload
+from utils.suggest import suggest_index
 
 router = APIRouter()
 
@@ -18,7 +26,14 @@ CLASS_IDX = os.getenv("CLASS_INDICES_PATH", "../json_files/class_indices.json")
 MODEL_PATH = os.getenv("MODEL_PATH", "../models/best_top1_90.4645_ep5.pth")
 
 store = JSONStore(BREEDS_JSON, DIETS_JSON, SAMPLE_Q, CLASS_IDX)
-dog_model = DogModel(MODEL_PATH, CLASS_IDX, device="cpu")
+dog_model = get_dog_model(MODEL_PATH, CLASS_IDX)
+chat_memory.summarize = summarize_conversation
+
+register_gauge("dogbreed_json_store_entries", "Breed/diet/sample entries held in memory", lambda: [
+    ({"kind": "breeds"}, len(store.breeds)),
+    ({"kind": "diets"}, len(store.diets)),
+    ({"kind": "sample_questions"}, len(store.sample_questions or []))
+])
 
 # -------------------------------------------------
 # HELPERS
@@ -53,7 +68,9 @@ def is_breed_identification_question(message: str) -> bool:
 @router.post("/message")
 async def chat_message(
     message: str = Form(...),
-    image: UploadFile | None = File(None)
+    image: UploadFile | None = File(None),
+    session_id: str | None = Form(None),
+    user_id: str | None = Form(None)
 ):
     # Swagger bug fix
     if image is not None and isinstance(image, UploadFile) and image.filename == "":
@@ -61,78 +78,146 @@ async def chat_message(
     if isinstance(image, str):
         image = None
 
+    prepared = None
+    if image:
+        with stage("image_read"):
+            raw_bytes, mime_type = await read_image_upload(image)
+
+        # One small JPEG shared by the Gemini check and the classifier
+        with stage("downscale"):
+            prepared = await asyncio.to_thread(downscale_image, raw_bytes, mime_type)
+        del raw_bytes
+
+    return await run_chat_turn(message, prepared, session_id, user_id)
+
+
+async def run_chat_turn(message: str, prepared=None, session_id: str | None = None,
+                        user_id: str | None = None, emit=None):
+    """
+    One chat turn: classify the (downscaled) image if any, then answer.
+    Shared by POST /message and the WebSocket channel (routers/chat_ws.py),
+    which passes `emit(event)` to receive the prediction and the answer
+    chunks as they are produced; it is always called on the event loop.
+    """
+    # Teaches /api/data/suggest which questions people actually ask
+    suggest_index.observe(message)
+
     breed_info = None
     diet_info = None
     predicted_breed = None
     detected_breed_key = None
 
+    # Recent turns, rolling summary and last breed of this conversation
+    memory = None
+    if session_id:
+        with stage("chat_memory"):
+            memory = await chat_memory.get(session_id, current_message=message)
+
     # -------------------------------------------------
     # 🖼️ IMAGE FLOW
     # -------------------------------------------------
-    if image:
-        img_bytes = await image.read()
+    if prepared is not None:
+        img_bytes = prepared.data
+
+        # 1️⃣ Validate dog image (Gemini) while 2️⃣ the breed prediction and
+        # data lookup run speculatively; their result is dropped if not a dog
+        def classify_and_lookup(cancel):
+            with stage("classify"):
+                preds, _, embedding = dog_model.classify_bytes(img_bytes, topk=1, cancel=cancel)
+            if not preds:
+                return preds, embedding, None, None, None
+            breed_key = preds[0]["breed"].lower().replace("_", " ").strip()
+            with stage("store_lookup"):
+                return preds, embedding, breed_key, store.get_breed_info(breed_key), store.get_diet_plan(breed_key)
 
-        # 1️⃣ Validate dog image
         try:
-            is_dog = is_dog_image(img_bytes)
-        except Exception as e:
+            is_dog, speculated = await run_gated(
+                lambda: is_dog_image(img_bytes, prepared.mime_type),
+                classify_and_lookup
+            )
+        except GateError as e:
             raise HTTPException(status_code=500, detail=f"Dog image validation failed: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Breed prediction failed: {e}")
 
         if not is_dog:
+            prediction_logger.log("chat", is_dog=False, user_id=user_id)
+            answer = "It has been detected that the uploaded image is not a dog. Please upload a dog image."
+            if memory:
+                chat_memory.record(memory, message, answer, None)
             return {
                 "predicted_breed": None,
                 "breed_used": None,
-                "answer": "It has been detected that the uploaded image is not a dog. Please upload a dog image.",
+                "answer": answer,
                 "source_data_used": {
                     "breed_provided": False,
                     "diet_provided": False
                 }
             }
 
-        # 2️⃣ Predict breed
-        preds = dog_model.predict_from_bytes(img_bytes, topk=1)
+        preds, embedding, detected_breed_key, breed_info, diet_info = speculated
+        prediction_logger.log("chat", is_dog=True, preds=preds, user_id=user_id)
         if preds:
+            index_upload(img_bytes, embedding, dog_model.class2idx.get(preds[0]["breed"], -1), user_id)
             predicted_breed = preds[0]["breed"]
             confidence = preds[0]["confidence"]
-
-            detected_breed_key = predicted_breed.lower().replace("_", " ").strip()
-            breed_info = store.get_breed_info(detected_breed_key)
-            diet_info = store.get_diet_plan(detected_breed_key)
+            if emit:
+                emit({"type": "prediction", "predicted_breed": predicted_breed,
+                      "confidence": round(confidence, 4)})
 
             # ⭐ IMAGE-SPECIFIC QUESTION → DIRECT ANSWER
             if is_breed_identification_question(message):
+                answer = f"The dog in the image is a {predicted_breed}."
+                if memory:
+                    chat_memory.record(memory, message, answer, detected_breed_key)
                 return {
                     "predicted_breed": predicted_breed,
                     "confidence": round(confidence, 4),
-                    "answer": f"The dog in the image is a {predicted_breed}.",
+                    "answer": answer,
                     "source": "image_classification_model"
                 }
 
     # -------------------------------------------------
     # 📝 TEXT FLOW
     # -------------------------------------------------
-    if not detected_breed_key:
-        detected_breed_key = extract_breed_from_message(message)
+    with stage("store_lookup"):
+        if not detected_breed_key:
+            detected_breed_key = extract_breed_from_message(message)
 
-    if detected_breed_key and not breed_info:
-        breed_info = store.get_breed_info(detected_breed_key)
+        # Follow-up without a breed → the one this conversation is about
+        if not detected_breed_key and memory and memory.last_breed:
+            detected_breed_key = memory.last_breed
 
-    if detected_breed_key and not diet_info:
-        diet_info = store.get_diet_plan(detected_breed_key)
+        if detected_breed_key and not breed_info:
+            breed_info = store.get_breed_info(detected_breed_key)
+
+        if detected_breed_key and not diet_info:
+            diet_info = store.get_diet_plan(detected_breed_key)
 
     # -------------------------------------------------
     # 🤖 GEMINI FALLBACK
     # -------------------------------------------------
+    on_chunk = None
+    if emit:
+        loop = asyncio.get_running_loop()
+        on_chunk = lambda text: loop.call_soon_threadsafe(emit, {"type": "chunk", "text": text})  # noqa: E731
+
     try:
-        answer = ask_gemini(
+        answer = await asyncio.to_thread(
+            ask_gemini,
             message,
             breed_info=breed_info,
             diet_info=diet_info,
-            sample_questions=store.sample_questions
+            sample_questions=store.sample_questions,
+            conversation=memory.context() if memory else None,
+            on_chunk=on_chunk
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini call failed: {e}")
 
+    if memory:
+        chat_memory.record(memory, message, answer, detected_breed_key)
+
     return {
         "predicted_breed": predicted_breed,
         "breed_used": detected_breed_key,
@@ -0,0 +1,194 @@
+# backend/routers/chat_ws.py
+"""
+WebSocket chat channel: /api/chat/ws/{session_id}?user_id=...
+
+One connection per open chat session replaces the three requests of a
+turn over HTTP (save user message, POST /message, save bot message): the
+server answers and persists both messages itself.
+
+Client → server
+    {"type": "message", "message": "...", "image": true|false, "id": any}
+    followed by one binary frame with the image bytes when "image" is true
+    {"type": "ping"}
+
+Server → client (in order, per message; "id" echoed)
+    {"type": "prediction", "predicted_breed": ..., "confidence": ...}   image turns only
+    {"type": "chunk", "text": "..."}                                    0..n, the streamed answer
+    {"type": "done", ...same body as POST /message..., "messages": [user, bot]}
+    {"type": "error", "status": 4xx|5xx, "detail": "..."}
+
+"done" is only sent once both messages are stored (and the session's
+last_message preview updated). Frames that aren't a JSON object (or a
+text frame where the image bytes were expected) get an "error" with
+status 400 and the socket stays open.
+
+Every message saved through this channel is also pushed to the session's
+other open sockets (e.g. a second tab) as {"type": "messages", ...}.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+
+from routers.chat import run_chat_turn
+from utils.mongo import chat_sessions
+from utils.chat_store import append_messages
+from utils.blob_store import put_image, image_urls
+from utils.uploads import check_image_bytes, downscale_image
+from utils.tracing import register_gauge
+
+router = APIRouter()
+
+IMAGE_PLACEHOLDER = "📷 Image uploaded"
+
+# session_id → outboxes of the sockets open on it, for server push
+_sockets: dict[str, set] = defaultdict(set)
+
+
+def broadcast(session_id: str, event: dict, exclude: asyncio.Queue | None = None):
+    """Push an event to every socket open on a session."""
+    for outbox in _sockets.get(session_id, ()):
+        if outbox is not exclude:
+            outbox.put_nowait(event)
+
+
+def _public(doc: dict) -> dict:
+    out = {
+        "role": doc["role"],
+        "message": doc["message"],
+        "created_at": doc["created_at"].isoformat()
+    }
+    if doc.get("image_id"):
+        out.update(image_urls(doc["image_id"]))
+    return out
+
+
+class FrameError(Exception):
+    """A client frame this channel can't read; answered with a 400 error frame."""
+
+
+async def _receive(websocket: WebSocket, kind: str):
+    """Next frame's text or bytes payload, or FrameError if it is the other kind."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    payload = message.get(kind)
+    if payload is None:
+        raise FrameError(f"Expected a {kind} frame")
+    return payload
+
+
+async def _receive_frame(websocket: WebSocket) -> dict:
+    try:
+        frame = json.loads(await _receive(websocket, "text"))
+    except ValueError:
+        raise FrameError("Frame is not valid JSON")
+    if not isinstance(frame, dict):
+        raise FrameError("Frame must be a JSON object")
+    return frame
+
+
+async def _turn(session_id: str, user_id: str, frame: dict, image_bytes: bytes | None, emit) -> dict:
+    message = (frame.get("message") or "").strip()
+
+    prepared, image_id = None, None
+    if image_bytes is not None:
+        mime_type = check_image_bytes(image_bytes)
+        prepared = await asyncio.to_thread(downscale_image, image_bytes, mime_type)
+        try:
+            image_id = await put_image(image_bytes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not message and prepared is None:
+        raise HTTPException(status_code=400, detail="Empty message")
+
+    result = await run_chat_turn(message, prepared, session_id, user_id, emit)
+
+    # Stored before "done" goes out, so a reload right after shows the turn
+    now = datetime.utcnow()
+    docs = [
+        {
+            "user_id": user_id, "session_id": session_id, "role": "user",
+            "message": message or IMAGE_PLACEHOLDER, "image": None, "image_id": image_id,
+            "created_at": now
+        },
+        {
+            "user_id": user_id, "session_id": session_id, "role": "bot",
+            "message": result["answer"], "image": None, "created_at": now
+        }
+    ]
+    if not image_id:
+        docs[0].pop("image_id")
+    await append_messages(session_id, docs)
+    return {**result, "messages": [_public(d) for d in docs]}
+
+
+@router.websocket("/ws/{session_id}")
+async def chat_socket(websocket: WebSocket, session_id: str, user_id: str):
+    if not ObjectId.is_valid(session_id) or not await chat_sessions.find_one(
+            {"_id": ObjectId(session_id), "user_id": user_id}, {"_id": 1}):
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+
+    # One sender per socket, so the answer thread, this loop and broadcasts
+    # from other sockets never interleave frames
+    outbox: asyncio.Queue = asyncio.Queue()
+    _sockets[session_id].add(outbox)
+
+    async def sender():
+        while True:
+            await websocket.send_json(await outbox.get())
+
+    send_task = asyncio.create_task(sender())
+    try:
+        while True:
+            try:
+                frame = await _receive_frame(websocket)
+            except FrameError as e:
+                outbox.put_nowait({"type": "error", "status": 400, "detail": str(e)})
+                continue
+            kind = frame.get("type")
+            if kind == "ping":
+                outbox.put_nowait({"type": "pong"})
+                continue
+            if kind != "message":
+                outbox.put_nowait({"type": "error", "status": 400, "detail": f"Unknown frame type: {kind}"})
+                continue
+
+            turn_id = frame.get("id")
+            try:
+                image_bytes = await _receive(websocket, "bytes") if frame.get("image") else None
+            except FrameError as e:
+                outbox.put_nowait({"type": "error", "status": 400, "detail": str(e), "id": turn_id})
+                continue
+
+            def emit(event: dict):
+                outbox.put_nowait({**event, "id": turn_id})
+
+            try:
+                done = await _turn(session_id, user_id, frame, image_bytes, emit)
+            except HTTPException as e:
+                emit({"type": "error", "status": e.status_code, "detail": e.detail})
+                continue
+            except Exception as e:
+                emit({"type": "error", "status": 500, "detail": str(e)})
+                continue
+
+            emit({"type": "done", **done})
+            broadcast(session_id, {"type": "messages", "messages": done["messages"]}, exclude=outbox)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _sockets[session_id].discard(outbox)
+        if not _sockets[session_id]:
+            _sockets.pop(session_id, None)
+        send_task.cancel()
+
+
+register_gauge("dogbreed_chat_sockets", "Open chat WebSocket connections",
+               lambda: sum(len(s) for s in _sockets.values()))
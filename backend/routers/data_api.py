@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 import os
 from utils.json_loader import JSONStore
+from utils.suggest import suggest_index, SUGGEST_MAX_LIMIT
 
 router = APIRouter()
 
@@ -11,11 +12,20 @@ SAMPLE_Q = os.getenv("SAMPLE_QUESTIONS_PATH", "../json_files/sample_questions/sa
 CLASS_IDX = os.getenv("CLASS_INDICES_PATH", "../json_files/class_indices.json")
 
 store = JSONStore(BREEDS_JSON, DIETS_JSON, SAMPLE_Q, CLASS_IDX)
+suggest_index.build(store.sample_questions, list(store.breeds.keys()))
 
 @router.get("/sample-questions")
 def get_sample_questions():
     return {"questions": store.sample_questions}
 
+# -------------------------
+# TYPEAHEAD
+# -------------------------
+@router.get("/suggest")
+def suggest(q: str = "", limit: int = 8):
+    limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+    return {"query": q, "suggestions": suggest_index.suggest(q, limit)}
+
 @router.get("/all-breeds")
 def get_all_breeds():
     return {"breeds": list(store.breeds.keys())}
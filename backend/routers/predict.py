@@ -1,9 +1,16 @@
 # backend/routers/predict.py
 from fastapi import APIRouter, File, UploadFile, HTTPException
+import asyncio
 import os
 
-from models.dog_model import DogModel
+from services.inference_client import get_dog_model
 from services.gemini_service import is_dog_image   # ✅ NEW IMPORT
+from utils.prediction_log import prediction_logger
+from utils.tracing import stage
+from utils.uploads import read_image_upload, downscale_image
+from utils.speculative import run_gated, GateError
+from utils.embedding_index import embedding_index, index_upload
+from utils.blob_store import image_urls
 
 print("MODEL PATH FROM ENV:", os.getenv("MODEL_PATH"))
 
@@ -12,39 +19,106 @@ router = APIRouter()
 MODEL_PATH = os.getenv("MODEL_PATH", "../models/effnetv2_s_package.zip")
 CLASS_IDX = os.getenv("CLASS_INDICES_PATH", "../json_files/class_indices.json")
 
-# Initialize single global model instance (load on import).
-dog_model = DogModel(MODEL_PATH, CLASS_IDX, device="cpu")
+# One classifier per process, shared with routers/chat.py (or the inference server
+# when INFERENCE_MODE=remote).
+dog_model = get_dog_model(MODEL_PATH, CLASS_IDX)
+
+
+async def _prepare_upload(file: UploadFile):
+    # Read file bytes (size-capped), then one small JPEG for every later step
+    with stage("image_read"):
+        contents, mime_type = await read_image_upload(file)
+
+    with stage("downscale"):
+        return await asyncio.to_thread(downscale_image, contents, mime_type)
 
 
 @router.post("/")
-async def predict(file: UploadFile = File(...), topk: int = 1):
+async def predict(file: UploadFile = File(...), topk: int = 1, user_id: str | None = None):
 
-    # Read file bytes
-    contents = await file.read()
+    image = await _prepare_upload(file)
 
     # --------------------------------------------------------
-    # 🔥 NEW STEP: Validate whether uploaded image is a dog
+    # Dog check (Gemini) and breed prediction run concurrently;
+    # the prediction is thrown away if the image is not a dog
     # --------------------------------------------------------
+    def classify(cancel):
+        with stage("classify"):
+            return dog_model.classify_bytes(image.data, topk=topk, cancel=cancel)
+
     try:
-        dog_check = is_dog_image(contents)
-    except Exception as e:
+        dog_check, classified = await run_gated(
+            lambda: is_dog_image(image.data, image.mime_type),
+            classify
+        )
+    except GateError as e:
         raise HTTPException(status_code=500, detail=f"Dog image validation failed: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     if not dog_check:
+        prediction_logger.log("predict", is_dog=False, user_id=user_id)
         return {
             "is_dog": False,
             "message": "It has been detected that the uploaded image is not a dog. Please upload a dog image."
         }
 
-    # --------------------------------------------------------
-    # If dog → continue with breed prediction
-    # --------------------------------------------------------
+    results, _, embedding = classified
+    prediction_logger.log("predict", is_dog=True, preds=results, user_id=user_id)
+    if results:
+        index_upload(image.data, embedding, dog_model.class2idx.get(results[0]["breed"], -1), user_id)
+
+    return {
+        "is_dog": True,
+        "predictions": results
+    }
+
+# --------------------------------------------------------
+# Similar dogs: nearest previous uploads by image embedding
+# --------------------------------------------------------
+@router.post("/similar")
+async def similar(file: UploadFile = File(...), k: int = 12, user_id: str | None = None,
+                  scope: str = "user"):
+    """
+    `scope=user` searches only `user_id`'s uploads; `global` adds the
+    anonymous ones. Another user's uploads (chat photos included) are
+    never returned.
+    """
+    if embedding_index is None:
+        raise HTTPException(status_code=503, detail="Similar-dog search is disabled")
+    if scope not in ("global", "user"):
+        raise HTTPException(status_code=400, detail="scope must be 'global' or 'user'")
+    if scope == "user" and not user_id:
+        raise HTTPException(status_code=400, detail="user_id is required for scope=user")
+    k = max(1, min(k, 100))
+
+    image = await _prepare_upload(file)
+
     try:
-        results = dog_model.predict_from_bytes(contents, topk=topk)
+        with stage("classify"):
+            results, _, embedding = await asyncio.to_thread(dog_model.classify_bytes, image.data, 1)
+        if embedding is None:
+            raise HTTPException(status_code=503, detail="The classifier returned no embedding")
+
+        with stage("similar_search"):
+            matches = await asyncio.to_thread(
+                embedding_index.search, embedding, k, user_id, scope == "global"
+            )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     return {
-        "is_dog": True,
-        "predictions": results
-    }
\ No newline at end of file
+        "predictions": results,
+        "scope": scope,
+        "results": [
+            {
+                "image_id": key,
+                **image_urls(key),
+                "score": round(score, 4),
+                "breed": dog_model.idx2class.get(class_idx, "Unknown")
+            }
+            for score, key, class_idx in matches
+        ]
+    }
@@ -0,0 +1,59 @@
+# backend/routes/analytics.py
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime, timedelta
+
+from utils.mongo import prediction_rollups
+from utils.prediction_log import CONFIDENCE_BINS, prediction_logger
+
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
+
+
+@router.get("/predictions")
+async def prediction_analytics(days: int = Query(30, ge=1, le=366), top: int = Query(20, ge=1, le=120)):
+    """Breed counts, confidence distribution and not-dog rejections over the last `days` days"""
+    start = (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+    try:
+        cursor = prediction_rollups.find({"_id": {"$gte": start}}).sort("_id", 1)
+        rollups = await cursor.to_list(length=days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    totals = {"total": 0, "dogs": 0, "rejected": 0}
+    breeds: dict[str, int] = {}
+    sources: dict[str, int] = {}
+    confidence = [0] * CONFIDENCE_BINS
+    daily = []
+
+    for day in rollups:
+        for key in totals:
+            totals[key] += day.get(key, 0)
+        for breed, n in day.get("breeds", {}).items():
+            breeds[breed] = breeds.get(breed, 0) + n
+        for source, n in day.get("sources", {}).items():
+            sources[source] = sources.get(source, 0) + n
+        for idx, n in day.get("confidence", {}).items():
+            confidence[int(idx)] += n
+
+        daily.append({
+            "day": day["_id"],
+            "total": day.get("total", 0),
+            "dogs": day.get("dogs", 0),
+            "rejected": day.get("rejected", 0)
+        })
+
+    top_breeds = sorted(breeds.items(), key=lambda kv: kv[1], reverse=True)[:top]
+
+    return {
+        "days": days,
+        **totals,
+        "rejection_rate": round(totals["rejected"] / totals["total"], 4) if totals["total"] else 0.0,
+        "sources": sources,
+        "top_breeds": [{"breed": b, "count": n} for b, n in top_breeds],
+        "confidence_histogram": [
+            {"range": f"{i / CONFIDENCE_BINS:.1f}-{(i + 1) / CONFIDENCE_BINS:.1f}", "count": n}
+            for i, n in enumerate(confidence)
+        ],
+        "daily": daily,
+        "queue": {"queued": prediction_logger.queued, "dropped": prediction_logger.dropped}
+    }
@@ -1,12 +1,33 @@
 # backend/routes/chat_history.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, Response
+from pydantic import BaseModel, Field
+from typing import List
 from datetime import datetime
 from bson import ObjectId
-from utils.mongo import chat_history, chat_sessions
+from utils.mongo import chat_history
+from utils.write_buffer import chat_write_buffer
+from utils.chat_store import append_messages
+from utils.blob_store import put_image, decode_data_url, image_urls
+from utils.pagination import fetch_page, ndjson_response, declare_page_queries, NEXT_CURSOR_HEADER
+from utils.indexes import declare_index
 
 router = APIRouter(prefix="/api/chat-history", tags=["Chat History"])
 
+
+def _user_history(user_id: str) -> dict:
+    return {"user_id": user_id}
+
+
+declare_index("chat_history", [("user_id", 1), ("created_at", 1), ("_id", 1)])
+declare_page_queries("chat_history by user", "chat_history", _user_history("u"))
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_PROJECTION = {
+    "user_id": 1, "session_id": 1, "role": 1,
+    "message": 1, "image": 1, "image_id": 1, "created_at": 1
+}
+
 class ChatMessage(BaseModel):
     user_id: str
     session_id: str  # ← NEW: Required session_id
@@ -14,6 +35,20 @@ class ChatMessage(BaseModel):
     message: str
     image: str | None = None
 
+class ChatTurn(BaseModel):
+    messages: List[ChatMessage] = Field(..., min_length=1, max_length=50)
+
+async def _store_image(doc: dict):
+    """Move an inline data-URL image into the blob store, keep only its hash."""
+    data = decode_data_url(doc.get("image"))
+    if data is None:
+        return
+    try:
+        doc["image_id"] = await put_image(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    doc["image"] = None
+
 @router.post("/")
 async def save_message(msg: ChatMessage):
     try:
@@ -25,34 +60,80 @@ async def save_message(msg: ChatMessage):
             "image": msg.image,
             "created_at": datetime.utcnow()
         }
-        await chat_history.insert_one(doc)
-        
-        # Update session's updated_at and message_count
-        await chat_sessions.update_one(
-            {"_id": ObjectId(msg.session_id)},
-            {
-                "$set": {"updated_at": datetime.utcnow()},
-                "$inc": {"message_count": 1}
-            }
-        )
+        await _store_image(doc)
+
+        # Updates the session's counters / last_message preview and stores
+        # the message in the session's layout (documents or buckets)
+        await append_messages(msg.session_id, [doc])
         
         return {"message": "Chat saved"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/batch", status_code=202)
+async def save_messages(turn: ChatTurn):
+    """
+    Save a whole chat turn (e.g. user message + bot reply) in one request.
+    Messages are queued on the write-behind buffer and persisted in order
+    with the next bulk flush.
+    """
+    for msg in turn.messages:
+        if not ObjectId.is_valid(msg.session_id):
+            raise HTTPException(status_code=400, detail=f"Invalid session_id: {msg.session_id}")
+
+    now = datetime.utcnow()
+    docs = [
+        {
+            "user_id": msg.user_id,
+            "session_id": msg.session_id,
+            "role": msg.role,
+            "message": msg.message,
+            "image": msg.image,
+            "created_at": now
+        }
+        for msg in turn.messages
+    ]
+    for doc in docs:
+        await _store_image(doc)
+    chat_write_buffer.add(docs)
+
+    return {"message": "Chat queued", "count": len(docs)}
+
+def _serialize_chat(chat: dict) -> dict:
+    chat["_id"] = str(chat["_id"])
+    image_id = chat.pop("image_id", None)
+    if image_id:
+        chat.update(image_urls(image_id))
+    return chat
+
+
 @router.get("/user/{user_id}")
-async def get_user_chats(user_id: str):
-    """DEPRECATED: Get all messages for a user (use session-specific endpoint)"""
-    try:
-        cursor = chat_history.find(
-            {"user_id": user_id}
-        ).sort("created_at", 1)
+async def get_user_chats(
+    user_id: str,
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    after: str | None = None,
+    stream: bool = False
+):
+    """
+    DEPRECATED: Get all messages for a user (use session-specific endpoint).
+    Only covers sessions stored as one document per message.
+    """
+    query = _user_history(user_id)
 
-        chats = []
-        async for chat in cursor:
-            chat["_id"] = str(chat["_id"])
-            chats.append(chat)
+    if stream:
+        return ndjson_response(chat_history, query, HISTORY_PROJECTION, serialize=_serialize_chat)
 
-        return chats
+    try:
+        docs, next_cursor = await fetch_page(chat_history, query, HISTORY_PROJECTION, after, limit)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return [_serialize_chat(chat) for chat in docs]
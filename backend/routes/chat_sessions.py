@@ -1,12 +1,43 @@
 # backend/routes/chat_sessions.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel
 from datetime import datetime
 from bson import ObjectId
 from utils.mongo import chat_sessions, chat_history
+from utils.pagination import fetch_page, ndjson_response, ndjson_stream, declare_page_queries, NEXT_CURSOR_HEADER
+from utils.chat_store import (
+    CHAT_STORAGE_MODE, STORAGE_BUCKETS, session_storage,
+    read_bucket_page, iter_bucket_messages, session_messages_query,
+    delete_session_messages, compact_session
+)
+from utils.jobs import start_job, get_job
+from utils.blob_store import image_urls
+from utils.indexes import declare_index, declare_query
+from utils.chat_memory import chat_memory
 
 router = APIRouter(prefix="/api/chat-sessions", tags=["Chat Sessions"])
 
+MESSAGES_PAGE_SIZE = 100
+MESSAGES_MAX_PAGE_SIZE = 500
+MESSAGE_PROJECTION = {"role": 1, "message": 1, "image": 1, "image_id": 1, "created_at": 1}
+
+
+def _last_message_pipeline(session_ids: list[str]) -> list:
+    return [
+        {"$match": {"session_id": {"$in": session_ids}}},
+        {"$sort": {"session_id": 1, "created_at": 1, "_id": 1}},
+        {"$group": {"_id": "$session_id", "message": {"$last": "$message"}}}
+    ]
+
+
+declare_index("chat_sessions", [("user_id", 1), ("updated_at", -1)])
+declare_index("chat_history", [("session_id", 1), ("created_at", 1), ("_id", 1)])
+declare_query("sessions by user", "chat_sessions", {"user_id": "u"}, sort=[("updated_at", -1)])
+declare_query("active sessions of user", "chat_sessions", {"user_id": "u", "is_active": True})
+declare_page_queries("session messages", "chat_history", session_messages_query("s"))
+declare_page_queries("session messages, newest first", "chat_history", session_messages_query("s"), direction=-1)
+declare_query("legacy session previews", "chat_history", pipeline=_last_message_pipeline(["s1", "s2"]))
+
 class CreateSessionRequest(BaseModel):
     user_id: str
     session_name: str
@@ -30,7 +61,8 @@ async def create_session(data: CreateSessionRequest):
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
             "message_count": 0,
-            "is_active": True
+            "is_active": True,
+            "storage": CHAT_STORAGE_MODE
         }
         
         result = await chat_sessions.insert_one(session_doc)
@@ -44,6 +76,21 @@ async def create_session(data: CreateSessionRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _fetch_last_messages(session_ids: list[str]) -> dict:
+    """
+    Last message preview for sessions created before last_message was
+    denormalized onto the session document. One aggregation for all of
+    them, served by the (session_id, created_at) index.
+    """
+    if not session_ids:
+        return {}
+
+    previews = {}
+    async for row in chat_history.aggregate(_last_message_pipeline(session_ids)):
+        previews[row["_id"]] = row.get("message", "")
+    return previews
+
+
 @router.get("/user/{user_id}")
 async def get_user_sessions(user_id: str):
     """Get all chat sessions for a user"""
@@ -52,22 +99,27 @@ async def get_user_sessions(user_id: str):
             {"user_id": user_id}
         ).sort("updated_at", -1)
 
+        raw_sessions = [session async for session in cursor]
+
+        # Legacy sessions have no denormalized preview → one batched lookup
+        missing = [str(s["_id"]) for s in raw_sessions if "last_message" not in s]
+        previews = await _fetch_last_messages(missing)
+
         sessions = []
-        async for session in cursor:
-            # Get last message preview
-            last_message = await chat_history.find_one(
-                {"session_id": str(session["_id"])},
-                sort=[("created_at", -1)]
-            )
-            
+        for session in raw_sessions:
+            session_id = str(session["_id"])
+            last_message = session.get("last_message")
+            if last_message is None:
+                last_message = previews.get(session_id, "")
+
             sessions.append({
-                "_id": str(session["_id"]),
+                "_id": session_id,
                 "session_name": session["session_name"],
                 "created_at": session["created_at"],
                 "updated_at": session["updated_at"],
                 "message_count": session.get("message_count", 0),
                 "is_active": session.get("is_active", False),
-                "last_message": last_message.get("message", "") if last_message else ""
+                "last_message": last_message or ""
             })
 
         return sessions
@@ -75,28 +127,67 @@ async def get_user_sessions(user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _serialize_message(msg: dict) -> dict:
+    serialized = {
+        "_id": str(msg["_id"]),
+        "role": msg["role"],
+        "message": msg["message"],
+        "image": msg.get("image"),
+        "created_at": msg["created_at"]
+    }
+    # Stored attachments: thumbnail inline, full image fetched lazily
+    if msg.get("image_id"):
+        serialized.update(image_urls(msg["image_id"]))
+    return serialized
+
+
 @router.get("/{session_id}/messages")
-async def get_session_messages(session_id: str):
-    """Get all messages for a specific session"""
+async def get_session_messages(
+    session_id: str,
+    response: Response,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_MAX_PAGE_SIZE),
+    after: str | None = None,
+    before: str | None = None,
+    newest: bool = False,
+    stream: bool = False
+):
+    """
+    Get messages for a specific session, oldest first.
+    Pass the X-Next-Cursor header value as `after` to fetch the next page,
+    or `stream=true` to export the whole session as NDJSON.
+
+    `newest=true` returns the latest page instead; its X-Next-Cursor,
+    passed as `before`, fetches the page before it (each page is still
+    oldest first), so a chat view only loads what it shows.
+    """
+    query = session_messages_query(session_id)
+    direction = -1 if newest or before else 1
+    cursor = before if direction == -1 else after
+
     try:
-        cursor = chat_history.find(
-            {"session_id": session_id}
-        ).sort("created_at", 1)
-
-        messages = []
-        async for msg in cursor:
-            messages.append({
-                "_id": str(msg["_id"]),
-                "role": msg["role"],
-                "message": msg["message"],
-                "image": msg.get("image"),
-                "created_at": msg["created_at"]
-            })
+        storage = (await session_storage([session_id]))[session_id]
 
-        return messages
+        if stream:
+            if storage == STORAGE_BUCKETS:
+                return ndjson_stream(iter_bucket_messages(session_id), serialize=_serialize_message)
+            return ndjson_response(chat_history, query, MESSAGE_PROJECTION, serialize=_serialize_message)
+
+        if storage == STORAGE_BUCKETS:
+            docs, next_cursor = await read_bucket_page(session_id, cursor, limit, direction)
+        else:
+            docs, next_cursor = await fetch_page(chat_history, query, MESSAGE_PROJECTION, cursor, limit, direction)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if direction == -1:
+        docs.reverse()
+
+    return [_serialize_message(msg) for msg in docs]
+
 
 @router.put("/{session_id}")
 async def update_session(session_id: str, data: UpdateSessionRequest):
@@ -122,22 +213,52 @@ async def update_session(session_id: str, data: UpdateSessionRequest):
 
 @router.delete("/{session_id}")
 async def delete_session(session_id: str):
-    """Delete a chat session and all its messages"""
+    """
+    Delete a chat session. The session disappears immediately; its messages
+    are removed by a background job whose progress is at /jobs/{job_id}.
+    """
     try:
-        # Delete all messages in this session
-        await chat_history.delete_many({"session_id": session_id})
-        
-        # Delete the session
         result = await chat_sessions.delete_one({"_id": ObjectId(session_id)})
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        return {"message": "Session deleted"}
+        chat_memory.forget(session_id)
+
+        job_id = await start_job(
+            "delete_session", session_id,
+            lambda progress: delete_session_messages(session_id, progress)
+        )
+
+        return {"message": "Session deleted", "job_id": job_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/{session_id}/compact", status_code=202)
+async def compact_session_storage(session_id: str):
+    """Pack a session's messages into bucket documents in the background"""
+    try:
+        job_id = await start_job(
+            "compact_session", session_id,
+            lambda progress: compact_session(session_id, progress)
+        )
+        return {"message": "Compaction started", "job_id": job_id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Progress of a background delete / compaction job"""
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @router.post("/{session_id}/set-active")
 async def set_active_session(session_id: str, user_id: str):
     """Set a session as active for the user"""
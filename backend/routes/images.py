@@ -0,0 +1,53 @@
+# backend/routes/images.py
+import re
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Response
+
+from utils.blob_store import put_image, get_image, image_urls
+
+router = APIRouter(prefix="/api/images", tags=["Images"])
+
+IMAGE_ID = re.compile(r"^[0-9a-f]{64}$")
+
+# Content-addressed → a given URL never changes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.post("/")
+async def upload_image(file: UploadFile = File(...)):
+    """Store an image once per content hash and return its reference"""
+    data = await file.read()
+    try:
+        image_id = await put_image(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"image_id": image_id, **image_urls(image_id)}
+
+
+async def _serve(image_id: str, request: Request, thumbnail: bool):
+    if not IMAGE_ID.match(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{image_id}{"-thumb" if thumbnail else ""}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    blob = await get_image(image_id, thumbnail=thumbnail)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    data, content_type = blob
+    return Response(content=data, media_type=content_type, headers=headers)
+
+
+@router.get("/{image_id}")
+async def get_full_image(image_id: str, request: Request):
+    return await _serve(image_id, request, thumbnail=False)
+
+
+@router.get("/{image_id}/thumb")
+async def get_thumbnail(image_id: str, request: Request):
+    return await _serve(image_id, request, thumbnail=True)
@@ -0,0 +1,32 @@
+# backend/routes/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from utils.mongo_monitor import command_monitor
+from utils.tracing import render_prometheus, register_gauge
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+# Prometheus scrapes the conventional un-prefixed path
+prometheus_router = APIRouter(tags=["Metrics"])
+
+register_gauge("dogbreed_mongo_slow_queries", "Mongo commands slower than MONGO_SLOW_MS since the last reset",
+               lambda: command_monitor.slow_queries)
+
+
+@router.get("/mongo")
+def mongo_metrics():
+    """Per-route Mongo command counts, latency histograms and docs returned"""
+    return command_monitor.snapshot()
+
+
+@router.post("/mongo/reset")
+def reset_mongo_metrics():
+    command_monitor.reset()
+    return {"message": "Mongo metrics reset"}
+
+
+@prometheus_router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage/request latency histograms and gauges in Prometheus text format"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
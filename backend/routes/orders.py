@@ -1,12 +1,26 @@
 # backend/routes/orders.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel
 from typing import List
 from datetime import datetime
 from utils.mongo import orders
+from utils.pagination import fetch_page, ndjson_response, declare_page_queries, NEXT_CURSOR_HEADER
+from utils.indexes import declare_index
 
 router = APIRouter(prefix="/api/orders", tags=["Orders"])
 
+
+def _user_orders(user_id: str) -> dict:
+    return {"user_id": user_id}
+
+
+declare_index("orders", [("user_id", 1), ("created_at", -1), ("_id", -1)])
+declare_page_queries("orders by user", "orders", _user_orders("u"), direction=-1)
+
+ORDERS_PAGE_SIZE = 50
+ORDERS_MAX_PAGE_SIZE = 200
+ORDER_PROJECTION = {"user_id": 1, "items": 1, "total": 1, "created_at": 1, "status": 1}
+
 class OrderItem(BaseModel):
     id: str
     name: str
@@ -36,19 +50,33 @@ async def create_order(order: OrderCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@router.get("/user/{user_id}")
-async def get_user_orders(user_id: str):
-    try:
-        cursor = orders.find(
-            {"user_id": user_id}
-        ).sort("created_at", -1)
+def _serialize_order(order: dict) -> dict:
+    order["_id"] = str(order["_id"])
+    return order
 
-        user_orders = []
-        async for order in cursor:
-            order["_id"] = str(order["_id"])
-            user_orders.append(order)
 
-        return user_orders
+@router.get("/user/{user_id}")
+async def get_user_orders(
+    user_id: str,
+    response: Response,
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
+    before: str | None = None,
+    stream: bool = False
+):
+    """Newest orders first; pass X-Next-Cursor as `before` for older ones."""
+    query = _user_orders(user_id)
+
+    if stream:
+        return ndjson_response(orders, query, ORDER_PROJECTION, direction=-1, serialize=_serialize_order)
 
+    try:
+        docs, next_cursor = await fetch_page(orders, query, ORDER_PROJECTION, before, limit, direction=-1)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return [_serialize_order(order) for order in docs]
@@ -3,9 +3,14 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
 from utils.mongo import users
+from utils.indexes import declare_index, declare_query
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
+# sync_user looks users up (and updates them) by email only
+declare_index("users", "email", unique=True)
+declare_query("users by email", "users", {"email": "a@b.c"})
+
 class UserSyncSchema(BaseModel):
     email: str
     supabase_id: str
@@ -0,0 +1,109 @@
+# backend/scripts/bench_embedding_index.py
+"""
+Benchmark the similar-dogs embedding index (utils/embedding_index.py).
+
+Fills a throwaway index with N random embeddings spread over U users,
+then times bulk and single appends, reopening from disk, and shared
+(whole-array) and per-user top-k search.
+
+    cd backend
+    python scripts/bench_embedding_index.py --vectors 1000000 --users 5000
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+# Don't open the real index on import
+os.environ["EMBEDDING_INDEX"] = "0"
+
+import numpy as np  # noqa: E402
+
+from utils.embedding_index import EmbeddingIndex, EMBEDDING_DIM  # noqa: E402
+
+
+def _keys(start: int, n: int):
+    return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(start, start + n)]
+
+
+def _pct(samples, p):
+    return float(np.percentile(samples, p))
+
+
+def fill(index: EmbeddingIndex, args, rng):
+    start = time.perf_counter()
+    for offset in range(0, args.vectors, args.batch):
+        n = min(args.batch, args.vectors - offset)
+        vectors = rng.standard_normal((n, args.source_dim), dtype=np.float32)
+        users = [f"user-{u}" for u in rng.integers(0, args.users, n)]
+        index.add_many(vectors, _keys(offset, n), rng.integers(0, 120, n), users)
+    return time.perf_counter() - start
+
+
+def time_queries(index: EmbeddingIndex, args, rng, user_id="user-0", shared=False):
+    samples = []
+    for _ in range(args.queries):
+        q = rng.standard_normal(args.source_dim, dtype=np.float32)
+        start = time.perf_counter()
+        index.search(q, args.k, user_id, shared)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--source-dim", type=int, default=1280, help="penultimate width (mobilenetv3: 1280, efficientnetv2_rw_s: 1792)")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="stored width (0 = source width)")
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--dir", default=None, help="index directory (default: a temp dir, removed after)")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="embedding-bench-")
+    rng = np.random.default_rng(0)
+    try:
+        index = EmbeddingIndex(root, dim=args.dim)
+        fill_s = fill(index, args, rng)
+        print(f"bulk append: {args.vectors} vectors in {fill_s:.1f}s "
+              f"({args.vectors / fill_s:,.0f}/s), stored dim={index.dim}")
+
+        single = []
+        for i in range(200):
+            v = rng.standard_normal(args.source_dim, dtype=np.float32)
+            start = time.perf_counter()
+            index.add(v, _keys(args.vectors + i, 1)[0], 0, "user-0")
+            single.append((time.perf_counter() - start) * 1000)
+        print(f"single append: p50={_pct(single, 50):.2f}ms p95={_pct(single, 95):.2f}ms")
+        index.close()
+
+        start = time.perf_counter()
+        index = EmbeddingIndex(root, dim=args.dim)
+        print(f"reopen: {(time.perf_counter() - start) * 1000:.0f}ms for {index.count} vectors")
+
+        size = sum(f.stat().st_size for f in Path(root).iterdir())
+        print(f"on disk: {size / 1e6:.0f} MB ({size / index.count:.0f} B/vector incl. spare capacity)")
+
+        time_queries(index, args, rng, shared=True)  # warm the page cache
+        global_ms = time_queries(index, args, rng, shared=True)
+        print(f"shared top-{args.k}: p50={_pct(global_ms, 50):.1f}ms p95={_pct(global_ms, 95):.1f}ms")
+
+        user_ms = time_queries(index, args, rng)
+        rows = len(index._rows_by_owner.get(index._user_codes["user-0"], []))
+        print(f"per-user top-{args.k} ({rows} rows): p50={_pct(user_ms, 50):.2f}ms p95={_pct(user_ms, 95):.2f}ms")
+        index.close()
+    finally:
+        if not args.dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
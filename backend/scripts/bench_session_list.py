@@ -0,0 +1,95 @@
+# backend/scripts/bench_session_list.py
+"""
+Benchmark GET /api/chat-sessions/user/{user_id} for users with many sessions.
+
+Seeds a throwaway user with N sessions (half legacy, without the denormalized
+last_message) and times get_user_sessions against the configured Mongo.
+
+    cd backend
+    python scripts/bench_session_list.py --sessions 5000 --messages 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+load_dotenv(dotenv_path=BACKEND_DIR / ".env")
+
+from utils.mongo import chat_sessions, chat_history, ensure_indexes  # noqa: E402
+from routes.chat_sessions import get_user_sessions  # noqa: E402
+
+
+async def seed(user_id: str, n_sessions: int, n_messages: int):
+    now = datetime.utcnow()
+    sessions = []
+    for i in range(n_sessions):
+        doc = {
+            "user_id": user_id,
+            "session_name": f"bench session {i}",
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+            "message_count": n_messages,
+            "is_active": False,
+        }
+        # Every other session is "legacy" (no denormalized preview)
+        if i % 2 == 0:
+            doc["last_message"] = f"message {n_messages - 1}"
+            doc["last_message_at"] = now
+        sessions.append(doc)
+
+    result = await chat_sessions.insert_many(sessions)
+
+    messages = []
+    for session_id in result.inserted_ids:
+        for j in range(n_messages):
+            messages.append({
+                "user_id": user_id,
+                "session_id": str(session_id),
+                "role": "user" if j % 2 == 0 else "bot",
+                "message": f"message {j}",
+                "image": None,
+                "created_at": now + timedelta(seconds=j),
+            })
+    if messages:
+        await chat_history.insert_many(messages)
+
+
+async def cleanup(user_id: str):
+    await chat_history.delete_many({"user_id": user_id})
+    await chat_sessions.delete_many({"user_id": user_id})
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    user_id = f"bench-{os.getpid()}"
+    await ensure_indexes()
+    await seed(user_id, args.sessions, args.messages)
+
+    try:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            sessions = await get_user_sessions(user_id)
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        print(f"sessions={len(sessions)} messages/session={args.messages}")
+        print(f"min={timings[0] * 1000:.1f}ms median={timings[len(timings) // 2] * 1000:.1f}ms")
+    finally:
+        await cleanup(user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
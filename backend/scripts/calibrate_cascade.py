@@ -0,0 +1,137 @@
+# backend/scripts/calibrate_cascade.py
+"""
+Calibrate the small → large model cascade (MODEL_CASCADE=1).
+
+Runs both tiers on a labelled validation set laid out as
+<val-dir>/<breed>/<image>, then picks the confidence / margin thresholds
+that escalate the fewest images while keeping cascade accuracy within
+--max-drop of the large model alone. Writes CASCADE_CALIBRATION_PATH,
+which DogModel reads at start-up. Fit temperatures first
+(scripts/fit_temperature.py --cascade): thresholds are picked on the
+calibrated probabilities.
+
+    cd backend
+    python scripts/calibrate_cascade.py --val-dir ../data/val --max-drop 0.005
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "scripts"))
+
+import numpy as np  # noqa: E402
+
+from models.dog_model import DogModel, CASCADE_CALIBRATION_PATH  # noqa: E402
+from models.preprocessing import load_rgb  # noqa: E402
+from val_images import class_index, labelled_paths  # noqa: E402
+
+MARGINS = (0.0, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4)
+
+
+def collect(model: DogModel, val_dir: Path, limit: int):
+    """Per image: small top-1 prob, small margin, small correct, large correct."""
+    class2idx = class_index(model.idx2class)
+    small, large = model.tiers
+
+    rows, ms = [], {small.name: [], large.name: []}
+    skipped = 0
+    for path, label in labelled_paths(val_dir, class2idx):
+        try:
+            img = load_rgb(path.read_bytes())
+        except OSError:
+            skipped += 1
+            continue
+
+        out = {}
+        for tier in (small, large):
+            start = time.perf_counter()
+            out[tier.name] = model._run_tier(tier, tier.prepare(img))
+            ms[tier.name].append((time.perf_counter() - start) * 1000)
+
+        top2 = np.sort(out[small.name])[-2:]
+        rows.append((
+            float(top2[1]),
+            float(top2[1] - top2[0]),
+            int(out[small.name].argmax()) == label,
+            int(out[large.name].argmax()) == label
+        ))
+        if limit and len(rows) >= limit:
+            break
+
+    return np.array(rows), ms, skipped
+
+
+def search(rows: np.ndarray, max_drop: float):
+    conf, margin = rows[:, 0], rows[:, 1]
+    small_ok, large_ok = rows[:, 2].astype(bool), rows[:, 3].astype(bool)
+    floor = large_ok.mean() - max_drop
+
+    best = None
+    for min_conf in np.unique(np.round(conf, 3)):
+        for min_margin in MARGINS:
+            accept = (conf >= min_conf) & (margin >= min_margin)
+            accuracy = np.where(accept, small_ok, large_ok).mean()
+            escalation = 1 - accept.mean()
+            if accuracy >= floor and (best is None or escalation < best["escalation_rate"]):
+                best = {
+                    "min_confidence": float(min_conf),
+                    "min_margin": float(min_margin),
+                    "escalation_rate": float(escalation),
+                    "accuracy": float(accuracy)
+                }
+
+    # Nothing reaches the floor → always escalate
+    return best or {"min_confidence": 1.01, "min_margin": 0.0, "escalation_rate": 1.0,
+                    "accuracy": float(large_ok.mean())}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--val-dir", required=True)
+    parser.add_argument("--class-idx", default=os.getenv("CLASS_INDICES_PATH", "../json_files/class_indices.json"))
+    parser.add_argument("--max-drop", type=float, default=0.005,
+                        help="accuracy the cascade may lose vs the large model alone")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--out", default=CASCADE_CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    model = DogModel("", args.class_idx, device="cpu", cascade=True)
+    rows, ms, skipped = collect(model, Path(args.val_dir), args.limit)
+    if len(rows) == 0:
+        sys.exit("No labelled images found")
+
+    result = search(rows, args.max_drop)
+    small_ms = float(np.median(ms["small"]))
+    large_ms = float(np.median(ms["large"]))
+    result.update({
+        "small_accuracy": float(rows[:, 2].mean()),
+        "large_accuracy": float(rows[:, 3].mean()),
+        "max_drop": args.max_drop,
+        "images": int(len(rows)),
+        "small_ms_p50": small_ms,
+        "large_ms_p50": large_ms,
+        "expected_ms": small_ms + result["escalation_rate"] * large_ms,
+        "calibrated_at": datetime.utcnow().isoformat() + "Z"
+    })
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"images={result['images']} (skipped {skipped})")
+    print(f"small acc={result['small_accuracy']:.2%} @ {small_ms:.1f}ms, "
+          f"large acc={result['large_accuracy']:.2%} @ {large_ms:.1f}ms")
+    print(f"cascade: confidence ≥ {result['min_confidence']:.3f}, margin ≥ {result['min_margin']:.2f} → "
+          f"acc={result['accuracy']:.2%}, escalation={result['escalation_rate']:.1%}, "
+          f"~{result['expected_ms']:.1f}ms/image")
+    print(f"✅ Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
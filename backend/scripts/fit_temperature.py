@@ -0,0 +1,166 @@
+# backend/scripts/fit_temperature.py
+"""
+Fit softmax temperature scaling for the breed classifier.
+
+Runs every model tier on a labelled validation set laid out as
+<val-dir>/<breed>/<image>, then picks, per checkpoint, the temperature T
+that minimizes the negative log-likelihood of softmax(logits / T). Writes
+TEMPERATURE_CALIBRATION_PATH (merged with entries for other checkpoints),
+which DogModel reads at start-up.
+
+Run it before scripts/calibrate_cascade.py: the cascade thresholds apply
+to the calibrated probabilities.
+
+    cd backend
+    python scripts/fit_temperature.py --val-dir ../data/val            # MODEL_PATH
+    python scripts/fit_temperature.py --val-dir ../data/val --cascade  # both cascade tiers
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "scripts"))
+
+import numpy as np  # noqa: E402
+
+from models.dog_model import DogModel, TEMPERATURE_CALIBRATION_PATH  # noqa: E402
+from models.preprocessing import load_rgb  # noqa: E402
+from val_images import class_index, labelled_paths  # noqa: E402
+
+ECE_BINS = 15
+LOG_T_RANGE = (np.log(0.05), np.log(20.0))
+
+
+def labelled_images(val_dir: Path, class2idx: dict, limit: int):
+    n = 0
+    for path, label in labelled_paths(val_dir, class2idx):
+        try:
+            img = load_rgb(path.read_bytes())
+        except OSError:
+            continue
+        yield img, label
+        n += 1
+        if limit and n >= limit:
+            return
+
+
+def collect_logits(model: DogModel, val_dir: Path, batch_size: int, limit: int):
+    """{tier name: (N, C) float64 logits}, (N,) labels."""
+    class2idx = class_index(model.idx2class)
+    logits = {t.name: [] for t in model.tiers}
+    labels, batch = [], []
+
+    def flush():
+        for tier in model.tiers:
+            out, _ = model._forward(tier, np.stack([tier.prepare(img) for img in batch]))
+            logits[tier.name].append(out.cpu().numpy().astype(np.float64))
+        batch.clear()
+
+    for img, label in labelled_images(val_dir, class2idx, limit):
+        batch.append(img)
+        labels.append(label)
+        if len(batch) == batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if not labels:
+        return {}, np.array([], dtype=np.int64)
+    return {k: np.concatenate(v) for k, v in logits.items()}, np.array(labels)
+
+
+def _log_softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    return z - np.log(np.exp(z).sum(axis=1, keepdims=True))
+
+
+def nll(logits: np.ndarray, labels: np.ndarray, t: float) -> float:
+    return float(-_log_softmax(logits / t)[np.arange(len(labels)), labels].mean())
+
+
+def ece(logits: np.ndarray, labels: np.ndarray, t: float) -> float:
+    """Expected calibration error of the top-1 confidence."""
+    probs = np.exp(_log_softmax(logits / t))
+    conf, pred = probs.max(axis=1), probs.argmax(axis=1)
+    correct = pred == labels
+    bins = np.minimum((conf * ECE_BINS).astype(int), ECE_BINS - 1)
+    total = 0.0
+    for b in range(ECE_BINS):
+        mask = bins == b
+        if mask.any():
+            total += mask.mean() * abs(conf[mask].mean() - correct[mask].mean())
+    return float(total)
+
+
+def fit(logits: np.ndarray, labels: np.ndarray, iters: int = 60) -> float:
+    """Golden-section search on log T (NLL is unimodal in T)."""
+    lo, hi = LOG_T_RANGE
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+    fa, fb = nll(logits, labels, np.exp(a)), nll(logits, labels, np.exp(b))
+    for _ in range(iters):
+        if fa < fb:
+            hi, b, fb = b, a, fa
+            a = hi - ratio * (hi - lo)
+            fa = nll(logits, labels, np.exp(a))
+        else:
+            lo, a, fa = a, b, fb
+            b = lo + ratio * (hi - lo)
+            fb = nll(logits, labels, np.exp(b))
+    return float(np.exp((lo + hi) / 2))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--val-dir", required=True)
+    parser.add_argument("--model-path", default=os.getenv("MODEL_PATH", "../models/effnetv2_s_package.zip"))
+    parser.add_argument("--class-idx", default=os.getenv("CLASS_INDICES_PATH", "../json_files/class_indices.json"))
+    parser.add_argument("--cascade", action="store_true", help="fit both cascade tiers instead of MODEL_PATH")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--out", default=TEMPERATURE_CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    model = DogModel(args.model_path, args.class_idx, device="cpu", cascade=args.cascade)
+    logits, labels = collect_logits(model, Path(args.val_dir), args.batch_size, args.limit)
+    if len(labels) == 0:
+        sys.exit("No labelled images found")
+
+    out_path = Path(args.out)
+    calib = {}
+    if out_path.exists():
+        with open(out_path, "r", encoding="utf-8") as f:
+            calib = json.load(f)
+
+    for tier in model.tiers:
+        z = logits[tier.name]
+        t = fit(z, labels)
+        entry = {
+            "temperature": t,
+            "tier": tier.name,
+            "arch": tier.arch,
+            "images": int(len(labels)),
+            "accuracy": float((z.argmax(axis=1) == labels).mean()),
+            "nll_before": nll(z, labels, 1.0),
+            "nll_after": nll(z, labels, t),
+            "ece_before": ece(z, labels, 1.0),
+            "ece_after": ece(z, labels, t),
+            "fitted_at": datetime.utcnow().isoformat() + "Z"
+        }
+        calib[os.path.basename(tier.path)] = entry
+        print(f"{tier.name} ({tier.arch}): T={t:.3f}  NLL {entry['nll_before']:.4f} → {entry['nll_after']:.4f}  "
+              f"ECE {entry['ece_before']:.2%} → {entry['ece_after']:.2%}  (acc {entry['accuracy']:.2%})")
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(calib, f, indent=2)
+    print(f"✅ Wrote {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# backend/scripts/load_test.py
+"""
+Load test for the session, history, order and user routes.
+
+Runs the data-layer routers in-process (no torch / Gemini) against the
+in-memory Mongo backend by default, seeds it, then drives a weighted mix of
+requests from --concurrency workers for --duration seconds and reports
+per-endpoint throughput and latency percentiles.
+
+    cd backend
+    python scripts/load_test.py --users 1000 --sessions 10000 --messages 200000
+    MONGO_BACKEND=motor MONGO_URI=mongodb://localhost:27017 \\
+        MONGO_DB_NAME=dog_project_load python scripts/load_test.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "scripts"))
+os.environ.setdefault("MONGO_BACKEND", "memory")
+
+from fastapi import FastAPI  # noqa: E402
+
+from routes.users import router as users_router  # noqa: E402
+from routes.orders import router as orders_router  # noqa: E402
+from routes.chat_history import router as chat_history_router  # noqa: E402
+from routes.chat_sessions import router as chat_sessions_router  # noqa: E402
+from utils.mongo import ensure_indexes, MONGO_BACKEND  # noqa: E402
+from utils.write_buffer import chat_write_buffer  # noqa: E402
+from seed_data import seed  # noqa: E402
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(users_router)
+    app.include_router(orders_router)
+    app.include_router(chat_history_router)
+    app.include_router(chat_sessions_router)
+    return app
+
+
+async def call(app, method: str, path: str, query: str = "", body=None) -> int:
+    """Invoke the ASGI app directly and return the response status."""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"loadtest"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode())
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("loadtest", 80)
+    }
+    body_sent = False
+    status = 0
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Nothing more to read; wait like an idle client until cancelled
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def scenarios(ids: dict, rng: random.Random):
+    """(name, weight, request factory) — factories return call() args."""
+    def user():
+        return rng.choice(ids["user_ids"])
+
+    def session():
+        return rng.choice(ids["session_ids"])
+
+    def message(role):
+        return {"user_id": user(), "session_id": session(), "role": role, "message": "how much should a beagle eat"}
+
+    return [
+        ("GET sessions by user", 25, lambda: ("GET", f"/api/chat-sessions/user/{user()}", "", None)),
+        ("GET session messages", 30, lambda: ("GET", f"/api/chat-sessions/{session()}/messages", "limit=100", None)),
+        ("GET history by user", 5, lambda: ("GET", f"/api/chat-history/user/{user()}", "limit=100", None)),
+        ("GET orders by user", 10, lambda: ("GET", f"/api/orders/user/{user()}", "", None)),
+        ("POST chat message", 15, lambda: ("POST", "/api/chat-history/", "", message("user"))),
+        ("POST chat turn", 10, lambda: ("POST", "/api/chat-history/batch", "",
+                                        {"messages": [message("user"), message("bot")]})),
+        ("POST users sync", 5, lambda: ("POST", "/api/users/sync", "",
+                                        {"email": f"{user()}@example.com", "supabase_id": user()})),
+    ]
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+async def run(app, ids: dict, concurrency: int, duration: float, rng: random.Random):
+    mix = scenarios(ids, rng)
+    names = [m[0] for m in mix]
+    weights = [m[1] for m in mix]
+    factories = {m[0]: m[2] for m in mix}
+
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, query, body = factories[name]()
+            start = time.perf_counter()
+            try:
+                status = await call(app, method, path, query, body)
+            except Exception:
+                status = 599
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            if status >= 400:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(latencies: dict, errors: dict, elapsed: float):
+    print(f"\n{'endpoint':<24}{'reqs':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    total = 0
+    for name, values in latencies.items():
+        values.sort()
+        total += len(values)
+        print(f"{name:<24}{len(values):>8}{len(values) / elapsed:>10.1f}"
+              f"{percentile(values, 0.50):>10.2f}{percentile(values, 0.95):>10.2f}"
+              f"{percentile(values, 0.99):>10.2f}{errors[name]:>8}")
+    print(f"{'total':<24}{total:>8}{total / elapsed:>10.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    app = build_app()
+    await ensure_indexes()
+
+    start = time.perf_counter()
+    ids = await seed(args.users, args.sessions, args.messages, seed_value=args.seed)
+    print(f"backend={MONGO_BACKEND} seeded {args.users} users / {args.sessions} sessions / "
+          f"{args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+    chat_write_buffer.start()
+    try:
+        latencies, errors, elapsed = await run(app, ids, args.concurrency, args.duration, random.Random(args.seed))
+    finally:
+        await chat_write_buffer.stop()
+
+    report(latencies, errors, elapsed)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
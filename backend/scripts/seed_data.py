@@ -0,0 +1,159 @@
+# backend/scripts/seed_data.py
+"""
+Seed realistic volumes of users, chat sessions, messages and orders.
+
+Works against whichever backend utils.mongo selects; with MONGO_BACKEND=memory
+the data only lives as long as the process, so scripts/load_test.py calls
+seed() in-process.
+
+    cd backend
+    MONGO_URI=mongodb://localhost:27017 MONGO_DB_NAME=dog_project_seed \\
+        python scripts/seed_data.py --users 10000 --sessions 100000 --messages 2000000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from utils.mongo import users, chat_sessions, chat_history, orders  # noqa: E402
+from utils.chat_store import CHAT_STORAGE_MODE  # noqa: E402
+
+BATCH = 5000
+
+WORDS = (
+    "dog breed puppy diet food training grooming exercise labrador beagle "
+    "husky poodle senior adult how much often should my what is the best"
+).split()
+
+PRODUCTS = [
+    ("p1", "Chew Toy", 9.99), ("p2", "Dog Food 5kg", 39.5), ("p3", "Leash", 14.0),
+    ("p4", "Dog Bed", 59.0), ("p5", "Shampoo", 11.25)
+]
+
+
+def _sentence(rng: random.Random, low: int = 4, high: int = 30) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _split(total: int, parts: int, rng: random.Random) -> list[int]:
+    """Skewed split of `total` into `parts` (a few heavy users, many light)."""
+    if parts == 0:
+        return []
+    weights = [rng.paretovariate(1.5) for _ in range(parts)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    for i in range(total - sum(counts)):
+        counts[i % parts] += 1
+    return counts
+
+
+async def _flush(collection, docs: list):
+    if docs:
+        await collection.insert_many(docs, ordered=False)
+        docs.clear()
+
+
+async def seed(n_users: int = 1000, n_sessions: int = 10000, n_messages: int = 100000,
+               orders_per_user: int = 3, seed_value: int = 42) -> dict:
+    """Insert the data set and return the ids a load test needs."""
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+
+    user_ids = [f"seed-user-{i}" for i in range(n_users)]
+    await users.insert_many([
+        {"email": f"{uid}@example.com", "supabase_id": uid, "created_at": now}
+        for uid in user_ids
+    ], ordered=False)
+
+    sessions_per_user = _split(n_sessions, n_users, rng)
+    messages_per_session = _split(n_messages, n_sessions, rng)
+
+    session_ids = []
+    session_docs, message_docs, order_docs = [], [], []
+    s = 0
+    for uid, n_user_sessions in zip(user_ids, sessions_per_user):
+        for _ in range(n_user_sessions):
+            session_id = ObjectId()
+            started = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            count = messages_per_session[s]
+            s += 1
+
+            last = None
+            for j in range(count):
+                last = {
+                    "user_id": uid,
+                    "session_id": str(session_id),
+                    "role": "user" if j % 2 == 0 else "bot",
+                    "message": _sentence(rng),
+                    "image": None,
+                    "created_at": started + timedelta(seconds=30 * j)
+                }
+                message_docs.append(last)
+                if len(message_docs) >= BATCH:
+                    await _flush(chat_history, message_docs)
+
+            session_docs.append({
+                "_id": session_id,
+                "user_id": uid,
+                "session_name": _sentence(rng, 2, 5),
+                "created_at": started,
+                "updated_at": last["created_at"] if last else started,
+                "message_count": count,
+                "last_message": last["message"] if last else "",
+                "is_active": False,
+                "storage": CHAT_STORAGE_MODE
+            })
+            session_ids.append(str(session_id))
+            if len(session_docs) >= BATCH:
+                await _flush(chat_sessions, session_docs)
+
+        for _ in range(orders_per_user):
+            items = [
+                {"id": pid, "name": name, "price": price, "quantity": rng.randint(1, 3), "image": ""}
+                for pid, name, price in rng.sample(PRODUCTS, rng.randint(1, 3))
+            ]
+            order_docs.append({
+                "user_id": uid,
+                "items": items,
+                "total": round(sum(i["price"] * i["quantity"] for i in items), 2),
+                "created_at": now - timedelta(days=rng.randint(0, 365)),
+                "status": "placed"
+            })
+            if len(order_docs) >= BATCH:
+                await _flush(orders, order_docs)
+
+    await _flush(chat_history, message_docs)
+    await _flush(chat_sessions, session_docs)
+    await _flush(orders, order_docs)
+
+    return {"user_ids": user_ids, "session_ids": session_ids}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--orders-per-user", type=int, default=3)
+    args = parser.parse_args()
+
+    from utils.mongo import ensure_indexes
+    import routes.users, routes.orders, routes.chat_history, routes.chat_sessions  # noqa: E401,F401
+
+    await ensure_indexes()
+    start = time.perf_counter()
+    ids = await seed(args.users, args.sessions, args.messages, args.orders_per_user)
+    print(f"seeded {len(ids['user_ids'])} users, {len(ids['session_ids'])} sessions, "
+          f"{args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+# backend/scripts/val_images.py
+"""
+Labelled validation set laid out as <val-dir>/<breed>/<image>, shared by
+scripts/fit_temperature.py and scripts/calibrate_cascade.py.
+"""
+from pathlib import Path
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def norm_breed(name: str) -> str:
+    return name.strip().lower().replace("_", " ").replace("-", " ")
+
+
+def class_index(idx2class: dict) -> dict:
+    """Normalized breed name → class index."""
+    return {norm_breed(v): k for k, v in idx2class.items()}
+
+
+def labelled_paths(val_dir: Path, class2idx: dict):
+    """(image path, label) for every image under a known breed folder."""
+    for breed_dir in sorted(p for p in val_dir.iterdir() if p.is_dir()):
+        label = class2idx.get(norm_breed(breed_dir.name))
+        if label is None:
+            print(f"⚠️ Unknown breed folder {breed_dir.name}; skipped")
+            continue
+        for path in sorted(breed_dir.iterdir()):
+            if path.suffix.lower() in IMAGE_EXTS:
+                yield path, label
@@ -0,0 +1,59 @@
+# backend/scripts/verify_indexes.py
+"""
+Create every declared index in a scratch database and explain every
+declared query against it. Exits non-zero if any query would COLLSCAN.
+
+Point it at a local/throwaway mongod, e.g.
+
+    docker run -d -p 27017:27017 mongo:7
+    cd backend
+    MONGO_URI=mongodb://localhost:27017 python scripts/verify_indexes.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+from utils.mongo import client  # noqa: E402
+from utils.indexes import migrate_indexes, verify_query_plans, QUERIES  # noqa: E402
+
+# Importing these registers their declare_index / declare_query calls
+import routes.users  # noqa: E402,F401
+import routes.orders  # noqa: E402,F401
+import routes.chat_history  # noqa: E402,F401
+import routes.chat_sessions  # noqa: E402,F401
+import utils.retention  # noqa: E402,F401
+import utils.prediction_log  # noqa: E402,F401
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="dog_project_index_check")
+    parser.add_argument("--keep", action="store_true", help="don't drop the scratch database")
+    args = parser.parse_args()
+
+    database = client[args.db]
+    try:
+        report = await migrate_indexes(database)
+        print(f"indexes: {len(report['created'])} created, {len(report['ok'])} ok, "
+              f"{len(report['mismatched'])} mismatched")
+
+        results = await verify_query_plans(database)
+        width = max(len(q["name"]) for q in QUERIES)
+        for r in results:
+            print(f"{'ok  ' if r['ok'] else 'FAIL'} {r['name']:<{width}}  {r['plan']}")
+
+        failed = [r for r in results if not r["ok"]]
+        return 1 if failed or report["mismatched"] else 0
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,10 +1,14 @@
 # backend/services/gemini_service.py
 import os
 import json
+import threading
 import google.generativeai as genai
+from google.generativeai.client import _ClientManager
 from fastapi import HTTPException
 import random
 
+from utils.tracing import stage
+
 # Load separate Gemini API keys for different functionalities
 GEMINI_API_KEY_CHAT = os.getenv("GEMINI_API_KEY_CHAT", "")
 GEMINI_API_KEY_VISION = os.getenv("GEMINI_API_KEY_VISION", "")
@@ -15,9 +19,38 @@ if not GEMINI_API_KEY_VISION:
     raise EnvironmentError("GEMINI_API_KEY_VISION not set in environment (.env)")
 
 
+# -------------------------------------------------
+# One client per API key
+# genai.configure() swaps a process-wide client, so with the chat and vision
+# calls running in parallel threads a call could go out with the other
+# key. Each key gets its own client instead, and models are bound to it.
+#
+# This relies on private internals of google-generativeai==0.8.5 (pinned in
+# requirements.txt): _ClientManager, and GenerativeModel keeping its client
+# in `_client` (used when not None). Re-check both when upgrading; the
+# stub test in tests/test_gemini_clients.py only covers our side.
+# -------------------------------------------------
+_clients: dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+
+def _model(model_name: str, api_key: str) -> genai.GenerativeModel:
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            manager = _ClientManager()
+            manager.configure(api_key=api_key)
+            client = _clients[api_key] = manager.get_default_client("generative")
+
+    model = genai.GenerativeModel(model_name)
+    model._client = client  # used instead of the process-wide default client
+    return model
+
+
 
 
-def _build_prompt(question: str, breed_info: dict = None, diet_info: dict = None, sample_questions: list | None = None) -> str:
+def _build_prompt(question: str, breed_info: dict = None, diet_info: dict = None, sample_questions: list | None = None,
+                  conversation: dict | None = None) -> str:
     system_msg = (
         "You are a helpful and factual DOG assistant.\n"
         "Your job is to answer questions about dogs, dog breeds, dog diet, dog behaviour, training, health, grooming, etc.\n\n"
@@ -61,6 +94,18 @@ def _build_prompt(question: str, breed_info: dict = None, diet_info: dict = None
         except:
             parts.append("SUGGESTED_QUESTIONS:\n" + str(sample_questions))
 
+    # Bounded conversation memory (utils/chat_memory.py): summary + recent turns
+    if conversation:
+        if conversation.get("summary"):
+            parts.append("CONVERSATION_SUMMARY:\n" + conversation["summary"])
+        if conversation.get("turns"):
+            parts.append("RECENT_CONVERSATION:\n" + "\n".join(
+                f"{t['role'].upper()}: {t['text']}" for t in conversation["turns"]
+            ))
+        if conversation.get("last_breed"):
+            parts.append(f"BREED_IN_CONVERSATION: {conversation['last_breed']}\n"
+                         "(Follow-up questions without a breed refer to this breed.)")
+
     parts.append("\nUSER_QUESTION:\n" + question.strip())
     return "\n\n".join(parts)
 
@@ -122,8 +167,15 @@ def ask_gemini(
     diet_info: dict = None,
     sample_questions: list | None = None,
     model_name: str = "gemini-2.5-flash",
-    max_output_tokens: int = 500
+    max_output_tokens: int = 500,
+    conversation: dict | None = None,
+    on_chunk=None
 ) -> str:
+    """
+    Answer a dog question. With `on_chunk(text)`, the answer is streamed:
+    each piece is passed to it as Gemini produces it (the full answer is
+    still returned).
+    """
 
     # -------------------------------
     # 1️⃣ Handle greetings FIRST
@@ -139,33 +191,48 @@ def ask_gemini(
         "care", "grooming", "vaccination", "exercise", "pet"
     ]
 
-    if not any(word in question.lower() for word in dog_keywords):
+    # Follow-ups ("and as a senior?") rarely repeat the keywords; inside an
+    # ongoing dog conversation let the model apply rule 3 itself
+    in_dog_conversation = bool(conversation and (conversation.get("last_breed") or conversation.get("turns")))
+    if not in_dog_conversation and not any(word in question.lower() for word in dog_keywords):
         return "I can only help with dog-related questions 🐶"
 
     # -------------------------------
     # 3️⃣ Normal Gemini flow
     # -------------------------------
-    prompt = _build_prompt(
-        question,
-        breed_info=breed_info,
-        diet_info=diet_info,
-        sample_questions=sample_questions
-    )
+    with stage("prompt_build"):
+        prompt = _build_prompt(
+            question,
+            breed_info=breed_info,
+            diet_info=diet_info,
+            sample_questions=sample_questions,
+            conversation=conversation
+        )
 
     try:
-        # Configure with CHAT API key
-        genai.configure(api_key=GEMINI_API_KEY_CHAT)
-        model = genai.GenerativeModel(model_name)
-
-        resp = model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": 0.0,
-                "max_output_tokens": max_output_tokens
-            }
-        )
+        model = _model(model_name, GEMINI_API_KEY_CHAT)
+
+        generation_config = {
+            "temperature": 0.0,
+            "max_output_tokens": max_output_tokens
+        }
+
+        with stage("gemini_generate"):
+            if on_chunk is None:
+                answer = _parse_response(model.generate_content(prompt, generation_config=generation_config))
+            else:
+                pieces = []
+                for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+                    # Not _parse_response: it strips, and chunks split mid-sentence
+                    try:
+                        text = chunk.text
+                    except (ValueError, AttributeError):
+                        text = ""  # e.g. a chunk carrying only safety metadata
+                    if text:
+                        pieces.append(text)
+                        on_chunk(text)
+                answer = "".join(pieces)
 
-        answer = _parse_response(resp)
         if not answer.strip():
             return "Information not available in the provided data."
 
@@ -175,19 +242,39 @@ def ask_gemini(
         raise HTTPException(status_code=500, detail=f"Gemini call failed: {e}")
 
 
+def summarize_conversation(previous_summary: str, turns: list[dict], max_output_tokens: int = 250) -> str:
+    """Fold older chat turns into the rolling summary (see utils/chat_memory.py)."""
+    transcript = "\n".join(f"{t['role'].upper()}: {t['text']}" for t in turns)
+    prompt = (
+        "Update the running summary of a conversation between a user and a dog assistant.\n"
+        "Keep: the user's dog(s), breeds, ages, health issues, preferences and open questions.\n"
+        "Drop greetings and anything already answered in full. Reply with the summary only, "
+        "at most 120 words.\n\n"
+        f"CURRENT_SUMMARY:\n{previous_summary or '(empty)'}\n\n"
+        f"NEW_MESSAGES:\n{transcript}"
+    )
+
+    model = _model("gemini-2.5-flash", GEMINI_API_KEY_CHAT)
+    with stage("gemini_summarize"):
+        resp = model.generate_content(
+            prompt,
+            generation_config={"temperature": 0.0, "max_output_tokens": max_output_tokens}
+        )
+    return _parse_response(resp).strip()
+
+
 # -----------------------------------------------------------
 # 🔥 NEW FUNCTION — Check if uploaded image is a DOG
 # -----------------------------------------------------------
-def is_dog_image(image_bytes: bytes) -> bool:
+def is_dog_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> bool:
     """
     TRUE vision detection using gemini-2.5-flash (free-tier compatible)
     Sends the image as a PART instead of embedding base64 in text.
+    Callers pass the downscaled JPEG from utils.uploads.downscale_image.
     """
 
     try:
-        # Configure with VISION API key
-        genai.configure(api_key=GEMINI_API_KEY_VISION)
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        model = _model("gemini-2.5-flash", GEMINI_API_KEY_VISION)
 
         prompt = """
 You are an animal detection classifier.
@@ -196,15 +283,16 @@ If the image contains a dog (even partially), reply ONLY: dog.
 If not, reply ONLY: not dog.
 """
 
-        resp = model.generate_content(
-            [
-                prompt,
-                {
-                    "mime_type": "image/jpeg",
-                    "data": image_bytes
-                }
-            ]
-        )
+        with stage("gemini_gate"):
+            resp = model.generate_content(
+                [
+                    prompt,
+                    {
+                        "mime_type": mime_type,
+                        "data": image_bytes
+                    }
+                ]
+            )
 
         answer = resp.text.strip().lower()
 
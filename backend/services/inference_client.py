@@ -0,0 +1,205 @@
+# backend/services/inference_client.py
+"""
+Breed-classifier access for the API workers.
+
+INFERENCE_MODE=local (default) loads DogModel in-process, once per
+(model path, class index) no matter how many routers ask for it.
+
+INFERENCE_MODE=remote keeps the API worker torch-free: images are
+preprocessed here (numpy/PIL only), written into a shared-memory slot, and
+the inference server (services/inference_server.py) is asked over a Unix
+socket to classify the tensor in that slot. Only the slot name and the
+top-k results cross the socket; the tensor itself is never serialized.
+
+Each slot also carries the (downscaled) source image after the tensor, so
+a cascade tier with a different input (models/dog_model.py) can be fed
+without another round trip. The server writes the image embedding
+(float32) back into the slot at `embedding_offset`.
+
+The tensor is the first tier's input (INPUT_SHAPE in models/preprocessing.py,
+from MODEL_INPUT / MODEL_NORMALIZE / MODEL_CASCADE); the server refuses a
+request whose shape or normalization differs from its own settings.
+
+Wire format: one JSON line each way per connection.
+    → {"shm": name, "shape": [3, s, s], "normalized": bool, "dtype": "float32", "topk": k,
+       "image_offset": o, "image_len": n,
+       "embedding_offset": e, "embedding_capacity": floats}
+    ← {"predictions": [...], "tier": "small", "embedding_dim": d}  or  {"error": "..."}
+"""
+import atexit
+import json
+import os
+import queue
+import socket
+import threading
+from collections import Counter
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from models.preprocessing import INPUT_SHAPE, INPUT_DTYPE, INPUT_NORMALIZE, image_to_array, load_class_map
+from utils.tracing import stage, register_gauge
+from utils.speculative import check_cancelled
+
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "local")
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "/tmp/dogbreed-inference.sock")
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "30"))
+INFERENCE_SHM_SLOTS = int(os.getenv("INFERENCE_SHM_SLOTS", "8"))
+# Room for the source image (downscaled JPEG from utils/uploads.py) per slot
+INFERENCE_IMAGE_BYTES = int(os.getenv("INFERENCE_IMAGE_BYTES", str(1024 * 1024)))
+# Widest penultimate layer the slot can carry back (float32)
+INFERENCE_EMBEDDING_FLOATS = 4096
+
+
+class ShmSlotPool:
+    """
+    Fixed set of shared-memory blocks reused across requests, so a request
+    costs no shm_open/unlink. Blocks until a slot is free.
+    """
+
+    def __init__(self, max_slots: int, nbytes: int):
+        self.max_slots = max_slots
+        self.nbytes = nbytes
+        self._free: queue.Queue = queue.Queue()
+        self._all: list[shared_memory.SharedMemory] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> shared_memory.SharedMemory:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.max_slots:
+                shm = shared_memory.SharedMemory(create=True, size=self.nbytes)
+                self._all.append(shm)
+                return shm
+        return self._free.get(timeout=INFERENCE_TIMEOUT)
+
+    def release(self, shm: shared_memory.SharedMemory):
+        self._free.put(shm)
+
+    def discard(self, shm: shared_memory.SharedMemory):
+        """Drop a slot the server may still be reading (e.g. after a timeout)."""
+        with self._lock:
+            self._all.remove(shm)
+        shm.close()
+        shm.unlink()
+
+    def close(self):
+        for shm in self._all:
+            shm.close()
+            shm.unlink()
+        self._all.clear()
+
+
+class RemoteDogModel:
+    """Same predict_from_bytes() / classify_bytes() contract as DogModel, served out of process."""
+
+    def __init__(self, class_indices_path: str, socket_path: str = INFERENCE_SOCKET,
+                 max_slots: int = INFERENCE_SHM_SLOTS):
+        self.socket_path = socket_path
+        # Same breed naming as DogModel (the server answers with names)
+        self.idx2class = load_class_map(class_indices_path)
+        self.class2idx = {v: k for k, v in self.idx2class.items()}
+        self.dtype = np.dtype(INPUT_DTYPE)
+        self.image_offset = int(np.prod(INPUT_SHAPE)) * self.dtype.itemsize
+        self.embedding_offset = self.image_offset + INFERENCE_IMAGE_BYTES
+        self.slots = ShmSlotPool(max_slots, self.embedding_offset + INFERENCE_EMBEDDING_FLOATS * 4)
+        self.answered_by = Counter()
+        atexit.register(self.slots.close)
+
+    def predict_from_bytes(self, image_bytes: bytes, topk: int = 5, cancel=None):
+        return self.classify_bytes(image_bytes, topk, cancel)[0]
+
+    def classify_bytes(self, image_bytes: bytes, topk: int = 5, cancel=None):
+        """(predictions, answering tier, embedding or None)."""
+        shm = self.slots.acquire()
+        try:
+            with stage("preprocess"):
+                view = np.ndarray(INPUT_SHAPE, dtype=self.dtype, buffer=shm.buf)
+                image_to_array(image_bytes, out=view)
+                del view  # shm can't be closed while a view is alive
+
+                # Source image rides along for tiers with other inputs (if it fits)
+                image_len = len(image_bytes) if len(image_bytes) <= INFERENCE_IMAGE_BYTES else 0
+                shm.buf[self.image_offset:self.image_offset + image_len] = image_bytes[:image_len]
+            check_cancelled(cancel)
+        except Exception:
+            self.slots.release(shm)
+            raise
+
+        try:
+            with stage("inference"):
+                reply = self._call({
+                    "shm": shm.name,
+                    "shape": list(INPUT_SHAPE),
+                    "normalized": INPUT_NORMALIZE,
+                    "dtype": self.dtype.name,
+                    "topk": topk,
+                    "image_offset": self.image_offset,
+                    "image_len": image_len,
+                    "embedding_offset": self.embedding_offset,
+                    "embedding_capacity": INFERENCE_EMBEDDING_FLOATS
+                })
+        except Exception:
+            # The server may still be reading this slot; never hand it out again
+            self.slots.discard(shm)
+            raise
+
+        embedding = None
+        if reply.get("embedding_dim"):
+            embedding = np.ndarray((reply["embedding_dim"],), dtype=np.float32, buffer=shm.buf,
+                                   offset=self.embedding_offset).copy()
+        self.slots.release(shm)
+        tier = reply.get("tier", "single")
+        self.answered_by[tier] += 1
+        return reply["predictions"], tier, embedding
+
+    def _call(self, request: dict):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(INFERENCE_TIMEOUT)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                raise RuntimeError(f"Inference server unavailable at {self.socket_path}: {e}")
+
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+
+        if not line:
+            raise RuntimeError("Inference server closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"Inference failed: {reply['error']}")
+        return reply
+
+
+_models: dict = {}
+_models_lock = threading.Lock()
+
+
+def get_dog_model(model_path: str, class_indices_path: str):
+    """Shared classifier for every router in this process."""
+    # The server loads its own MODEL_PATH, so every remote caller shares one client
+    key = "remote" if INFERENCE_MODE == "remote" else (model_path, class_indices_path)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            if INFERENCE_MODE == "remote":
+                model = RemoteDogModel(class_indices_path)
+            else:
+                from models.dog_model import DogModel
+                model = DogModel(model_path, class_indices_path, device="cpu")
+            _models[key] = model
+        return model
+
+
+def _remote_answers():
+    remote = _models.get("remote")
+    return [({"tier": k}, v) for k, v in remote.answered_by.items()] if remote else []
+
+
+register_gauge("dogbreed_remote_model_answers", "Predictions answered per cascade tier by the inference server",
+               _remote_answers)
@@ -0,0 +1,184 @@
+# backend/services/inference_server.py
+"""
+Out-of-process inference server (pairs with INFERENCE_MODE=remote).
+
+A fixed pool of model processes owns the weights. The parent binds the
+Unix socket and forks INFERENCE_WORKERS children that all accept() on it,
+so the kernel hands each connection to an idle worker. Every worker is
+pinned to its own slice of cores and sizes torch's thread pool to match,
+which keeps the model from fighting the API workers (or itself) for CPU.
+
+Requests carry the name of a shared-memory block holding the preprocessed
+tensor (see services/inference_client.py); the worker maps it and wraps
+it with torch.from_numpy, so the input is never copied or serialized.
+The image embedding is written back into the same block.
+
+    cd backend
+    INFERENCE_WORKERS=2 python -m services.inference_server
+    INFERENCE_MODE=remote uvicorn main:app --workers 8
+"""
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(dotenv_path=BACKEND_DIR / ".env")
+
+from services.inference_client import INFERENCE_SOCKET, INFERENCE_TIMEOUT  # noqa: E402
+from models.preprocessing import INPUT_NORMALIZE, INPUT_SHAPE  # noqa: E402
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))  # 0 → cores / workers
+INFERENCE_PIN_CORES = os.getenv("INFERENCE_PIN_CORES", "1") == "1"
+MODEL_PATH = os.getenv("MODEL_PATH", "../models/effnetv2_s_package.zip")
+CLASS_IDX = os.getenv("CLASS_INDICES_PATH", "../json_files/class_indices.json")
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map a client's block without letting our resource tracker unlink it on exit."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _cores_for(index: int, threads: int) -> set[int]:
+    cores = sorted(os.sched_getaffinity(0))
+    start = (index * threads) % len(cores)
+    return {cores[(start + i) % len(cores)] for i in range(threads)}
+
+
+def _serve(conn: socket.socket, model, np):
+    request = json.loads(conn.makefile("rb").readline())
+    # The array goes to the first tier as is, so it must be what this server's tier takes
+    if tuple(request["shape"]) != INPUT_SHAPE or request.get("normalized", False) != INPUT_NORMALIZE:
+        raise ValueError(
+            f"input {request['shape']} normalized={request.get('normalized', False)} does not match the "
+            f"server's {list(INPUT_SHAPE)} normalized={INPUT_NORMALIZE} (set the same MODEL_INPUT / "
+            f"MODEL_NORMALIZE / MODEL_CASCADE for both)"
+        )
+    shm = _attach(request["shm"])
+    try:
+        x = np.ndarray(tuple(request["shape"]), dtype=request["dtype"], buffer=shm.buf)
+
+        # Only copied out if a cascade tier needs the source image
+        offset, length = request.get("image_offset", 0), request.get("image_len", 0)
+        image_bytes = (lambda: bytes(shm.buf[offset:offset + length])) if length else None
+
+        predictions, tier, embedding = model.classify_array(
+            x, topk=int(request.get("topk", 5)), image_bytes=image_bytes
+        )
+        del x  # release the buffer export before close()
+
+        # The embedding goes back through the slot too, not the socket
+        reply = {"predictions": predictions, "tier": tier}
+        emb_offset, emb_capacity = request.get("embedding_offset", 0), request.get("embedding_capacity", 0)
+        if embedding is not None and embedding.size <= emb_capacity:
+            out = np.ndarray(embedding.shape, dtype=np.float32, buffer=shm.buf, offset=emb_offset)
+            out[:] = embedding
+            del out
+            reply["embedding_dim"] = int(embedding.size)
+    finally:
+        shm.close()
+    return reply
+
+
+def worker_main(index: int, listener: socket.socket, threads: int):
+    # Workers exit with the parent's SIGTERM; only the parent handles SIGINT
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if INFERENCE_PIN_CORES and hasattr(os, "sched_setaffinity"):
+        cores = _cores_for(index, threads)
+        os.sched_setaffinity(0, cores)
+        print(f"📌 Inference worker {index} pinned to cores {sorted(cores)}")
+
+    # torch is only ever imported in the workers
+    import numpy as np
+    import torch
+    from models.dog_model import DogModel
+
+    torch.set_num_threads(threads)
+    model = DogModel(MODEL_PATH, CLASS_IDX, device="cpu")
+    model._load_model()
+
+    while True:
+        conn, _ = listener.accept()
+        with conn:
+            # A client that connects and never sends its request line must
+            # not hold this worker forever
+            conn.settimeout(INFERENCE_TIMEOUT)
+            try:
+                reply = _serve(conn, model, np)
+            except Exception as e:
+                reply = {"error": str(e)}
+            try:
+                conn.sendall(json.dumps(reply).encode() + b"\n")
+            except OSError:
+                pass  # client gave up (timeout); nothing to report to
+
+
+def _bind(path: str) -> socket.socket:
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(128)
+    return listener
+
+
+def main():
+    n_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    threads = INFERENCE_THREADS or max(1, n_cores // INFERENCE_WORKERS)
+
+    listener = _bind(INFERENCE_SOCKET)
+    # fork so children inherit the listening socket; the parent never imports torch
+    ctx = multiprocessing.get_context("fork")
+
+    def spawn(index):
+        proc = ctx.Process(target=worker_main, args=(index, listener, threads), daemon=True)
+        proc.start()
+        return proc
+
+    workers = [spawn(i) for i in range(INFERENCE_WORKERS)]
+    print(f"✅ Inference server on {INFERENCE_SOCKET}: {INFERENCE_WORKERS} workers × {threads} threads")
+
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        while not stopping:
+            for i, proc in enumerate(workers):
+                if not proc.is_alive():
+                    print(f"⚠️ Inference worker {i} exited ({proc.exitcode}); restarting")
+                    workers[i] = spawn(i)
+            time.sleep(1)
+    finally:
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            proc.join(timeout=5)
+        listener.close()
+        if os.path.exists(INFERENCE_SOCKET):
+            os.unlink(INFERENCE_SOCKET)
+        print("🛑 Inference server stopped")
+
+
+if __name__ == "__main__":
+    main()
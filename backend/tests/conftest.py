@@ -0,0 +1,38 @@
+# backend/tests/conftest.py
+"""
+Tests run against the in-process Mongo stand-in (utils/memory_db.py), so
+no database, model checkpoint or API key is needed.
+
+    cd backend
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ["MONGO_BACKEND"] = "memory"
+os.environ.setdefault("EMBEDDING_INDEX", "0")
+os.environ.setdefault("CHAT_STORAGE_MODE", "documents")
+
+
+@pytest.fixture
+def db():
+    """The memory database with the declared indexes, emptied after each test."""
+    from utils.mongo import db as database
+    from utils.indexes import migrate_indexes
+
+    # Unique indexes are enforced like in production
+    asyncio.run(migrate_indexes(database))
+    yield database
+
+    async def clear():
+        for name in await database.list_collection_names():
+            await database[name].delete_many({})
+
+    asyncio.run(clear())
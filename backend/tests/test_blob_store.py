@@ -0,0 +1,27 @@
+# backend/tests/test_blob_store.py
+import asyncio
+
+from utils.blob_store import LocalBlobStore
+
+
+def test_image_and_thumbnail_keep_their_own_metadata(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    key = "ab" * 32
+
+    async def run():
+        await store.put(f"{key}.thumb", b"thumb", "image/jpeg")
+        await store.put(key, b"original", "image/png")
+        return await store.get(key), await store.get(f"{key}.thumb"), await store.exists(key)
+
+    original, thumb, exists = asyncio.run(run())
+
+    assert original == (b"original", "image/png")
+    assert thumb == (b"thumb", "image/jpeg")
+    assert exists
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_missing_key(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+
+    assert asyncio.run(store.get("cd" * 32)) is None
@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from utils import chat_memory as chat_memory_module
+from utils import chat_store
+from utils.chat_memory import ConversationMemory, SessionMemory, fallback_summary
+from utils.chat_store import STORAGE_BUCKETS, STORAGE_DOCUMENTS, append_messages, compact_session
+from utils.mongo import chat_sessions
+
+START = datetime(2024, 3, 1)
+
+
+@pytest.fixture(autouse=True)
+def short_memory(monkeypatch):
+    monkeypatch.setattr(chat_memory_module, "CHAT_MEMORY_TURNS", 4)
+    monkeypatch.setattr(chat_memory_module, "CHAT_SUMMARY_EVERY", 2)
+    monkeypatch.setattr(chat_store, "CHAT_BUCKET_SIZE", 3)
+
+
+async def _session(n: int, memory: dict | None = None) -> str:
+    oid = ObjectId()
+    await chat_sessions.insert_one({"_id": oid, "user_id": "u1", "message_count": 0,
+                                    "storage": STORAGE_DOCUMENTS, "created_at": START,
+                                    **({"memory": memory} if memory else {})})
+    if n:
+        await _say(str(oid), *[f"m{i}" for i in range(n)])
+    return str(oid)
+
+
+async def _say(session_id: str, *texts: str, start: int = 0):
+    # Alternating user / bot, like a conversation
+    await append_messages(session_id, [
+        {"_id": ObjectId(), "user_id": "u1", "session_id": session_id,
+         "role": "user" if int(t[1:]) % 2 == 0 else "bot", "message": t,
+         "created_at": START + timedelta(seconds=int(t[1:]))}
+        for t in texts
+    ])
+
+
+def _texts(memory: SessionMemory) -> list[str]:
+    return [t["text"] for t in memory.turns]
+
+
+async def _noop(done, total=None):
+    pass
+
+
+def test_ring_overflows_into_pending():
+    memory = SessionMemory("s")
+    for i in range(6):
+        memory.add("user", f"m{i}")
+
+    assert _texts(memory) == ["m2", "m3", "m4", "m5"]
+    assert [t["text"] for t in memory.pending] == ["m0", "m1"]
+    assert memory.context()["turns"] == list(memory.turns)
+
+
+def test_fold_falls_back_when_summarizer_fails(db):
+    def failing(summary, turns):
+        raise RuntimeError("quota exceeded")
+
+    async def run():
+        sid = await _session(0)
+        memory = SessionMemory(sid, summary="beagle owner")
+        memory.pending = [{"role": "user", "text": "he is 3"}, {"role": "bot", "text": "noted"}]
+        await ConversationMemory(summarize=failing)._fold(memory)
+        return memory, await chat_sessions.find_one({"_id": ObjectId(sid)})
+
+    memory, session = asyncio.run(run())
+
+    expected = fallback_summary("beagle owner", [{"role": "user", "text": "he is 3"},
+                                                 {"role": "bot", "text": "noted"}])
+    assert memory.summary == expected == "beagle owner\nuser: he is 3\nbot: noted"
+    assert memory.pending == []
+    assert not memory.folding
+    assert session["memory"] == {"summary": expected, "last_breed": None}
+
+
+def test_record_folds_every_few_messages(db):
+    folded = []
+
+    def summarize(summary, turns):
+        folded.append([t["text"] for t in turns])
+        return "summary"
+
+    async def run():
+        sid = await _session(0)
+        memories = ConversationMemory(summarize=summarize)
+        memory = await memories.get(sid)
+        for i in range(0, 6, 2):
+            memories.record(memory, f"m{i}", f"m{i + 1}", None)
+        await asyncio.gather(*memories._tasks)
+        return memory
+
+    memory = asyncio.run(run())
+
+    assert folded == [["m0", "m1"]]
+    assert memory.summary == "summary"
+    assert _texts(memory) == ["m2", "m3", "m4", "m5"]
+
+
+@pytest.mark.parametrize("storage", [STORAGE_DOCUMENTS, STORAGE_BUCKETS])
+def test_load_rebuilds_from_stored_messages(db, storage):
+    async def run():
+        sid = await _session(7, memory={"summary": "earlier", "last_breed": "beagle"})
+        if storage == STORAGE_BUCKETS:
+            await compact_session(sid, _noop)
+        return await ConversationMemory().get(sid)
+
+    memory = asyncio.run(run())
+
+    assert memory.summary == "earlier"
+    assert memory.last_breed == "beagle"
+    assert _texts(memory) == ["m3", "m4", "m5", "m6"]
+    assert memory.pending == []
+    assert memory.message_count == 7
+
+
+@pytest.mark.parametrize("storage", [STORAGE_DOCUMENTS, STORAGE_BUCKETS])
+def test_load_skips_the_message_being_answered(db, storage):
+    async def run():
+        # m6 is the user's question, saved before the bot is asked
+        sid = await _session(7)
+        if storage == STORAGE_BUCKETS:
+            await compact_session(sid, _noop)
+        return (await ConversationMemory().get(sid, current_message="m6"),
+                await ConversationMemory().get(sid, current_message="something else"))
+
+    answering, other = asyncio.run(run())
+
+    assert _texts(answering) == ["m2", "m3", "m4", "m5"]
+    assert answering.message_count == 6
+    assert _texts(other) == ["m3", "m4", "m5", "m6"]
+
+
+def test_get_reloads_after_writes_by_another_worker(db):
+    async def run():
+        sid = await _session(2)
+        memories = ConversationMemory()
+        memory = await memories.get(sid)
+
+        # This worker answers a turn it was asked over HTTP: the frontend
+        # stores the question first, the answer after
+        await _say(sid, "m2")
+        same = await memories.get(sid, current_message="m2")
+        memories.record(same, "m2", "m3", None)
+        await _say(sid, "m3")
+        again = await memories.get(sid)
+        hits = memories.hits
+
+        # Another worker answers the next turn
+        await _say(sid, "m4", "m5")
+        reloaded = await memories.get(sid)
+        return memory, same, again, hits, reloaded, memories.misses
+
+    memory, same, again, hits, reloaded, misses = asyncio.run(run())
+
+    assert same is memory and again is memory
+    assert hits == 2
+    assert reloaded is not memory
+    assert misses == 2
+    assert _texts(reloaded) == ["m2", "m3", "m4", "m5"]
@@ -0,0 +1,254 @@
+# backend/tests/test_chat_store.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from utils import chat_store
+from utils.chat_store import (
+    STORAGE_BUCKETS, STORAGE_COMPACTING, STORAGE_DOCUMENTS,
+    append_messages, compact_session, iter_bucket_messages, read_bucket_page,
+    reserve_positions, session_storage, settle_documents
+)
+from utils.mongo import chat_buckets, chat_history, chat_sessions
+from utils.pagination import fetch_page
+
+START = datetime(2024, 3, 1)
+
+
+@pytest.fixture(autouse=True)
+def small_buckets(monkeypatch):
+    monkeypatch.setattr(chat_store, "CHAT_BUCKET_SIZE", 10)
+
+
+def _messages(session_id: str, start: int, n: int) -> list[dict]:
+    return [
+        {"_id": ObjectId(), "user_id": "u1", "session_id": session_id, "role": "user",
+         "message": f"m{i}", "created_at": START + timedelta(seconds=i)}
+        for i in range(start, start + n)
+    ]
+
+
+async def _new_session(n: int) -> str:
+    oid = ObjectId()
+    await chat_sessions.insert_one({"_id": oid, "user_id": "u1", "message_count": 0,
+                                    "storage": STORAGE_DOCUMENTS, "created_at": START})
+    if n:
+        await append_messages(str(oid), _messages(str(oid), 0, n))
+    return str(oid)
+
+
+async def _bucket_messages(session_id: str) -> list[str]:
+    docs, cursor = await read_bucket_page(session_id, None, 10_000)
+    assert cursor is None
+    return [d["message"] for d in docs]
+
+
+async def _state(session_id: str):
+    session = await chat_sessions.find_one({"_id": ObjectId(session_id)})
+    return session.get("storage"), session.get("message_count")
+
+
+async def _noop(done, total=None):
+    pass
+
+
+def test_compaction_moves_every_message(db):
+    async def run():
+        sid = await _new_session(25)
+        await compact_session(sid, _noop)
+        return (await _state(sid), await _bucket_messages(sid),
+                await chat_history.count_documents({"session_id": sid}))
+
+    state, messages, left = asyncio.run(run())
+
+    assert state == (STORAGE_BUCKETS, 25)
+    assert messages == [f"m{i}" for i in range(25)]
+    assert left == 0
+
+
+def test_reads_use_documents_until_switch(db):
+    seen = []
+
+    async def run():
+        sid = await _new_session(25)
+
+        async def progress(done, total=None):
+            if done:
+                storage = (await session_storage([sid]))[sid]
+                docs, _ = await fetch_page(chat_history, {"session_id": sid}, {"created_at": 1}, None, 100)
+                seen.append((storage, len(docs)))
+
+        await compact_session(sid, progress)
+
+    asyncio.run(run())
+
+    # Every copy step still sees the documents; the final report follows the switch
+    assert len(seen) > 1
+    assert all(s == (STORAGE_COMPACTING, 25) for s in seen[:-1])
+    assert seen[-1][0] == STORAGE_BUCKETS
+
+
+def test_appends_during_compaction_are_kept_in_order(db):
+    async def run():
+        sid = await _new_session(25)
+        extra = iter(range(25, 28))
+
+        async def progress(done, total=None):
+            # A new message arrives after each copied bucket
+            n = next(extra, None) if done else None
+            if n is not None:
+                await append_messages(sid, _messages(sid, n, 1))
+
+        await compact_session(sid, progress)
+        # ...and one after the switch, appended to the buckets directly
+        await append_messages(sid, _messages(sid, 28, 1))
+        return (await _state(sid), await _bucket_messages(sid),
+                await chat_history.count_documents({"session_id": sid}))
+
+    state, messages, left = asyncio.run(run())
+
+    assert state == (STORAGE_BUCKETS, 29)
+    assert messages == [f"m{i}" for i in range(29)]
+    assert left == 0
+
+
+def test_failed_compaction_can_be_retried(db, monkeypatch):
+    real_append = chat_store.append_to_buckets
+    calls = 0
+
+    async def failing_append(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise ConnectionError("lost connection")
+        return await real_append(*args, **kwargs)
+
+    async def run():
+        sid = await _new_session(25)
+        monkeypatch.setattr(chat_store, "append_to_buckets", failing_append)
+        with pytest.raises(ConnectionError):
+            await compact_session(sid, _noop)
+        after_failure = (await _state(sid), await chat_history.count_documents({"session_id": sid}))
+
+        await compact_session(sid, _noop)
+        return after_failure, await _state(sid), await _bucket_messages(sid)
+
+    after_failure, state, messages = asyncio.run(run())
+
+    # Still fully readable as documents after the failure
+    assert after_failure == ((STORAGE_DOCUMENTS, 25), 25)
+    assert state == (STORAGE_BUCKETS, 25)
+    assert messages == [f"m{i}" for i in range(25)]
+
+
+def test_concurrent_compaction_runs_once(db):
+    async def run():
+        sid = await _new_session(25)
+        await asyncio.gather(compact_session(sid, _noop), compact_session(sid, _noop))
+        return await _state(sid), await _bucket_messages(sid)
+
+    state, messages = asyncio.run(run())
+
+    assert state == (STORAGE_BUCKETS, 25)
+    assert messages == [f"m{i}" for i in range(25)]
+
+
+def test_buckets_expire_with_the_session(db, monkeypatch):
+    monkeypatch.setattr(chat_store, "CHAT_RETENTION_DAYS", 30)
+
+    async def run():
+        sid = await _new_session(0)
+        await chat_sessions.update_one({"_id": ObjectId(sid)}, {"$set": {"storage": STORAGE_BUCKETS}})
+        await append_messages(sid, _messages(sid, 0, 15))
+        # Much later, one more message lands in the second bucket
+        late = _messages(sid, 15, 1)
+        late[0]["created_at"] = START + timedelta(days=20)
+        await append_messages(sid, late)
+        return [b["expire_at"] async for b in chat_buckets.find({"session_id": sid})]
+
+    expiry = asyncio.run(run())
+
+    assert len(expiry) == 2
+    assert set(expiry) == {START + timedelta(days=50)}
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_bucket_pages_match_document_pages(db, direction):
+    async def walk(read):
+        pages, cursor = [], None
+        while True:
+            docs, cursor = await read(cursor)
+            pages.append([d["message"] for d in docs])
+            if not cursor:
+                return pages
+
+    async def run():
+        sid = await _new_session(25)
+        documents = await walk(lambda c: fetch_page(chat_history, {"session_id": sid}, {"message": 1, "created_at": 1},
+                                                    c, 7, direction))
+        await compact_session(sid, _noop)
+        buckets = await walk(lambda c: read_bucket_page(sid, c, 7, direction))
+        return documents, buckets
+
+    documents, buckets = asyncio.run(run())
+
+    assert buckets == documents
+    assert sum(buckets, []) == [f"m{i}" for i in range(25)][::direction]
+
+
+def test_documents_inserted_after_the_switch_are_absorbed(db):
+    async def run():
+        sid = await _new_session(25)
+        late = _messages(sid, 25, 2)
+        reserved = []
+
+        async def progress(done, total=None):
+            # A writer reserves while the session is compacting...
+            if done and not reserved:
+                reserved.append(await reserve_positions(sid, late))
+
+        await compact_session(sid, progress)
+        # ...and inserts only after the switch
+        await chat_history.insert_many(late)
+        merged = await _bucket_messages(sid)
+        exported = [m["message"] async for m in iter_bucket_messages(sid)]
+
+        await settle_documents([sid])
+        return (reserved[0][0], merged, exported, await _state(sid), await _bucket_messages(sid),
+                await chat_history.count_documents({"session_id": sid}))
+
+    reserved_storage, merged, exported, state, messages, left = asyncio.run(run())
+
+    everything = [f"m{i}" for i in range(27)]
+    assert reserved_storage == STORAGE_COMPACTING
+    # Readable before being absorbed...
+    assert merged == exported == everything
+    # ...then moved over and counted once
+    assert state == (STORAGE_BUCKETS, 27)
+    assert messages == everything
+    assert left == 0
+
+
+def test_absorbing_twice_does_not_duplicate(db):
+    async def run():
+        sid = await _new_session(5)
+        await compact_session(sid, _noop)
+        late = _messages(sid, 5, 2)
+        await chat_history.insert_many(late)
+        await settle_documents([sid])
+        # A round that died after appending, before deleting
+        await chat_history.insert_many(late)
+        await chat_sessions.update_one({"_id": ObjectId(sid)}, {"$set": {"leftovers": True}})
+        await settle_documents([sid])
+        stored = sum([len(b["messages"]) async for b in chat_buckets.find({"session_id": sid})])
+        return (await _state(sid), stored, await _bucket_messages(sid),
+                await chat_history.count_documents({"session_id": sid}))
+
+    state, stored, messages, left = asyncio.run(run())
+
+    assert state == (STORAGE_BUCKETS, 7)
+    assert stored == 7
+    assert messages == [f"m{i}" for i in range(7)]
+    assert left == 0
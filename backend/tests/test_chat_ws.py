@@ -0,0 +1,196 @@
+import asyncio
+import importlib
+import json
+import sys
+import types
+
+import pytest
+from bson import ObjectId
+
+from utils.mongo import chat_history, chat_sessions
+from utils.chat_store import STORAGE_DOCUMENTS
+
+
+class FakeWebSocket:
+    """Just the parts of starlette's WebSocket that chat_socket uses."""
+
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent: list[dict] = []
+        self.received = asyncio.Event()
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+    async def receive(self) -> dict:
+        return await self.incoming.get()
+
+    async def send_json(self, data):
+        self.sent.append(json.loads(json.dumps(data, default=str)))
+        self.received.set()
+
+    def text(self, payload):
+        text = payload if isinstance(payload, str) else json.dumps(payload)
+        self.incoming.put_nowait({"type": "websocket.receive", "text": text})
+
+    def bytes(self, payload: bytes):
+        self.incoming.put_nowait({"type": "websocket.receive", "bytes": payload})
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+    async def wait_for(self, kind: str, count: int = 1) -> list[dict]:
+        async def wait():
+            while len([f for f in self.sent if f["type"] == kind]) < count:
+                self.received.clear()
+                await self.received.wait()
+        await asyncio.wait_for(wait(), 5)
+        return [f for f in self.sent if f["type"] == kind]
+
+
+async def _answer(message, prepared, session_id, user_id, emit):
+    emit({"type": "chunk", "text": "Beagles are "})
+    emit({"type": "chunk", "text": "friendly."})
+    return {"answer": "Beagles are friendly.", "predicted_breed": None}
+
+
+@pytest.fixture
+def chat_ws(db, monkeypatch):
+    # routers.chat needs the model and Gemini; only run_chat_turn is used here
+    chat = types.ModuleType("routers.chat")
+    chat.run_chat_turn = _answer
+    monkeypatch.setitem(sys.modules, "routers.chat", chat)
+    monkeypatch.delitem(sys.modules, "routers.chat_ws", raising=False)
+
+    module = importlib.import_module("routers.chat_ws")
+    yield module
+    sys.modules.pop("routers.chat_ws", None)
+
+
+async def _session() -> str:
+    oid = ObjectId()
+    await chat_sessions.insert_one({"_id": oid, "user_id": "u1", "message_count": 0,
+                                    "storage": STORAGE_DOCUMENTS})
+    return str(oid)
+
+
+async def _open(chat_ws, session_id: str):
+    socket = FakeWebSocket()
+    task = asyncio.create_task(chat_ws.chat_socket(socket, session_id, "u1"))
+    return socket, task
+
+
+async def _close(socket: FakeWebSocket, task: asyncio.Task):
+    socket.disconnect()
+    await asyncio.wait_for(task, 5)
+
+
+def test_unknown_session_is_closed(chat_ws):
+    async def run():
+        socket = FakeWebSocket()
+        await chat_ws.chat_socket(socket, str(ObjectId()), "u1")
+        return socket
+
+    socket = asyncio.run(run())
+    assert socket.closed_with == 4404
+    assert socket.sent == []
+
+
+def test_bad_frames_get_an_error_and_keep_the_socket_open(chat_ws):
+    async def run():
+        socket, task = await _open(chat_ws, await _session())
+        socket.text("not json")
+        socket.text([1, 2])
+        socket.bytes(b"\x00")
+        socket.text({"type": "shout"})
+        socket.text({"type": "message", "message": "look", "image": True, "id": 7})
+        socket.text({"type": "not the image bytes"})
+        socket.text({"type": "ping"})
+        await socket.wait_for("pong")
+        await _close(socket, task)
+        return socket.sent
+
+    sent = asyncio.run(run())
+
+    assert sent == [
+        {"type": "error", "status": 400, "detail": "Frame is not valid JSON"},
+        {"type": "error", "status": 400, "detail": "Frame must be a JSON object"},
+        {"type": "error", "status": 400, "detail": "Expected a text frame"},
+        {"type": "error", "status": 400, "detail": "Unknown frame type: shout"},
+        {"type": "error", "status": 400, "detail": "Expected a bytes frame", "id": 7},
+        {"type": "pong"}
+    ]
+
+
+def test_done_is_sent_after_the_messages_are_stored(chat_ws, monkeypatch):
+    append_messages = chat_ws.append_messages
+
+    async def slow_append(session_id, docs):
+        # Gives the sender every chance to run ahead of the write
+        await asyncio.sleep(0.05)
+        await append_messages(session_id, docs)
+
+    monkeypatch.setattr(chat_ws, "append_messages", slow_append)
+
+    class CheckingWebSocket(FakeWebSocket):
+        stored_at_done = None
+
+        async def send_json(self, data):
+            if data["type"] == "done":
+                self.stored_at_done = await chat_history.count_documents({"session_id": sid})
+            await super().send_json(data)
+
+    async def run():
+        socket = CheckingWebSocket()
+        task = asyncio.create_task(chat_ws.chat_socket(socket, sid, "u1"))
+        socket.text({"type": "message", "message": "Are beagles friendly?", "id": "t1"})
+        done = (await socket.wait_for("done"))[0]
+        stored = await chat_history.find({"session_id": sid}).sort("role", -1).to_list(None)
+        await _close(socket, task)
+        return socket, done, stored
+
+    sid = asyncio.run(_session())
+    socket, done, stored = asyncio.run(run())
+
+    assert socket.stored_at_done == 2
+    assert [f["type"] for f in socket.sent] == ["chunk", "chunk", "done"]
+    assert all(f["id"] == "t1" for f in socket.sent)
+    assert done["answer"] == "Beagles are friendly."
+    assert [(m["role"], m["message"]) for m in done["messages"]] == [
+        ("user", "Are beagles friendly?"), ("bot", "Beagles are friendly.")
+    ]
+    assert [(m["role"], m["message"]) for m in stored] == [
+        ("user", "Are beagles friendly?"), ("bot", "Beagles are friendly.")
+    ]
+
+
+def test_saved_messages_reach_the_sessions_other_sockets(chat_ws):
+    async def run():
+        sid = await _session()
+        asking, asking_task = await _open(chat_ws, sid)
+        other, other_task = await _open(chat_ws, sid)
+        elsewhere, elsewhere_task = await _open(chat_ws, await _session())
+        # A pong means the socket is open and registered
+        for socket in (asking, other, elsewhere):
+            socket.text({"type": "ping"})
+            await socket.wait_for("pong")
+
+        asking.text({"type": "message", "message": "Are beagles friendly?"})
+        await asking.wait_for("done")
+        pushed = (await other.wait_for("messages"))[0]
+
+        for socket, task in ((asking, asking_task), (other, other_task), (elsewhere, elsewhere_task)):
+            await _close(socket, task)
+        return asking.sent, other.sent, elsewhere.sent, pushed
+
+    asking, other, elsewhere, pushed = asyncio.run(run())
+
+    assert "messages" not in [f["type"] for f in asking]
+    assert [f["type"] for f in other] == ["pong", "messages"]
+    assert [m["role"] for m in pushed["messages"]] == ["user", "bot"]
+    assert [f["type"] for f in elsewhere] == ["pong"]
+    assert chat_ws._sockets == {}
@@ -0,0 +1,154 @@
+import hashlib
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.embedding_index import EmbeddingIndex, INITIAL_CAPACITY  # noqa: E402
+
+
+def _key(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def _unit(dim, hot):
+    v = np.zeros(dim, dtype=np.float32)
+    v[hot] = 1.0
+    return v
+
+
+def test_append_reopen_search(tmp_path):
+    index = EmbeddingIndex(tmp_path, dim=0)
+    index.add_many(np.stack([_unit(8, i) for i in range(3)]), [_key(i) for i in range(3)], [0, 1, 2],
+                   ["alice", "bob", "alice"])
+    index.add(_unit(8, 3), _key(3), 3, None)
+    index.close()
+
+    reopened = EmbeddingIndex(tmp_path, dim=0)
+    assert reopened.count == 4
+    assert reopened.users == ["alice", "bob"]
+
+    [(score, key, class_idx)] = reopened.search(_unit(8, 2), k=1, user_id="alice")
+    assert (key, class_idx) == (_key(2), 2)
+    assert score == pytest.approx(1.0)
+    # New users after a reopen get the next code
+    reopened.add(_unit(8, 4), _key(4), 4, "carol")
+    assert EmbeddingIndex(tmp_path, dim=0).users == ["alice", "bob", "carol"]
+
+
+def test_growing_past_capacity(tmp_path):
+    index = EmbeddingIndex(tmp_path, dim=0)
+    n = INITIAL_CAPACITY + 5
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, 4), dtype=np.float32)
+    index.add_many(vectors, [_key(i) for i in range(n)], [0] * n, ["alice"] * n)
+    index.close()
+
+    reopened = EmbeddingIndex(tmp_path, dim=0)
+    assert reopened.count == n
+    assert reopened.capacity >= n
+    [(_, key, _)] = reopened.search(vectors[-1], k=1, user_id="alice")
+    assert key == _key(n - 1)
+
+
+def test_search_never_returns_other_users_uploads(tmp_path):
+    index = EmbeddingIndex(tmp_path, dim=0)
+    index.add(_unit(4, 0), _key("alice"), 0, "alice")
+    index.add(_unit(4, 0), _key("bob"), 0, "bob")
+    index.add(_unit(4, 0), _key("anon"), 0, None)
+    q = _unit(4, 0)
+
+    assert [k for _, k, _ in index.search(q, 10, "alice")] == [_key("alice")]
+    assert {k for _, k, _ in index.search(q, 10, "alice", shared=True)} == {_key("alice"), _key("anon")}
+    assert [k for _, k, _ in index.search(q, 10, None, shared=True)] == [_key("anon")]
+    assert index.search(q, 10, "nobody") == []
+
+
+def test_duplicate_images_returned_once(tmp_path):
+    index = EmbeddingIndex(tmp_path, dim=0)
+    index.add_many(np.stack([_unit(4, 0)] * 3), [_key(0)] * 3, [0] * 3, ["alice"] * 3)
+    assert len(index.search(_unit(4, 0), 10, "alice")) == 1
+
+
+def test_users_are_appended_not_rewritten(tmp_path):
+    index = EmbeddingIndex(tmp_path, dim=0)
+    index.add(_unit(4, 0), _key(0), 0, "alice")
+    index.add(_unit(4, 1), _key(1), 0, "bob")
+    index.add(_unit(4, 2), _key(2), 0, "alice")
+
+    assert (tmp_path / "users.jsonl").read_text() == '"alice"\n"bob"\n'
+    assert "users" not in json.loads((tmp_path / "index.json").read_text())
+
+    # A torn last line (crash mid-append) is dropped on reopen
+    with open(tmp_path / "users.jsonl", "a") as f:
+        f.write('"car')
+    reopened = EmbeddingIndex(tmp_path, dim=0)
+    assert reopened.users == ["alice", "bob"]
+    reopened.add(_unit(4, 3), _key(3), 0, "dave")
+    assert EmbeddingIndex(tmp_path, dim=0).users == ["alice", "bob", "dave"]
+
+
+def test_index_with_users_in_meta_is_migrated(tmp_path):
+    index = EmbeddingIndex(tmp_path, dim=0)
+    index.add(_unit(4, 0), _key(0), 0, "alice")
+    index.close()
+    # Layout before users.jsonl
+    meta = json.loads((tmp_path / "index.json").read_text())
+    (tmp_path / "index.json").write_text(json.dumps({**meta, "users": ["alice"]}))
+    (tmp_path / "users.jsonl").unlink()
+
+    reopened = EmbeddingIndex(tmp_path, dim=0)
+    assert reopened.users == ["alice"]
+    assert (tmp_path / "users.jsonl").read_text() == '"alice"\n'
+    assert [k for _, k, _ in reopened.search(_unit(4, 0), 1, "alice")] == [_key(0)]
+
+
+def test_workers_sharing_a_directory_see_each_others_rows(tmp_path):
+    a = EmbeddingIndex(tmp_path, dim=0)
+    b = EmbeddingIndex(tmp_path, dim=0)
+    a.add(_unit(4, 0), _key("a0"), 0, "alice")
+    b.add(_unit(4, 1), _key("b0"), 1, "bob")
+    # Grows the files past what `b` has mapped
+    a.add_many(np.stack([_unit(4, 2)] * INITIAL_CAPACITY), [_key(i) for i in range(INITIAL_CAPACITY)],
+               [2] * INITIAL_CAPACITY, ["carol"] * INITIAL_CAPACITY)
+    b.add(_unit(4, 3), _key("b1"), 3, "alice")
+
+    assert [k for _, k, _ in b.search(_unit(4, 0), 1, "alice")] == [_key("a0")]
+    assert [k for _, k, _ in a.search(_unit(4, 1), 1, "bob")] == [_key("b0")]
+    assert [k for _, k, _ in a.search(_unit(4, 3), 1, "alice")] == [_key("b1")]
+    assert a.count == b.count == INITIAL_CAPACITY + 3
+    assert a.users == b.users == ["alice", "bob", "carol"]
+    assert EmbeddingIndex(tmp_path, dim=0).users == ["alice", "bob", "carol"]
+
+
+def _append_rows(root, worker, n):
+    index = EmbeddingIndex(root, dim=0)
+    for i in range(n):
+        index.add(_unit(4, i % 4), _key(f"{worker}-{i}"), worker, f"user{worker}-{i % 3}")
+    index.close()
+
+
+def test_concurrent_writers_never_overwrite_rows(tmp_path):
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_append_rows, args=(str(tmp_path), w, 300)) for w in range(3)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(30)
+        assert p.exitcode == 0
+
+    index = EmbeddingIndex(tmp_path, dim=0)
+    assert index.count == 900
+    keys = {bytes(index.keys[r]).hex() for r in range(index.count)}
+    assert len(keys) == 900
+    assert sorted(index.users) == sorted(f"user{w}-{u}" for w in range(3) for u in range(3))
+    # Every row's owner code points at the user who wrote it
+    for w in range(3):
+        for u in range(3):
+            user = f"user{w}-{u}"
+            rows = index._rows_by_owner[index._user_codes[user]]
+            assert len(rows) == 100
+            assert {int(index.classes[r]) for r in rows} == {w}
@@ -0,0 +1,95 @@
+import importlib
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+class _Client:
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+
+class _ClientManager:
+    """Stand-in for google.generativeai.client._ClientManager."""
+
+    def configure(self, api_key=None):
+        self.api_key = api_key
+
+    def get_default_client(self, kind):
+        return _Client(self.api_key)
+
+
+class _GenerativeModel:
+    """Answers with the API key of the client a call went out with."""
+
+    default_client = None
+    calls = []
+    lock = threading.Lock()
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._client = None
+
+    def generate_content(self, contents, **kwargs):
+        key = (self._client or _GenerativeModel.default_client).api_key
+        with self.lock:
+            self.calls.append(key)
+        return types.SimpleNamespace(candidates=None, text="dog" if key == "vision-key" else key)
+
+
+def _configure(api_key=None):
+    # What genai.configure() does: swap the one process-wide client
+    _GenerativeModel.default_client = _Client(api_key)
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    google = types.ModuleType("google")
+    genai = types.ModuleType("google.generativeai")
+    client = types.ModuleType("google.generativeai.client")
+    genai.GenerativeModel = _GenerativeModel
+    genai.configure = _configure
+    genai.client = client
+    google.generativeai = genai
+    client._ClientManager = _ClientManager
+
+    monkeypatch.setitem(sys.modules, "google", google)
+    monkeypatch.setitem(sys.modules, "google.generativeai", genai)
+    monkeypatch.setitem(sys.modules, "google.generativeai.client", client)
+    monkeypatch.setenv("GEMINI_API_KEY_CHAT", "chat-key")
+    monkeypatch.setenv("GEMINI_API_KEY_VISION", "vision-key")
+    monkeypatch.delitem(sys.modules, "services.gemini_service", raising=False)
+    _GenerativeModel.calls = []
+    _configure("someone-elses-key")
+
+    module = importlib.import_module("services.gemini_service")
+    yield module
+    sys.modules.pop("services.gemini_service", None)
+
+
+def test_one_client_per_key(gemini):
+    chat = gemini._model("m", "chat-key")
+    vision = gemini._model("m", "vision-key")
+
+    assert chat._client.api_key == "chat-key"
+    assert vision._client.api_key == "vision-key"
+    # Clients are built once per key and shared by its models
+    assert gemini._model("other", "chat-key")._client is chat._client
+
+
+def test_parallel_calls_keep_their_keys(gemini):
+    turns = [{"role": "user", "text": "my dog is a beagle"}]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        gates = [pool.submit(gemini.is_dog_image, b"jpeg") for _ in range(20)]
+        summaries = [pool.submit(gemini.summarize_conversation, "", turns) for _ in range(20)]
+        # Someone configuring the process-wide client meanwhile changes nothing
+        _configure("someone-elses-key")
+
+        assert all(f.result() is True for f in gates)
+        assert all(f.result() == "chat-key" for f in summaries)
+
+    assert sorted(set(_GenerativeModel.calls)) == ["chat-key", "vision-key"]
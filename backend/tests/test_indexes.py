@@ -0,0 +1,77 @@
+# backend/tests/test_indexes.py
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from utils.memory_db import MemoryClient
+from utils.mongo_monitor import summarize_plan
+from utils.pagination import encode_cursor, keyset_query
+
+
+@pytest.fixture
+def messages():
+    collection = MemoryClient()["plans"]["messages"]
+    asyncio.run(collection.create_index([("session_id", 1), ("created_at", 1), ("_id", 1)]))
+    return collection
+
+
+def _plan(collection, query, sort=None):
+    return summarize_plan(collection.explain_plan(query, sort))
+
+
+def test_planner_needs_a_bounded_prefix_or_the_sort(messages):
+    sort = [("created_at", 1), ("_id", 1)]
+
+    assert _plan(messages, {"session_id": "s"}, sort) == "IXSCAN(session_id_1_created_at_1__id_1) → FETCH"
+    assert _plan(messages, {"role": "bot"}) == "COLLSCAN"
+    # A later key alone doesn't bound the scan
+    assert _plan(messages, {"created_at": {"$gt": datetime(2024, 1, 1)}}) == "COLLSCAN"
+    # $ne doesn't either
+    assert _plan(messages, {"session_id": {"$ne": "s"}}) == "COLLSCAN"
+
+
+def test_planner_reports_in_memory_sorts(messages):
+    # Reverse walk is fine, mixed directions and gaps are not
+    assert "SORT" not in _plan(messages, {"session_id": "s"}, [("created_at", -1), ("_id", -1)])
+    assert _plan(messages, {"session_id": "s"}, [("created_at", -1), ("_id", 1)]).endswith("SORT")
+    assert _plan(messages, {"session_id": "s"}, [("_id", 1)]).endswith("SORT")
+    # Several session_ids: created_at order only holds within each one
+    assert _plan(messages, {"session_id": {"$in": ["a", "b"]}}, [("created_at", 1)]).endswith("SORT")
+
+
+def test_planner_or_needs_every_clause_indexed(messages):
+    indexed = {"$or": [{"session_id": "a"}, {"session_id": "b", "created_at": {"$lt": datetime(2024, 1, 1)}}]}
+    partial = {"$or": [{"session_id": "a"}, {"role": "bot"}]}
+
+    assert "OR" in _plan(messages, indexed)
+    assert _plan(messages, partial) == "COLLSCAN"
+
+
+def test_keyset_page_query_uses_the_index(messages):
+    cursor = encode_cursor({"created_at": datetime(2024, 1, 1), "_id": ObjectId()})
+    query = keyset_query({"session_id": "s"}, cursor, -1)
+
+    assert _plan(messages, query, [("created_at", -1), ("_id", -1)]) == "IXSCAN(session_id_1_created_at_1__id_1) → FETCH"
+
+
+def test_declared_queries_use_indexes(db):
+    # Importing these registers their declare_index / declare_query calls
+    import routes.users  # noqa: F401
+    import routes.orders  # noqa: F401
+    import routes.chat_history  # noqa: F401
+    import routes.chat_sessions  # noqa: F401
+    import utils.retention  # noqa: F401
+    import utils.prediction_log  # noqa: F401
+    from utils.indexes import migrate_indexes, verify_query_plans
+
+    async def run():
+        database = MemoryClient()["index_check"]
+        await migrate_indexes(database)
+        return await verify_query_plans(database)
+
+    results = asyncio.run(run())
+
+    assert results
+    assert [r for r in results if not r["ok"]] == []
@@ -0,0 +1,61 @@
+# backend/tests/test_pagination.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from utils.pagination import decode_cursor, encode_cursor, fetch_page
+
+
+def test_cursor_round_trip():
+    doc = {"created_at": datetime(2024, 5, 1, 12, 30, 15, 123000), "_id": ObjectId()}
+
+    assert decode_cursor(encode_cursor(doc)) == (doc["created_at"], doc["_id"])
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "", "bm8tc2VwYXJhdG9y", "MjAyNC0wNS0wMXxub3QtYW4taWQ="])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def _walk(collection, query, limit, direction):
+    async def run():
+        pages, cursor = [], None
+        while True:
+            docs, cursor = await fetch_page(collection, query, {"n": 1, "created_at": 1}, cursor, limit, direction)
+            pages.append([d["n"] for d in docs])
+            if not cursor:
+                return pages
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_pages_cover_every_row_once(db, direction):
+    # Rows sharing created_at are split across pages by _id
+    start = datetime(2024, 1, 1)
+    docs = [
+        {"_id": ObjectId(), "user_id": "u1", "n": i, "created_at": start + timedelta(seconds=i // 3)}
+        for i in range(10)
+    ]
+    asyncio.run(db["orders"].insert_many(docs + [{**docs[0], "_id": ObjectId(), "user_id": "u2"}]))
+
+    pages = _walk(db["orders"], {"user_id": "u1"}, 4, direction)
+
+    assert [len(p) for p in pages] == [4, 4, 2]
+    flat = [n for page in pages for n in page]
+    assert flat == (list(range(10)) if direction == 1 else list(range(9, -1, -1)))
+
+
+def test_exact_multiple_of_limit_has_no_empty_page(db):
+    start = datetime(2024, 1, 1)
+    asyncio.run(db["orders"].insert_many([
+        {"user_id": "u1", "n": i, "created_at": start + timedelta(minutes=i)} for i in range(6)
+    ]))
+
+    pages = _walk(db["orders"], {"user_id": "u1"}, 3, 1)
+
+    assert pages == [[0, 1, 2], [3, 4, 5]]
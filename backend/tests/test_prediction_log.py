@@ -0,0 +1,40 @@
+# backend/tests/test_prediction_log.py
+import asyncio
+
+from utils.mongo import predictions, prediction_rollups
+from utils.prediction_log import PredictionLogger
+
+
+def test_stop_writes_events_and_rollups(db, monkeypatch):
+    original = predictions.insert_many
+
+    async def slow_insert(docs, **kwargs):
+        await asyncio.sleep(0.02)
+        return await original(docs, **kwargs)
+
+    monkeypatch.setattr(predictions, "insert_many", slow_insert)
+
+    async def run():
+        logger = PredictionLogger(max_batch=4, flush_interval=0.01)
+        logger.start()
+        for i in range(10):
+            logger.log("predict", is_dog=True, preds=[{"breed": "beagle", "confidence": 0.95}], user_id="u1")
+        logger.log("chat", is_dog=False, user_id="u2")
+        # Let the first batch get under way, then stop in the middle of it
+        await asyncio.sleep(0.005)
+        await logger.stop()
+        logger.log("predict", is_dog=False)  # after stop: ignored
+
+        events = await predictions.find({}).to_list()
+        rollups = await prediction_rollups.find({}).to_list()
+        return events, rollups
+
+    events, rollups = asyncio.run(run())
+
+    assert len(events) == 11
+    assert {e["user_id"] for e in events} == {"u1", "u2"}
+    assert len(rollups) == 1
+    assert rollups[0]["total"] == 11
+    assert rollups[0]["dogs"] == 10
+    assert rollups[0]["rejected"] == 1
+    assert rollups[0]["breeds"]["beagle"] == 10
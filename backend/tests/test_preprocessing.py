@@ -0,0 +1,84 @@
+import queue
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from models.preprocessing import IMAGENET_MEAN, IMAGENET_STD, rgb_to_array
+from services import inference_client
+from services.inference_client import ShmSlotPool
+
+
+def _image(size=(301, 257)) -> Image.Image:
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8), "RGB")
+
+
+@pytest.mark.parametrize("normalize", [False, True])
+def test_rgb_to_array_matches_torchvision(normalize):
+    pytest.importorskip("torch")
+    transforms = pytest.importorskip("torchvision.transforms")
+
+    steps = [transforms.Resize((224, 224)), transforms.ToTensor()]
+    if normalize:
+        steps.append(transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD))
+    expected = transforms.Compose(steps)(_image()).numpy()
+
+    mean, std = (IMAGENET_MEAN, IMAGENET_STD) if normalize else (None, None)
+    actual = rgb_to_array(_image(), 224, mean, std)
+
+    assert actual.dtype == np.float32
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+
+def test_rgb_to_array_writes_into_out():
+    out = np.zeros((3, 32, 32), dtype=np.float32)
+    result = rgb_to_array(_image(), 32, out=out)
+
+    assert result is out
+    assert 0.0 <= out.min() and out.max() <= 1.0
+    np.testing.assert_allclose(out, rgb_to_array(_image(), 32))
+
+
+# -------------------------------------------------
+# ShmSlotPool
+# -------------------------------------------------
+@pytest.fixture
+def pool():
+    slots = ShmSlotPool(max_slots=2, nbytes=64)
+    yield slots
+    slots.close()
+
+
+def test_slots_are_reused(pool):
+    a = pool.acquire()
+    pool.release(a)
+    assert pool.acquire() is a
+    assert len(pool._all) == 1
+
+
+def test_acquire_waits_for_a_free_slot(pool, monkeypatch):
+    monkeypatch.setattr(inference_client, "INFERENCE_TIMEOUT", 0.05)
+    a, b = pool.acquire(), pool.acquire()
+    assert a.name != b.name
+
+    # Both slots taken: the third caller times out instead of creating one
+    with pytest.raises(queue.Empty):
+        pool.acquire()
+    assert len(pool._all) == 2
+
+    pool.release(b)
+    assert pool.acquire() is b
+
+
+def test_discarded_slot_is_never_handed_out_again(pool):
+    a = pool.acquire()
+    name = a.name
+    pool.discard(a)
+
+    assert a not in pool._all
+    b = pool.acquire()
+    assert b.name != name
+    # The discarded block is unlinked
+    with pytest.raises(FileNotFoundError):
+        inference_client.shared_memory.SharedMemory(name=name)
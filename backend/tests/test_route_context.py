@@ -0,0 +1,79 @@
+# backend/tests/test_route_context.py
+import asyncio
+import json
+
+from fastapi import APIRouter, FastAPI
+
+from utils.mongo_monitor import RouteContextMiddleware, current_route
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RouteContextMiddleware)
+
+    prefixed = APIRouter(prefix="/api/things")
+
+    @prefixed.get("/{thing_id}")
+    async def get_thing(thing_id: str):
+        return {"route": current_route.get()}
+
+    # Prefix given at include time, as main.py does for routers/
+    included = APIRouter()
+
+    @included.get("/user/{user_id}")
+    async def get_user_things(user_id: str):
+        return {"route": current_route.get()}
+
+    @app.get("/health")
+    async def health():
+        return {"route": current_route.get()}
+
+    app.include_router(prefixed)
+    app.include_router(included, prefix="/api/data")
+    return app
+
+
+def _get(app, path: str):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("test", 1), "server": ("test", 80)
+    }
+    asyncio.run(app(scope, receive, send))
+    status = sent[0]["status"]
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, json.loads(body) if body else None
+
+
+def test_route_label_through_included_routers():
+    app = _app()
+
+    assert _get(app, "/api/things/42") == (200, {"route": "GET /api/things/{thing_id}"})
+    assert _get(app, "/api/data/user/u1") == (200, {"route": "GET /api/data/user/{user_id}"})
+    assert _get(app, "/health") == (200, {"route": "GET /health"})
+
+
+def test_unmatched_path_shares_one_label():
+    app = FastAPI()
+    seen = []
+
+    @app.middleware("http")
+    async def capture(request, call_next):
+        seen.append(current_route.get())
+        return await call_next(request)
+
+    # Added last, so it runs outside `capture`
+    app.add_middleware(RouteContextMiddleware)
+
+    status, _ = _get(app, "/nope/123")
+
+    assert status == 404
+    assert seen == ["unmatched"]
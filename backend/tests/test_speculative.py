@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.speculative import GateError, SpeculationCancelled, check_cancelled, run_gated
+
+
+def _work(seen: dict, release: threading.Event | None = None):
+    """Work with two stages and a cancel check between them."""
+    seen["started"] = threading.Event()
+
+    def work(cancel):
+        seen["started"].set()
+        if release is not None:
+            release.wait(5)
+        seen["cancel"] = cancel
+        check_cancelled(cancel)
+        seen["finished"] = True
+        return "labrador"
+    return work
+
+
+def test_gate_passes():
+    seen = {}
+    assert asyncio.run(run_gated(lambda: True, _work(seen))) == (True, "labrador")
+    assert seen["finished"]
+
+
+def test_gate_rejects():
+    seen, release = {}, threading.Event()
+
+    async def run():
+        work = _work(seen, release)
+        # Answers once the work is running, so there is something to cancel
+        result = await run_gated(lambda: seen["started"].wait(5) and False, work)
+        # The work thread reaches its next check only now (asyncio.run
+        # waits for it before returning)
+        release.set()
+        return result
+
+    assert asyncio.run(run()) == (False, None)
+    assert seen["cancel"].is_set()
+    assert "finished" not in seen
+
+
+def test_gate_error():
+    seen, release = {}, threading.Event()
+
+    def gate():
+        seen["started"].wait(5)
+        raise ConnectionError("gemini unreachable")
+
+    async def run():
+        try:
+            await run_gated(gate, _work(seen, release))
+        finally:
+            release.set()
+
+    with pytest.raises(GateError) as exc:
+        asyncio.run(run())
+
+    assert isinstance(exc.value.__cause__, ConnectionError)
+    assert seen["cancel"].is_set()
+    assert "finished" not in seen
+
+
+def test_work_error_only_surfaces_when_gate_passes():
+    def work(cancel):
+        raise ValueError("bad tensor")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_gated(lambda: True, work))
+    assert asyncio.run(run_gated(lambda: False, work)) == (False, None)
+
+
+def test_cancelled_request_cancels_work():
+    seen, release, gate_started = {}, threading.Event(), threading.Event()
+
+    def gate():
+        gate_started.set()
+        release.wait(5)
+        return True
+
+    async def run():
+        task = asyncio.create_task(run_gated(gate, _work(seen, release)))
+        await asyncio.to_thread(gate_started.wait, 5)
+        await asyncio.to_thread(seen["started"].wait, 5)
+        # e.g. the client disconnected while the gate was running
+        task.cancel()
+        try:
+            await task
+        finally:
+            release.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+
+    assert seen["cancel"].is_set()
+    assert "finished" not in seen
+
+
+def test_check_cancelled():
+    check_cancelled(None)
+    cancel = threading.Event()
+    check_cancelled(cancel)
+    cancel.set()
+    with pytest.raises(SpeculationCancelled):
+        check_cancelled(cancel)
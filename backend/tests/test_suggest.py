@@ -0,0 +1,126 @@
+import asyncio
+
+from utils.suggest import SuggestIndex, expand
+
+TEMPLATES = [
+    "Tell me the height of",
+    "Is this breed good with children?",
+    "What group does the",
+    "What breed is the dog in this image?",
+    "How much exercise do dogs need?"
+]
+BREEDS = ["beagle", "german shepherd", "shepherd"]
+
+
+def _index():
+    index = SuggestIndex()
+    index.build(TEMPLATES, BREEDS)
+    return index
+
+
+def _questions(results):
+    return [r["question"] for r in results]
+
+
+def test_expand():
+    assert expand("Tell me the height of", "beagle") == "Tell me the height of the Beagle."
+    assert expand("Is this breed good with children?", "beagle") == "Is the Beagle good with children?"
+    assert expand("What group does the", "beagle") == "What group does the Beagle belong to?"
+    assert expand("What breed is the dog in this image?", "beagle") is None
+    assert expand("How much exercise do dogs need?", "beagle") is None
+
+
+def test_build():
+    index = _index()
+    assert "Tell me the height of the German Shepherd." in index.questions
+    # Closed templates are kept as written, open ones only completed
+    assert "How much exercise do dogs need?" in index.questions
+    assert "Tell me the height of" not in index.questions
+    assert not any("image" in q.lower() and "Beagle" in q for q in index.questions)
+
+
+def test_suggest_matches_word_starts():
+    index = _index()
+    assert "Tell me the height of the Beagle." in _questions(index.suggest("tell me the he"))
+    assert "Is the Beagle good with children?" in _questions(index.suggest("bea", limit=20))
+    # Past SUGGEST_CACHE_CHARS: ranked from the array slice
+    assert _questions(index.suggest("beagle good")) == ["Is the Beagle good with children?"]
+    assert index.suggest("zzz") == []
+
+
+def test_suggest_limit_and_one_row_per_question():
+    index = _index()
+    results = index.suggest("", limit=5)
+    assert len(results) == 5
+    assert len(set(_questions(results))) == 5
+    # "shepherd" is a word start of two different keys of the same question
+    questions = _questions(index.suggest("shepherd", limit=20))
+    assert len(questions) == len(set(questions))
+
+
+def test_observe_counts_template_and_breed():
+    index = _index()
+    index.observe("Tell me the height of the Beagle.")
+    index.observe("tell me the height of a german shepherd please")
+    index.observe("  IS THE BEAGLE GOOD WITH CHILDREN  ")
+    index.observe("hello there")
+    index.observe("")
+
+    assert index.pending == {
+        ("Tell me the height of", "beagle"): 1,
+        # Longest breed wins over "shepherd"
+        ("Tell me the height of", "german shepherd"): 1,
+        ("Is this breed good with children?", "beagle"): 1
+    }
+
+
+def test_observe_matches_whole_breed_names():
+    index = SuggestIndex()
+    index.build(TEMPLATES, BREEDS + ["pug"])
+    index.observe("tell me the height of a pugnacious beagle")
+    index.observe("tell me the height of the shepherds")
+    index.observe("my dog is a pug")
+
+    assert index.pending == {
+        ("Tell me the height of", "beagle"): 1,
+        ("Tell me the height of", ""): 1,
+        ("", "pug"): 1
+    }
+
+
+def test_refresh_persists_and_reranks(db):
+    index = _index()
+    before = _questions(index.suggest("is the", limit=3))
+
+    for _ in range(3):
+        index.observe("Is the shepherd good with children?")
+    asyncio.run(index.refresh())
+
+    assert index.pending == {}
+    assert index.totals[("Is this breed good with children?", "shepherd")] == 3
+    ranked = _questions(index.suggest("is the", limit=3))
+    assert ranked[0] == "Is the Shepherd good with children?"
+    assert ranked != before
+
+    # A second worker converges on the stored totals
+    other = _index()
+    asyncio.run(other.refresh())
+    assert other.totals == index.totals
+    assert _questions(other.suggest("is the", limit=3)) == ranked
+
+    # Counts add up across refreshes
+    index.observe("Is the shepherd good with children?")
+    asyncio.run(index.refresh())
+    assert index.totals[("Is this breed good with children?", "shepherd")] == 4
+
+
+def test_failed_write_keeps_pending(db, monkeypatch):
+    index = _index()
+    index.observe("Tell me the height of the Beagle.")
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("down")
+
+    monkeypatch.setattr("utils.suggest.suggest_popularity.bulk_write", fail)
+    asyncio.run(index.refresh())
+    assert index.pending == {("Tell me the height of", "beagle"): 1}
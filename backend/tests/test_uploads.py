@@ -0,0 +1,130 @@
+import asyncio
+import io
+import json
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from utils.uploads import (
+    UPLOAD_CHUNK_BYTES, UploadLimitMiddleware,
+    check_image_bytes, read_image_upload, sniff_image_type
+)
+
+
+def _png(size=(4, 4)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, "red").save(out, format="PNG")
+    return out.getvalue()
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="dog.png")
+
+
+def test_sniff_image_type():
+    assert sniff_image_type(b"\xff\xd8\xff\xe0rest") == "image/jpeg"
+    assert sniff_image_type(_png()) == "image/png"
+    assert sniff_image_type(b"GIF89a...") == "image/gif"
+    assert sniff_image_type(b"BM....") == "image/bmp"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    # A RIFF container that isn't WebP (e.g. WAV) is not an image
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WAVEfmt ") is None
+    assert sniff_image_type(b"<svg xmlns=") is None
+    assert sniff_image_type(b"") is None
+
+
+def test_read_image_upload():
+    data = _png()
+    assert asyncio.run(read_image_upload(_upload(data))) == (data, "image/png")
+
+
+@pytest.mark.parametrize("size", [100, UPLOAD_CHUNK_BYTES * 3])
+def test_read_image_upload_over_cap_is_413(size):
+    # Over the cap within the first chunk, and only after several
+    data = b"\xff\xd8\xff" + b"\0" * size
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(read_image_upload(_upload(data), max_bytes=size))
+    assert exc.value.status_code == 413
+
+
+def test_read_image_upload_non_image_is_415():
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(read_image_upload(_upload(b"%PDF-1.7 ...")))
+    assert exc.value.status_code == 415
+
+
+def test_check_image_bytes():
+    assert check_image_bytes(_png()) == "image/png"
+
+    with pytest.raises(HTTPException) as exc:
+        check_image_bytes(_png(), max_bytes=10)
+    assert exc.value.status_code == 413
+
+    with pytest.raises(HTTPException) as exc:
+        check_image_bytes(b"not an image")
+    assert exc.value.status_code == 415
+
+
+# -------------------------------------------------
+# UploadLimitMiddleware, driven as a bare ASGI app
+# -------------------------------------------------
+async def _reading_app(scope, receive, send):
+    """Reads the whole body like a form parser, then answers 200."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise RuntimeError("client disconnected")
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(chunks: list[bytes], content_type=b"multipart/form-data; boundary=x", content_length=None,
+          max_bytes=100):
+    headers = [(b"content-type", content_type)]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/api/predict", "headers": headers}
+
+    pending = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+    received = 0
+    sent = []
+
+    async def receive():
+        nonlocal received
+        received += 1
+        return pending.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(UploadLimitMiddleware(_reading_app, max_bytes=max_bytes)(scope, receive, send))
+    return sent, received
+
+
+def test_middleware_passes_small_uploads():
+    sent, received = _call([b"a" * 60, b"b" * 40], content_length=100)
+    assert sent[0]["status"] == 200
+    assert received == 2
+
+
+def test_middleware_rejects_by_content_length_without_reading():
+    sent, received = _call([b"a" * 200], content_length=200)
+    assert sent[0]["status"] == 413
+    assert json.loads(sent[1]["body"])["detail"].startswith("Upload larger than")
+    assert received == 0
+
+
+def test_middleware_stops_a_streamed_body_at_the_cap():
+    # No Content-Length (chunked): cut off at the chunk that crosses the cap
+    sent, received = _call([b"a" * 60, b"b" * 60, b"c" * 60])
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body"]
+    assert sent[0]["status"] == 413
+    assert received == 2
+
+
+def test_middleware_ignores_other_requests():
+    sent, _ = _call([b"a" * 200], content_type=b"application/json", content_length=200)
+    assert sent[0]["status"] == 200
@@ -0,0 +1,229 @@
+# backend/tests/test_write_buffer.py
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from utils import write_buffer
+from utils.chat_store import STORAGE_BUCKETS
+from utils.mongo import chat_buckets, chat_history, chat_sessions
+from utils.write_buffer import ChatWriteBuffer
+
+
+def _session(db, **fields) -> str:
+    oid = ObjectId()
+    asyncio.run(chat_sessions.insert_one({"_id": oid, "user_id": "u1", "message_count": 0,
+                                          "created_at": datetime.utcnow(), **fields}))
+    return str(oid)
+
+
+async def _count(session_id: str) -> int:
+    return (await chat_sessions.find_one({"_id": ObjectId(session_id)}))["message_count"]
+
+
+def _messages(session_id: str, n: int, start: int = 0) -> list[dict]:
+    return [{"user_id": "u1", "session_id": session_id, "role": "user", "message": f"m{i}"}
+            for i in range(start, start + n)]
+
+
+async def _stored(session_id: str) -> list[str]:
+    docs = await chat_history.find({"session_id": session_id}).sort([("created_at", 1), ("_id", 1)]).to_list()
+    return [d["message"] for d in docs]
+
+
+def test_stop_drains_queue_and_updates_counters(db):
+    sid = _session(db)
+
+    async def run():
+        buffer = ChatWriteBuffer(max_batch=3, flush_interval=60)
+        buffer.start()
+        buffer.add(_messages(sid, 7))
+        await buffer.stop()
+        session = await chat_sessions.find_one({"_id": ObjectId(sid)})
+        return await _stored(sid), session["message_count"], buffer.pending
+
+    stored, count, pending = asyncio.run(run())
+
+    assert stored == [f"m{i}" for i in range(7)]
+    assert count == 7
+    assert pending == 0
+
+
+def test_stop_waits_for_flush_in_progress(db, monkeypatch):
+    sid = _session(db)
+    original = chat_history.insert_many
+    started = None
+
+    async def slow_insert(docs, **kwargs):
+        started.set()
+        await asyncio.sleep(0.05)
+        return await original(docs, **kwargs)
+
+    monkeypatch.setattr(chat_history, "insert_many", slow_insert)
+
+    async def run():
+        nonlocal started
+        started = asyncio.Event()
+        buffer = ChatWriteBuffer(max_batch=100, flush_interval=0.01)
+        buffer.start()
+        buffer.add(_messages(sid, 5))
+        await started.wait()
+        # Stop while the batch is mid-insert
+        await buffer.stop()
+        return await _stored(sid)
+
+    assert asyncio.run(run()) == [f"m{i}" for i in range(5)]
+
+
+def test_transient_failure_is_retried(db, monkeypatch):
+    sid = _session(db)
+    original = chat_history.insert_many
+    calls = 0
+
+    async def flaky_insert(docs, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("primary stepped down")
+        return await original(docs, **kwargs)
+
+    monkeypatch.setattr(chat_history, "insert_many", flaky_insert)
+
+    async def run():
+        buffer = ChatWriteBuffer(max_batch=100, flush_interval=60)
+        buffer.add(_messages(sid, 4))
+        await buffer.flush()
+        after_failure = buffer.pending
+        await buffer.flush()
+        return after_failure, buffer.pending, await _stored(sid), await _count(sid)
+
+    after_failure, pending, stored, count = asyncio.run(run())
+
+    assert after_failure == 4
+    assert pending == 0
+    assert stored == [f"m{i}" for i in range(4)]
+    # Positions were reserved once, before the failed insert
+    assert count == 4
+
+
+def test_failed_reservation_is_requeued(db, monkeypatch):
+    sid = _session(db)
+    original = write_buffer.reserve_positions
+    calls = 0
+
+    async def flaky_reserve(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError("primary stepped down")
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(write_buffer, "reserve_positions", flaky_reserve)
+
+    async def run():
+        buffer = ChatWriteBuffer(max_batch=100, flush_interval=60)
+        buffer.add(_messages(sid, 3))
+        await buffer.flush()
+        after_failure = buffer.pending
+        await buffer.flush()
+        return after_failure, buffer.pending, await _stored(sid), await _count(sid)
+
+    assert asyncio.run(run()) == (3, 0, ["m0", "m1", "m2"], 3)
+
+
+def test_failed_bucket_push_is_retried_once(db, monkeypatch):
+    sid = _session(db, storage=STORAGE_BUCKETS)
+    original = chat_buckets.update_one
+    calls = 0
+
+    async def lost_ack(*args, **kwargs):
+        # The first push is applied but its reply never arrives
+        nonlocal calls
+        calls += 1
+        result = await original(*args, **kwargs)
+        if calls == 1:
+            raise ConnectionError("connection reset")
+        return result
+
+    monkeypatch.setattr(chat_buckets, "update_one", lost_ack)
+
+    async def run():
+        buffer = ChatWriteBuffer(max_batch=100, flush_interval=60)
+        buffer.add(_messages(sid, 3))
+        await buffer.flush()
+        after_failure = buffer.pending
+        buffer.add(_messages(sid, 1, start=3))
+        await buffer.flush()
+        buckets = await chat_buckets.find({"session_id": sid}).to_list(None)
+        return after_failure, buffer.pending, [m["message"] for b in buckets for m in b["messages"]], await _count(sid)
+
+    after_failure, pending, stored, count = asyncio.run(run())
+
+    assert after_failure == 3
+    assert pending == 0
+    # The retried push didn't add the first three again
+    assert stored == ["m0", "m1", "m2", "m3"]
+    assert count == 4
+
+
+def test_already_written_messages_are_not_duplicated(db):
+    sid = _session(db)
+
+    async def run():
+        buffer = ChatWriteBuffer(max_batch=100, flush_interval=60)
+        docs = _messages(sid, 3)
+        buffer.add(docs)
+        # An earlier attempt wrote the first message, then failed
+        await chat_history.insert_one(dict(docs[0]))
+        await buffer.flush()
+        return buffer.pending, await _stored(sid)
+
+    pending, stored = asyncio.run(run())
+
+    assert pending == 0
+    assert stored == ["m0", "m1", "m2"]
+
+
+def test_poison_message_is_dropped_after_max_attempts(db, monkeypatch):
+    sid = _session(db)
+    original = chat_history.insert_many
+
+    async def rejecting_insert(docs, ordered=True, **kwargs):
+        # The server refuses "m1" (e.g. over the document size limit)
+        bad = next((i for i, d in enumerate(docs) if d["message"] == "m1"), None)
+        if bad is None:
+            return await original(docs, ordered=ordered, **kwargs)
+        await original(docs[:bad], ordered=ordered, **kwargs) if bad else None
+        raise BulkWriteError({"nInserted": bad, "writeErrors": [
+            {"index": bad, "code": 10334, "errmsg": "BSONObj size is invalid"}
+        ]})
+
+    monkeypatch.setattr(chat_history, "insert_many", rejecting_insert)
+
+    async def run():
+        buffer = ChatWriteBuffer(max_batch=100, flush_interval=60, max_attempts=3)
+        buffer.add(_messages(sid, 4))
+        for _ in range(3):
+            await buffer.flush()
+        return buffer.pending, buffer.dropped, await _stored(sid)
+
+    pending, dropped, stored = asyncio.run(run())
+
+    assert pending == 0
+    assert dropped == 1
+    assert stored == ["m0", "m2", "m3"]
+
+
+def test_full_buffer_refuses_with_503(db):
+    sid = _session(db)
+    buffer = ChatWriteBuffer(max_batch=100, flush_interval=60, max_pending=5)
+    buffer.add(_messages(sid, 4))
+
+    with pytest.raises(HTTPException) as exc:
+        buffer.add(_messages(sid, 2, start=4))
+
+    assert exc.value.status_code == 503
+    assert buffer.pending == 4
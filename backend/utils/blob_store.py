@@ -0,0 +1,165 @@
+# backend/utils/blob_store.py
+"""
+Content-addressed image store for chat attachments.
+
+Images are keyed by the SHA-256 of their bytes, so identical uploads are
+stored once. A JPEG thumbnail is generated the first time an image is
+stored and kept next to it under "<hash>.thumb".
+
+IMAGE_STORE=gridfs (default) keeps blobs in the "images" GridFS bucket,
+IMAGE_STORE=local keeps them under IMAGE_STORE_DIR (always the case with
+the in-memory Mongo backend, which has no GridFS).
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+from bson import ObjectId
+from gridfs.errors import FileExists
+from PIL import Image, UnidentifiedImageError
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+
+from utils.mongo import db, MONGO_BACKEND
+from utils.indexes import declare_index, declare_query
+
+IMAGE_STORE = os.getenv("IMAGE_STORE", "gridfs")
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "../image_store")
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))
+
+IMAGE_ROUTE = "/api/images"
+
+
+class LocalBlobStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    @staticmethod
+    def _meta(path: Path) -> Path:
+        # "<key>.meta", not with_suffix: "<hash>.thumb" would collide with "<hash>"
+        return path.with_name(path.name + ".meta")
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).exists)
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        def write():
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Metadata first: the blob appearing is what marks the key as stored
+            for target, content in ((self._meta(path), json.dumps({"content_type": content_type}).encode()),
+                                    (path, data)):
+                tmp = target.with_name(target.name + ".tmp")
+                tmp.write_bytes(content)
+                tmp.replace(target)
+
+        await asyncio.to_thread(write)
+
+    async def get(self, key: str):
+        def read():
+            path = self._path(key)
+            if not path.exists():
+                return None
+            meta = json.loads(self._meta(path).read_text())
+            return path.read_bytes(), meta["content_type"]
+
+        return await asyncio.to_thread(read)
+
+
+class GridFSBlobStore:
+    def __init__(self, database, bucket_name: str = "images"):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+        self.files = database[f"{bucket_name}.files"]
+        self.chunks = database[f"{bucket_name}.chunks"]
+
+        # One file per key: concurrent uploads of the same image can't both land
+        declare_index(f"{bucket_name}.files", "filename", unique=True)
+        declare_query("image by key", f"{bucket_name}.files", {"filename": "k"})
+
+    async def exists(self, key: str) -> bool:
+        return await self.files.find_one({"filename": key}, {"_id": 1}) is not None
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        file_id = ObjectId()
+        try:
+            await self.bucket.upload_from_stream_with_id(
+                file_id, key, data, metadata={"content_type": content_type}
+            )
+        except (DuplicateKeyError, FileExists):
+            # The unique filename index refused it: another request stored the
+            # same image first. GridFS leaves our chunks behind; drop them
+            await self.chunks.delete_many({"files_id": file_id})
+
+    async def get(self, key: str):
+        meta = await self.files.find_one({"filename": key}, {"metadata": 1})
+        if not meta:
+            return None
+        stream = await self.bucket.open_download_stream(meta["_id"])
+        return await stream.read(), meta["metadata"]["content_type"]
+
+
+if IMAGE_STORE == "local" or MONGO_BACKEND == "memory":
+    blob_store = LocalBlobStore(IMAGE_STORE_DIR)
+else:
+    blob_store = GridFSBlobStore(db)
+
+
+# -------------------------------------------------
+# Helpers
+# -------------------------------------------------
+def _make_thumbnail(data: bytes):
+    """Validate the image and return (content_type, thumbnail_jpeg_bytes)."""
+    try:
+        img = Image.open(io.BytesIO(data))
+        content_type = Image.MIME.get(img.format, "application/octet-stream")
+        img = img.convert("RGB")
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Not a valid image: {e}")
+
+    img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=80)
+    return content_type, out.getvalue()
+
+
+async def put_image(data: bytes) -> str:
+    """Store image bytes (deduplicated) and return their content hash."""
+    key = hashlib.sha256(data).hexdigest()
+
+    if await blob_store.exists(key):
+        return key
+
+    content_type, thumb = await asyncio.to_thread(_make_thumbnail, data)
+    await blob_store.put(f"{key}.thumb", thumb, "image/jpeg")
+    await blob_store.put(key, data, content_type)
+    return key
+
+
+async def get_image(key: str, thumbnail: bool = False):
+    """Return (bytes, content_type) or None."""
+    return await blob_store.get(f"{key}.thumb" if thumbnail else key)
+
+
+def decode_data_url(value: str):
+    """bytes for a base64 `data:` URL, None for anything else."""
+    if not value or not value.startswith("data:") or ";base64," not in value:
+        return None
+    try:
+        return base64.b64decode(value.split(";base64,", 1)[1], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def image_urls(image_id: str) -> dict:
+    return {
+        "image": f"{IMAGE_ROUTE}/{image_id}/thumb",
+        "image_url": f"{IMAGE_ROUTE}/{image_id}"
+    }
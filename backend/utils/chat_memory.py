@@ -0,0 +1,237 @@
+# backend/utils/chat_memory.py
+"""
+Per-session conversation memory for /api/chat/message.
+
+Each session keeps, in process memory:
+* the last CHAT_MEMORY_TURNS messages (ring buffer, text truncated)
+* a rolling summary of everything older
+* the last breed the conversation resolved to
+
+Messages pushed out of the ring are folded into the summary in the
+background every CHAT_SUMMARY_EVERY messages, so the prompt stays the same
+size however long the conversation gets. The summary and last breed are
+also saved on the chat_sessions document (`memory`), so a cache miss (new
+worker, eviction, restart) rebuilds the entry from one session read plus
+the last few chat messages instead of the whole transcript.
+
+The cache is an LRU of CHAT_MEMORY_SESSIONS entries. A hit is checked
+against the session's message_count (one point read by _id): an entry that
+doesn't account for every stored message, e.g. because another worker
+answered in the same session, is reloaded. Entries older than
+CHAT_MEMORY_TTL_SECONDS are reloaded regardless.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+
+from bson import ObjectId
+
+from utils.mongo import chat_history, chat_sessions, chat_buckets
+from utils.chat_store import STORAGE_BUCKETS
+from utils.indexes import declare_query
+from utils.tracing import register_gauge
+
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "8"))
+CHAT_MEMORY_SESSIONS = int(os.getenv("CHAT_MEMORY_SESSIONS", "2000"))
+CHAT_MEMORY_TTL_SECONDS = int(os.getenv("CHAT_MEMORY_TTL_SECONDS", "1800"))
+CHAT_SUMMARY_EVERY = int(os.getenv("CHAT_SUMMARY_EVERY", "4"))
+CHAT_SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1200"))
+TURN_MAX_CHARS = 600
+
+declare_query("recent session messages", "chat_history", {"session_id": "s"},
+              sort=[("created_at", -1), ("_id", -1)])
+declare_query("latest session buckets", "chat_buckets", {"session_id": "s"}, sort=[("seq", -1)])
+
+
+def _turn(role: str, text: str) -> dict:
+    return {"role": role, "text": (text or "")[:TURN_MAX_CHARS]}
+
+
+def fallback_summary(summary: str, turns: list[dict]) -> str:
+    """Extractive fold used when the summarizer is unavailable."""
+    lines = [summary] if summary else []
+    lines += [f"{t['role']}: {t['text'][:160]}" for t in turns]
+    # Keep the most recent part when over budget
+    return "\n".join(lines)[-CHAT_SUMMARY_MAX_CHARS:]
+
+
+class SessionMemory:
+    __slots__ = ("session_id", "turns", "summary", "last_breed", "pending", "loaded_at", "folding",
+                 "message_count")
+
+    def __init__(self, session_id: str, summary: str = "", last_breed: str | None = None, message_count: int = 0):
+        self.session_id = session_id
+        self.turns: deque = deque(maxlen=CHAT_MEMORY_TURNS)
+        self.summary = summary
+        self.last_breed = last_breed
+        self.pending: list[dict] = []  # pushed out of the ring, not yet summarized
+        self.loaded_at = time.monotonic()
+        self.folding = False
+        # Stored messages this entry accounts for (the turn being answered excluded)
+        self.message_count = message_count
+
+    def add(self, role: str, text: str):
+        if len(self.turns) == self.turns.maxlen:
+            self.pending.append(self.turns[0])
+        self.turns.append(_turn(role, text))
+
+    def context(self) -> dict:
+        """What the prompt builder gets: bounded regardless of history length."""
+        return {
+            "summary": self.summary,
+            "turns": list(self.turns),
+            "last_breed": self.last_breed
+        }
+
+
+class ConversationMemory:
+    def __init__(self, summarize=None, max_sessions: int = CHAT_MEMORY_SESSIONS):
+        # summarize(previous_summary, turns) -> str; blocking, run in a thread
+        self.summarize = summarize
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, SessionMemory] = OrderedDict()
+        self._tasks: set = set()
+        self.hits = 0
+        self.misses = 0
+
+    # -------------------------------------------------
+    # Lookup
+    # -------------------------------------------------
+    async def get(self, session_id: str, current_message: str | None = None) -> SessionMemory:
+        memory = self._sessions.get(session_id)
+        if memory is not None and time.monotonic() - memory.loaded_at < CHAT_MEMORY_TTL_SECONDS \
+                and await self._in_sync(memory, current_message):
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return memory
+
+        self.misses += 1
+        memory = await self._load(session_id, current_message)
+        self._sessions[session_id] = memory
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return memory
+
+    async def _in_sync(self, memory: SessionMemory, current_message: str | None) -> bool:
+        """True if no message was stored in the session behind the entry's back."""
+        if not ObjectId.is_valid(memory.session_id):
+            return True
+        session = await chat_sessions.find_one({"_id": ObjectId(memory.session_id)},
+                                               {"message_count": 1, "last_message": 1})
+        if not session:
+            return False
+
+        count = session.get("message_count", 0)
+        if count == memory.message_count:
+            return True
+        # The frontend may already have saved the message being answered (see _load)
+        return current_message is not None and count == memory.message_count + 1 \
+            and session.get("last_message") == current_message
+
+    async def _load(self, session_id: str, current_message: str | None) -> SessionMemory:
+        if not ObjectId.is_valid(session_id):
+            return SessionMemory(session_id)
+
+        session = await chat_sessions.find_one({"_id": ObjectId(session_id)},
+                                               {"memory": 1, "storage": 1, "message_count": 1})
+        if not session:
+            return SessionMemory(session_id)
+
+        saved = session.get("memory") or {}
+        memory = SessionMemory(session_id, saved.get("summary", ""), saved.get("last_breed"),
+                               session.get("message_count", 0))
+
+        recent = await self._recent_messages(session_id, session.get("storage"))
+        # The frontend saves the user's message before asking the bot, so
+        # the newest stored message may be the one being answered right now
+        if recent and current_message is not None and recent[-1]["role"] == "user" \
+                and recent[-1]["message"] == current_message:
+            recent.pop()
+            memory.message_count -= 1
+
+        for msg in recent[-CHAT_MEMORY_TURNS:]:
+            memory.add(msg["role"], msg["message"])
+        return memory
+
+    async def _recent_messages(self, session_id: str, storage: str | None) -> list[dict]:
+        """Last CHAT_MEMORY_TURNS + 1 messages, oldest first."""
+        n = CHAT_MEMORY_TURNS + 1
+        if storage == STORAGE_BUCKETS:
+            messages = []
+            # Newest buckets first; two cover n unless buckets are tiny
+            async for bucket in chat_buckets.find({"session_id": session_id}, {"messages": 1}) \
+                    .sort("seq", -1).limit(max(2, n)):
+                messages = bucket.get("messages", []) + messages
+                if len(messages) >= n:
+                    break
+            return messages[-n:]
+
+        cursor = chat_history.find({"session_id": session_id}, {"role": 1, "message": 1}) \
+            .sort([("created_at", -1), ("_id", -1)]).limit(n)
+        messages = [doc async for doc in cursor]
+        messages.reverse()
+        return messages
+
+    # -------------------------------------------------
+    # Updates
+    # -------------------------------------------------
+    def record(self, memory: SessionMemory, user_message: str, answer: str, breed: str | None):
+        memory.add("user", user_message)
+        memory.add("bot", answer)
+        # Both are about to be stored by the caller
+        memory.message_count += 2
+
+        breed_changed = breed is not None and breed != memory.last_breed
+        if breed_changed:
+            memory.last_breed = breed
+
+        if len(memory.pending) >= CHAT_SUMMARY_EVERY and not memory.folding:
+            memory.folding = True
+            self._spawn(self._fold(memory))
+        elif breed_changed:
+            self._spawn(self._save(memory))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, memory: SessionMemory):
+        turns = memory.pending
+        memory.pending = []
+        try:
+            summary = None
+            if self.summarize is not None:
+                try:
+                    summary = await asyncio.to_thread(self.summarize, memory.summary, turns)
+                except Exception as e:
+                    print(f"⚠️ Chat summary failed for {memory.session_id}: {e}")
+            memory.summary = (summary or fallback_summary(memory.summary, turns))[:CHAT_SUMMARY_MAX_CHARS]
+            await self._save(memory)
+        finally:
+            memory.folding = False
+
+    async def _save(self, memory: SessionMemory):
+        if not ObjectId.is_valid(memory.session_id):
+            return
+        try:
+            await chat_sessions.update_one(
+                {"_id": ObjectId(memory.session_id)},
+                {"$set": {"memory": {"summary": memory.summary, "last_breed": memory.last_breed}}}
+            )
+        except Exception as e:
+            print(f"⚠️ Chat memory not saved for {memory.session_id}: {e}")
+
+    def forget(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+
+# routers/chat.py plugs in the Gemini summarizer
+chat_memory = ConversationMemory()
+
+register_gauge("dogbreed_chat_memory_sessions", "Sessions held in the conversation memory cache",
+               lambda: len(chat_memory._sessions))
+register_gauge("dogbreed_chat_memory_lookups", "Conversation memory cache hits and misses",
+               lambda: [({"result": "hit"}, chat_memory.hits), ({"result": "miss"}, chat_memory.misses)])
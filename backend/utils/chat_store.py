@@ -0,0 +1,448 @@
+# backend/utils/chat_store.py
+"""
+Chat message storage.
+
+Two layouts live side by side, chosen per session by `storage` on the
+chat_sessions document:
+
+* "documents" – one chat_history document per message (original layout)
+* "buckets"   – chat_buckets documents holding up to CHAT_BUCKET_SIZE
+                messages each, keyed by (session_id, seq)
+
+New sessions use CHAT_STORAGE_MODE. Idle "documents" sessions are compacted
+into buckets by the retention loop; while that runs the session is
+"compacting" and is still read and written as documents.
+
+Every writer reserves its messages' positions with one atomic update that
+also returns the layout to write to. A writer that reserved while the
+session was "compacting" can still insert its documents after the switch;
+such leftovers are merged into bucketed reads until absorb_leftovers()
+moves them into the buckets.
+"""
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from utils.mongo import chat_history, chat_sessions, chat_buckets
+from utils.pagination import decode_cursor, encode_cursor, keyset_query, keyset_sort
+from utils.indexes import declare_index, declare_query
+
+STORAGE_DOCUMENTS = "documents"
+STORAGE_BUCKETS = "buckets"
+STORAGE_COMPACTING = "compacting"  # documents being copied into buckets
+
+CHAT_STORAGE_MODE = os.getenv("CHAT_STORAGE_MODE", STORAGE_DOCUMENTS)
+CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", "100"))
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "0"))  # 0 → keep forever
+COMPACT_MAX_ROUNDS = 10
+# A "compacting" claim older than this belongs to a run that died
+COMPACT_LEASE = timedelta(hours=1)
+# Same for a claim on a bucketed session's leftover documents
+ABSORB_LEASE = timedelta(minutes=5)
+
+
+def session_messages_query(session_id: str) -> dict:
+    """A "documents" session's messages (chat_history), read in keyset order."""
+    return {"session_id": session_id}
+
+
+def _bucket_expiry_query(session_id: str, expire_at: datetime) -> dict:
+    return {"session_id": session_id, "$or": [{"expire_at": {"$lt": expire_at}}, {"expire_at": None}]}
+
+
+def _bucket_page_query(session_id: str, bound_at: datetime | None, direction: int = 1) -> dict:
+    """Buckets that can hold messages after (direction 1) / before (-1) `bound_at`."""
+    query = {"session_id": session_id}
+    if bound_at:
+        query["last_at" if direction == 1 else "first_at"] = {"$gte" if direction == 1 else "$lte": bound_at}
+    return query
+
+
+_SAMPLE_AT = datetime(2000, 1, 1)
+
+declare_index("chat_buckets", [("session_id", 1), ("seq", 1)], unique=True)
+declare_index("chat_buckets", "expire_at", expireAfterSeconds=0)
+declare_query("session buckets", "chat_buckets", _bucket_page_query("s", None), sort=[("seq", 1)])
+declare_query("session buckets from cursor", "chat_buckets", _bucket_page_query("s", _SAMPLE_AT), sort=[("seq", 1)])
+declare_query("session buckets before cursor", "chat_buckets", _bucket_page_query("s", _SAMPLE_AT, -1),
+              sort=[("seq", -1)])
+declare_query("session buckets to re-expire", "chat_buckets", _bucket_expiry_query("s", _SAMPLE_AT))
+declare_query("session message ids", "chat_history", session_messages_query("s"))
+declare_query("bucketed message ids", "chat_buckets", {"session_id": "s", "messages._id": {"$in": [ObjectId("0" * 24)]}})
+declare_index("chat_sessions", "leftovers", sparse=True)
+declare_index("chat_sessions", "absorbing_at", sparse=True)
+declare_query("sessions with leftovers", "chat_sessions", {"leftovers": True})
+declare_query("stale leftover claims", "chat_sessions", {"absorbing_at": {"$lt": _SAMPLE_AT}})
+
+
+def _expire_at(last_at: datetime):
+    """TTL for a session's buckets, counted from its latest message."""
+    if CHAT_RETENTION_DAYS <= 0:
+        return None
+    return last_at + timedelta(days=CHAT_RETENTION_DAYS)
+
+
+def _bucket_message(doc: dict) -> dict:
+    return {
+        "_id": doc["_id"],
+        "role": doc["role"],
+        "message": doc["message"],
+        "image": doc.get("image"),
+        "image_id": doc.get("image_id"),
+        "created_at": doc["created_at"]
+    }
+
+
+# -------------------------------------------------
+# Storage lookup
+# -------------------------------------------------
+async def session_storage(session_ids: list[str]) -> dict:
+    """Map session_id → storage layout (missing/legacy → documents)."""
+    oids = [ObjectId(sid) for sid in session_ids if ObjectId.is_valid(sid)]
+    storage = {sid: STORAGE_DOCUMENTS for sid in session_ids}
+    if not oids:
+        return storage
+
+    async for session in chat_sessions.find({"_id": {"$in": oids}}, {"storage": 1}):
+        storage[str(session["_id"])] = session.get("storage", STORAGE_DOCUMENTS)
+    return storage
+
+
+# -------------------------------------------------
+# Writes
+# -------------------------------------------------
+async def reserve_positions(session_id: str, docs: list[dict]):
+    """
+    Bump the session's counters for `docs` and return (storage, first_pos),
+    where first_pos is the 0-based position of docs[0] within the session.
+    """
+    last = docs[-1]
+    session = await chat_sessions.find_one_and_update(
+        {"_id": ObjectId(session_id)},
+        {
+            "$set": {
+                "updated_at": last["created_at"],
+                "last_message": last["message"],
+                "last_message_at": last["created_at"]
+            },
+            "$inc": {"message_count": len(docs)}
+        },
+        projection={"storage": 1, "message_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if not session:
+        return STORAGE_DOCUMENTS, 0
+
+    storage = session.get("storage", STORAGE_DOCUMENTS)
+    return storage, session["message_count"] - len(docs)
+
+
+async def _push_chunk(session_id: str, user_id: str, seq: int, chunk: list[dict]):
+    """
+    Push `chunk` into bucket `seq` unless it's there already. The guard
+    makes a retried push (its reply lost, say) a no-op; when only part of
+    the chunk is there, the rest is pushed.
+    """
+    while chunk:
+        query = {"session_id": session_id, "seq": seq, "messages._id": {"$nin": [d["_id"] for d in chunk]}}
+        update = {
+            "$push": {"messages": {"$each": [_bucket_message(d) for d in chunk]}},
+            "$inc": {"count": len(chunk)},
+            "$min": {"first_at": chunk[0]["created_at"]},
+            "$max": {"last_at": chunk[-1]["created_at"]},
+            "$setOnInsert": {"user_id": user_id}
+        }
+        try:
+            await chat_buckets.update_one(query, update, upsert=True)
+            return
+        except DuplicateKeyError:
+            # The bucket exists: created concurrently, or it holds part of the chunk
+            result = await chat_buckets.update_one(query, update)
+            if result.matched_count:
+                return
+
+        bucket = await chat_buckets.find_one({"session_id": session_id, "seq": seq}, {"messages": 1})
+        present = {m["_id"] for m in bucket["messages"]}
+        chunk = [d for d in chunk if d["_id"] not in present]
+
+
+async def append_to_buckets(session_id: str, user_id: str, docs: list[dict], first_pos: int):
+    """Push docs into the buckets their positions fall in (usually one)."""
+    by_seq: dict[int, list[dict]] = {}
+    for offset, doc in enumerate(docs):
+        by_seq.setdefault((first_pos + offset) // CHAT_BUCKET_SIZE, []).append(doc)
+
+    for seq, chunk in by_seq.items():
+        await _push_chunk(session_id, user_id, seq, chunk)
+
+    # Buckets expire with the session's idleness, not their own last
+    # message, so an active session never loses its older buckets
+    expire_at = _expire_at(docs[-1]["created_at"])
+    if expire_at:
+        await chat_buckets.update_many(_bucket_expiry_query(session_id, expire_at), {"$set": {"expire_at": expire_at}})
+
+
+async def append_messages(session_id: str, docs: list[dict]):
+    """Persist messages of one session in order, honouring its layout."""
+    storage, first_pos = await reserve_positions(session_id, docs)
+
+    if storage == STORAGE_BUCKETS:
+        await append_to_buckets(session_id, docs[0]["user_id"], docs, first_pos)
+    else:
+        await chat_history.insert_many(docs, ordered=True)
+        if storage == STORAGE_COMPACTING:
+            await settle_documents([session_id])
+
+
+async def settle_documents(session_ids: list[str]):
+    """
+    Call after inserting documents whose reservation returned "compacting":
+    sessions that have been switched to buckets meanwhile absorb them.
+    """
+    storage = await session_storage(session_ids)
+    for session_id in session_ids:
+        if storage[session_id] == STORAGE_BUCKETS:
+            await absorb_leftovers(session_id)
+
+
+async def absorb_leftovers(session_id: str):
+    """
+    Move a bucketed session's chat_history documents into its buckets.
+
+    The `leftovers` flag is raised first and cleared by whoever claims the
+    session, so a writer that finds the session already claimed leaves its
+    documents to the claimant's next round. A failed round raises the flag
+    again for the retention sweep to retry.
+    """
+    oid = ObjectId(session_id)
+    await chat_sessions.update_one({"_id": oid, "storage": STORAGE_BUCKETS}, {"$set": {"leftovers": True}})
+
+    while True:
+        now = datetime.utcnow()
+        claimed = await chat_sessions.find_one_and_update(
+            {"_id": oid, "storage": STORAGE_BUCKETS, "leftovers": True, "$or": [
+                {"absorbing_at": None},
+                {"absorbing_at": {"$lt": now - ABSORB_LEASE}}
+            ]},
+            {"$set": {"absorbing_at": now}, "$unset": {"leftovers": ""}},
+            projection={"_id": 1}
+        )
+        if not claimed:
+            return
+
+        try:
+            late = await chat_history.find(session_messages_query(session_id)).sort(keyset_sort()).to_list(None)
+            if late:
+                # A round that died between append and delete already moved some
+                ids = [d["_id"] for d in late]
+                moved = {
+                    m["_id"]
+                    async for bucket in chat_buckets.find({"session_id": session_id, "messages._id": {"$in": ids}},
+                                                          {"messages": 1})
+                    for m in bucket["messages"]
+                }
+                missing = [d for d in late if d["_id"] not in moved]
+                if missing:
+                    await append_messages(session_id, missing)
+                await chat_history.delete_many({"_id": {"$in": ids}})
+        except Exception:
+            await chat_sessions.update_one({"_id": oid}, {"$set": {"leftovers": True}, "$unset": {"absorbing_at": ""}})
+            raise
+        await chat_sessions.update_one({"_id": oid}, {"$unset": {"absorbing_at": ""}})
+
+
+# -------------------------------------------------
+# Reads
+# -------------------------------------------------
+def _message_key(msg: dict):
+    return msg["created_at"], msg["_id"]
+
+
+async def _leftover_page(session_id: str, cursor: str | None, limit: int, direction: int = 1) -> list:
+    """Up to limit + 1 not yet absorbed documents of a bucketed session past `cursor`."""
+    return await chat_history.find(
+        keyset_query(session_messages_query(session_id), cursor, direction)
+    ).sort(keyset_sort(direction)).limit(limit + 1).to_list(limit + 1)
+
+
+async def read_bucket_page(session_id: str, cursor: str | None, limit: int, direction: int = 1):
+    """Keyset page over a bucketed session; same cursor format and order as fetch_page()."""
+    bound = decode_cursor(cursor) if cursor else None
+    query = _bucket_page_query(session_id, bound[0] if bound else None, direction)
+    newest_first = direction == -1
+
+    docs = {d["_id"]: d for d in await _leftover_page(session_id, cursor, limit, direction)}
+    async for bucket in chat_buckets.find(query).sort("seq", direction):
+        # Positions follow arrival, not always created_at; stop once this
+        # bucket starts past the page edge
+        if len(docs) > limit:
+            edge = sorted(map(_message_key, docs.values()), reverse=newest_first)[limit]
+            if (bucket["first_at"] > edge[0]) if direction == 1 else (bucket["last_at"] < edge[0]):
+                break
+        for msg in bucket.get("messages", []):
+            key = _message_key(msg)
+            if bound and (key <= bound if direction == 1 else key >= bound):
+                continue
+            docs[msg["_id"]] = msg
+
+    docs = sorted(docs.values(), key=_message_key, reverse=newest_first)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+
+    return docs, next_cursor
+
+
+async def iter_bucket_messages(session_id: str):
+    """Every message of a bucketed session, leftover documents merged in by created_at."""
+    leftovers = await chat_history.find(session_messages_query(session_id)).sort(keyset_sort()).to_list(None)
+    seen = set()
+    async for bucket in chat_buckets.find(_bucket_page_query(session_id, None)).sort("seq", 1):
+        for msg in bucket.get("messages", []):
+            while leftovers and _message_key(leftovers[0]) < _message_key(msg):
+                doc = leftovers.pop(0)
+                if doc["_id"] not in seen:
+                    seen.add(doc["_id"])
+                    yield doc
+            if msg["_id"] not in seen:
+                seen.add(msg["_id"])
+                yield msg
+    for doc in leftovers:
+        if doc["_id"] not in seen:
+            yield doc
+
+
+# -------------------------------------------------
+# Background job bodies (see utils/jobs.py)
+# -------------------------------------------------
+DELETE_CHUNK = 1000
+
+
+async def delete_session_messages(session_id: str, progress):
+    """Remove every message of a session in chunks, reporting progress."""
+    total = await chat_history.count_documents(session_messages_query(session_id))
+    total += await chat_buckets.count_documents({"session_id": session_id})
+    await progress(0, total)
+
+    done = 0
+    while True:
+        ids = [
+            d["_id"] async for d in
+            chat_history.find(session_messages_query(session_id), {"_id": 1}).limit(DELETE_CHUNK)
+        ]
+        if not ids:
+            break
+        result = await chat_history.delete_many({"_id": {"$in": ids}})
+        done += result.deleted_count
+        await progress(done, total)
+
+    result = await chat_buckets.delete_many({"session_id": session_id})
+    done += result.deleted_count
+    await progress(done, total)
+
+
+async def _copy_documents(session_id: str, user_id: str, after: str | None, copied: list, progress, total: int):
+    """Append the session's documents past cursor `after` to buckets; returns the new cursor."""
+    query = keyset_query(session_messages_query(session_id), after)
+
+    batch = []
+
+    async def push():
+        await append_to_buckets(session_id, user_id, batch, len(copied))
+        copied.extend(d["_id"] for d in batch)
+        batch.clear()
+        await progress(len(copied), max(total, len(copied)))
+
+    async for doc in chat_history.find(query).sort(keyset_sort()):
+        batch.append(doc)
+        after = encode_cursor(doc)
+        if len(batch) == CHAT_BUCKET_SIZE:
+            await push()
+    if batch:
+        await push()
+    return after
+
+
+async def _copy_and_switch(session_id: str, user_id: str, progress):
+    """Copy documents into fresh buckets and switch layouts; returns the copied _ids."""
+    oid = ObjectId(session_id)
+    # Leftovers of an interrupted run; nobody reads them before the switch
+    await chat_buckets.delete_many({"session_id": session_id})
+
+    total = await chat_history.count_documents(session_messages_query(session_id))
+    await progress(0, total)
+
+    copied, after = [], None
+    for _ in range(COMPACT_MAX_ROUNDS):
+        current = await chat_sessions.find_one({"_id": oid}, {"message_count": 1})
+        if not current:
+            return None  # deleted meanwhile; its delete job removes everything
+        count = current.get("message_count")  # None also matches a legacy session without one
+
+        after = await _copy_documents(session_id, user_id, after, copied, progress, total)
+
+        # Positions of future appends continue right after the copied ones
+        switched = await chat_sessions.update_one(
+            {"_id": oid, "storage": STORAGE_COMPACTING, "message_count": count},
+            {
+                "$set": {"storage": STORAGE_BUCKETS},
+                "$unset": {"compacting_at": ""},
+                "$inc": {"message_count": len(copied) - (count or 0)}
+            }
+        )
+        if switched.modified_count:
+            return copied
+
+    raise RuntimeError(f"session kept receiving messages over {COMPACT_MAX_ROUNDS} copy passes")
+
+
+async def compact_session(session_id: str, progress):
+    """
+    Pack a "documents" session into buckets, then drop the originals.
+
+    The session is marked "compacting" (still read and written as
+    documents) while its messages are copied; the switch to buckets is a
+    single update that only applies if no message was added since the last
+    copy pass, and sets message_count to what was copied. A failed run
+    leaves the session readable as documents and can simply be repeated.
+    """
+    oid = ObjectId(session_id)
+    now = datetime.utcnow()
+    session = await chat_sessions.find_one_and_update(
+        {"_id": oid, "$or": [
+            {"storage": {"$nin": [STORAGE_BUCKETS, STORAGE_COMPACTING]}},
+            {"storage": STORAGE_COMPACTING, "compacting_at": {"$lt": now - COMPACT_LEASE}}
+        ]},
+        {"$set": {"storage": STORAGE_COMPACTING, "compacting_at": now}},
+        projection={"user_id": 1}
+    )
+    if not session:
+        await progress(0, 0)
+        return
+
+    try:
+        copied = await _copy_and_switch(session_id, session["user_id"], progress)
+    except Exception:
+        # Hand the session back as documents so the next run starts clean
+        await chat_sessions.update_one(
+            {"_id": oid, "storage": STORAGE_COMPACTING},
+            {"$set": {"storage": STORAGE_DOCUMENTS}, "$unset": {"compacting_at": ""}}
+        )
+        raise
+    if copied is None:
+        return
+
+    for start in range(0, len(copied), DELETE_CHUNK):
+        await chat_history.delete_many({"_id": {"$in": copied[start:start + DELETE_CHUNK]}})
+
+    # Documents of writers that reserved before the switch; one still
+    # inserting now absorbs its own (see settle_documents)
+    await absorb_leftovers(session_id)
+
+    done = len(copied)
+    await progress(done, done)
@@ -0,0 +1,405 @@
+# backend/utils/embedding_index.py
+"""
+"Find similar dogs" index over past uploads.
+
+Every classified upload contributes the penultimate-layer embedding of the
+first model tier (models/dog_model.py computes it in the same forward pass
+as the logits). Rows are stored as unit-length float16 vectors in
+memory-mapped files under EMBEDDING_INDEX_DIR:
+
+    vectors.f16   (capacity, dim) float16   unit vectors
+    owners.i32    (capacity,)     int32     user code, -1 = anonymous
+    classes.i16   (capacity,)     int16     predicted class index
+    keys.u8       (capacity, 32)  uint8     SHA-256 of the stored image
+    users.jsonl   one JSON string per line; line number = user code
+    index.json    dim, count, capacity
+
+Appends write the next row in place (and any new user as one more line
+of users.jsonl) and then bump `count` in index.json, so a crash never
+exposes a half-written row. Files grow by doubling.
+
+Search is a vectorized dot product (cosine, since rows are normalized)
+over one user's rows (row lists per user are kept in memory), or, for
+`shared` searches, over the whole array in EMBEDDING_SEARCH_CHUNK-row
+blocks, keeping only that user's and anonymous rows: one user's uploads
+(chat photos included) are never returned to another.
+
+Embeddings wider than EMBEDDING_DIM are reduced with a fixed random
+orthogonal projection (saved as projection.npy) before storing; that keeps
+cosine similarities close while making 1M rows ~0.5 GB instead of ~2.5 GB.
+EMBEDDING_DIM=0 stores the full width.
+
+Several API workers can share one EMBEDDING_INDEX_DIR: appends hold an
+exclusive flock on index.lock and searches a shared one, and both first
+pick up whatever rows and users other processes appended since (a new
+`count` or `capacity` in index.json), so no row is written twice and every
+worker searches every row.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from utils.tracing import register_gauge
+
+EMBEDDING_INDEX = os.getenv("EMBEDDING_INDEX", "1") == "1"
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "../embedding_index")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+EMBEDDING_SEARCH_CHUNK = int(os.getenv("EMBEDDING_SEARCH_CHUNK", "65536"))
+EMBEDDING_PROJECTION_SEED = 20240611
+INITIAL_CAPACITY = 1024
+KEY_BYTES = 32
+ANONYMOUS = -1
+
+
+class EmbeddingIndex:
+    def __init__(self, root: str, dim: int = EMBEDDING_DIM):
+        self.root = Path(root)
+        self.target_dim = dim
+        self.dim = 0          # set by the first add (or read from index.json)
+        self.count = 0
+        self.capacity = 0
+        self.users: list[str] = []
+        self._user_codes: dict[str, int] = {}
+        self._rows_by_owner: dict[int, list[int]] = {}
+        self._saved_users = 0  # users already in users.jsonl
+        self._users_bytes = 0  # how much of users.jsonl has been read
+        self.projection = None
+        # Threads of this process take _lock; processes, the flock on _lock_fd
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(self.root / "index.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._open()
+
+    # -------------------------------------------------
+    # Files
+    # -------------------------------------------------
+    def _files(self):
+        return {
+            "vectors": (self.root / "vectors.f16", np.float16, (self.dim,)),
+            "owners": (self.root / "owners.i32", np.int32, ()),
+            "classes": (self.root / "classes.i16", np.int16, ()),
+            "keys": (self.root / "keys.u8", np.uint8, (KEY_BYTES,))
+        }
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Hold the index against other threads and processes, caught up with their appends."""
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> dict | None:
+        meta_path = self.root / "index.json"
+        if not meta_path.exists():
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _open(self):
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                meta = self._read_meta()
+                if meta is None:
+                    return
+                if "users" in meta:
+                    # Index written before users.jsonl: move the list over once
+                    with open(self.root / "users.jsonl", "w", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(u) + "\n" for u in meta.pop("users")))
+                    tmp = self.root / "index.json.tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump(meta, f)
+                    tmp.replace(self.root / "index.json")
+                self._drop_torn_user()
+                self._refresh()
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+        print(f"🔹 Embedding index: {self.count} vectors × {self.dim} dims from {self.root}")
+
+    def _refresh(self):
+        """Catch up with rows, users and growth written by other processes."""
+        meta = self._read_meta()
+        if meta is None:
+            return
+        # Also users whose row never got counted (a writer died in between):
+        # their lines still take up codes
+        self._read_new_users()
+        if meta["count"] == self.count and meta["capacity"] == self.capacity:
+            return
+
+        if self.dim == 0:
+            self.dim = meta["dim"]
+            projection_path = self.root / "projection.npy"
+            if projection_path.exists():
+                self.projection = np.load(projection_path)
+        if meta["capacity"] != self.capacity:
+            self._flush()
+            self._map(meta["capacity"])
+
+        self._index_owners(self.count, meta["count"])
+        self.count = meta["count"]
+
+    def _index_owners(self, start: int, end: int):
+        """Add rows [start, end) to the per-user row lists in one pass over the owners column."""
+        owners = np.asarray(self.owners[start:end])
+        order = np.argsort(owners, kind="stable")
+        codes, starts = np.unique(owners[order], return_index=True)
+        for code, rows in zip(codes, np.split(order, starts[1:])):
+            if code != ANONYMOUS:
+                self._rows_by_owner.setdefault(int(code), []).extend((rows + start).tolist())
+
+    def _map(self, capacity: int):
+        """(Re)map every column file at `capacity` rows, growing the files if needed."""
+        for name, (path, dtype, tail) in self._files().items():
+            nbytes = capacity * int(np.prod(tail, dtype=np.int64)) * np.dtype(dtype).itemsize
+            mode = "r+" if path.exists() else "w+"
+            if path.exists() and path.stat().st_size < nbytes:
+                with open(path, "r+b") as f:
+                    f.truncate(nbytes)
+            setattr(self, name, np.memmap(path, dtype=dtype, mode=mode, shape=(capacity, *tail)))
+        self.capacity = capacity
+
+    def _drop_torn_user(self):
+        """Cut a torn last line (crash mid-append) off users.jsonl; needs the exclusive lock."""
+        path = self.root / "users.jsonl"
+        if not path.exists():
+            return
+        with open(path, "r+b") as f:
+            data = f.read()
+            complete = len(data[:data.rfind(b"\n") + 1])
+            if complete != len(data):
+                f.truncate(complete)
+
+    def _read_new_users(self):
+        """Append users other processes added to users.jsonl since the last read."""
+        path = self.root / "users.jsonl"
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            f.seek(self._users_bytes)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        self._users_bytes += len(complete)
+        for line in complete.splitlines():
+            user = json.loads(line)
+            self._user_codes[user] = len(self.users)
+            self.users.append(user)
+        self._saved_users = len(self.users)
+
+    def _save_users(self):
+        """Append users added since the last save; rewrites nothing."""
+        new = self.users[self._saved_users:]
+        if not new:
+            return
+        data = "".join(json.dumps(u) + "\n" for u in new).encode()
+        with open(self.root / "users.jsonl", "ab") as f:
+            f.write(data)
+        self._users_bytes += len(data)
+        self._saved_users = len(self.users)
+
+    def _save_meta(self):
+        meta = {"dim": self.dim, "count": self.count, "capacity": self.capacity}
+        tmp = self.root / "index.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        tmp.replace(self.root / "index.json")
+
+    def _create(self, source_dim: int):
+        if self.target_dim and source_dim > self.target_dim:
+            rng = np.random.default_rng(EMBEDDING_PROJECTION_SEED)
+            q, _ = np.linalg.qr(rng.standard_normal((source_dim, self.target_dim)))
+            self.projection = q.astype(np.float32)
+            np.save(self.root / "projection.npy", self.projection)
+            self.dim = self.target_dim
+        else:
+            self.dim = source_dim
+        self._map(INITIAL_CAPACITY)
+
+    # -------------------------------------------------
+    # Vectors
+    # -------------------------------------------------
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """Project and L2-normalize raw embeddings → float32 (n, dim)."""
+        x = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.projection is not None and x.shape[1] == self.projection.shape[0]:
+            x = x @ self.projection
+        if x.shape[1] != self.dim:
+            raise ValueError(f"Embedding has {x.shape[1]} dims, index has {self.dim}")
+        norms = np.linalg.norm(x, axis=1, keepdims=True)
+        return x / np.maximum(norms, 1e-12)
+
+    def _user_code(self, user_id: str | None) -> int:
+        if not user_id:
+            return ANONYMOUS
+        code = self._user_codes.get(user_id)
+        if code is None:
+            code = self._user_codes[user_id] = len(self.users)
+            self.users.append(user_id)
+        return code
+
+    def add(self, embedding: np.ndarray, image_key: str, class_idx: int, user_id: str | None = None):
+        self.add_many(np.atleast_2d(embedding), [image_key], [class_idx], [user_id])
+
+    def add_many(self, embeddings: np.ndarray, image_keys, class_idx, user_ids):
+        """Append rows; `image_keys` are SHA-256 hex digests (utils/blob_store.py)."""
+        embeddings = np.atleast_2d(embeddings)
+        n = len(embeddings)
+        if n == 0:
+            return
+
+        with self._locked(exclusive=True):
+            if self.dim == 0:
+                self._create(embeddings.shape[1])
+            vectors = self._prepare(embeddings)
+
+            start = self.count
+            if start + n > self.capacity:
+                capacity = max(self.capacity, INITIAL_CAPACITY)
+                while capacity < start + n:
+                    capacity *= 2
+                self._flush()
+                self._map(capacity)
+
+            owners = np.fromiter((self._user_code(u) for u in user_ids), dtype=np.int32, count=n)
+            self.vectors[start:start + n] = vectors.astype(np.float16)
+            self.owners[start:start + n] = owners
+            self.classes[start:start + n] = np.asarray(class_idx, dtype=np.int16)
+            self.keys[start:start + n] = np.frombuffer(
+                b"".join(bytes.fromhex(k) for k in image_keys), dtype=np.uint8
+            ).reshape(n, KEY_BYTES)
+
+            for row, code in zip(range(start, start + n), owners.tolist()):
+                if code != ANONYMOUS:
+                    self._rows_by_owner.setdefault(code, []).append(row)
+
+            # Rows become visible only once count says so
+            self._save_users()
+            self.count = start + n
+            self._save_meta()
+
+    # -------------------------------------------------
+    # Search
+    # -------------------------------------------------
+    def search(self, embedding: np.ndarray, k: int = 10, user_id: str | None = None,
+               shared: bool = False):
+        """
+        Top-k most similar rows, best first: [(score, image_key, class_idx)].
+        Only `user_id`'s uploads are searched; `shared` adds the anonymous
+        ones (the only rows an anonymous caller can see). The same image
+        uploaded several times is returned once.
+        """
+        with self._locked(exclusive=False):
+            count = self.count
+            if count == 0:
+                return []
+            vectors, owners, keys, classes = self.vectors, self.owners, self.keys, self.classes
+            code = self._user_codes.get(user_id) if user_id else None
+            rows = None
+            if not shared:
+                if code is None:
+                    return []
+                rows = np.array(self._rows_by_owner.get(code, []), dtype=np.int64)
+            q = self._prepare(embedding)[0]
+
+        # Duplicates are dropped after ranking, so ask for some spare rows
+        want = k * 4
+        if rows is not None:
+            scores = vectors[rows].astype(np.float32) @ q
+            top_rows, top_scores = self._top(scores, want, rows)
+        else:
+            visible = (ANONYMOUS,) if code is None else (ANONYMOUS, code)
+            top_rows, top_scores = [], []
+            for start in range(0, count, EMBEDDING_SEARCH_CHUNK):
+                block = vectors[start:start + EMBEDDING_SEARCH_CHUNK][:count - start]
+                scores = block.astype(np.float32) @ q
+                scores[~np.isin(owners[start:start + len(block)], visible)] = -np.inf
+                r, s = self._top(scores, want, None, offset=start)
+                top_rows.append(r)
+                top_scores.append(s)
+            top_rows, top_scores = self._top(np.concatenate(top_scores), want, np.concatenate(top_rows))
+
+        results, seen = [], set()
+        for row, score in zip(top_rows.tolist(), top_scores.tolist()):
+            if score == -np.inf:
+                break
+            key = bytes(keys[row]).hex()
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append((score, key, int(classes[row])))
+            if len(results) == k:
+                break
+        return results
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int, rows: np.ndarray | None, offset: int = 0):
+        """(rows, scores) of the k best, best first."""
+        if len(scores) > k:
+            idx = np.argpartition(scores, -k)[-k:]
+        else:
+            idx = np.arange(len(scores))
+        idx = idx[np.argsort(scores[idx])[::-1]]
+        picked = rows[idx] if rows is not None else idx + offset
+        return picked, scores[idx]
+
+    # -------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------
+    def _flush(self):
+        for name in self._files():
+            column = getattr(self, name, None)
+            if column is not None:
+                column.flush()
+
+    def close(self):
+        with self._lock:
+            if self.dim:
+                self._flush()
+
+
+# -------------------------------------------------
+# Shared index for the API process
+# -------------------------------------------------
+embedding_index = EmbeddingIndex(EMBEDDING_INDEX_DIR) if EMBEDDING_INDEX else None
+
+_tasks: set = set()
+
+
+def index_upload(image_data: bytes, embedding, class_idx: int, user_id: str | None = None):
+    """Store the image and append its embedding in the background."""
+    if embedding_index is None or embedding is None:
+        return
+
+    # Imported here so the index itself stays usable without Mongo (benchmarks)
+    from utils.blob_store import put_image
+
+    async def run():
+        try:
+            key = await put_image(image_data)
+            await asyncio.to_thread(embedding_index.add, embedding, key, class_idx, user_id)
+        except Exception as e:
+            print(f"⚠️ Embedding not indexed: {e}")
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def wait_for_indexing():
+    if _tasks:
+        await asyncio.gather(*_tasks, return_exceptions=True)
+
+
+register_gauge("dogbreed_embedding_index_vectors", "Vectors in the similar-dogs embedding index",
+               lambda: embedding_index.count if embedding_index else 0)
@@ -0,0 +1,138 @@
+# backend/utils/indexes.py
+"""
+Declarative index registry.
+
+Modules that query a collection declare, next to their queries:
+
+    declare_index("orders", [("user_id", 1), ("created_at", -1), ("_id", -1)])
+    declare_query("orders by user", "orders", {"user_id": "u"}, sort=[("created_at", -1), ("_id", -1)])
+
+Declare the shape the code actually sends: build it with the same helper
+the query uses (utils.pagination.declare_page_queries does this for
+keyset-paginated listings, cursor clause included).
+
+`migrate_indexes(db)` (run at startup through utils.mongo.ensure_indexes)
+creates missing indexes and reports drift. `verify_query_plans(db)` explains
+every declared query and flags any that would do a collection scan or an
+in-memory sort; it is what scripts/verify_indexes.py runs.
+"""
+from pymongo.errors import OperationFailure
+
+from utils.mongo_monitor import summarize_plan, winning_plan
+
+# Options that must match for an existing index to count as "the same"
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+INDEXES: dict[str, list[dict]] = {}
+QUERIES: list[dict] = []
+
+
+def declare_index(collection: str, keys, **options):
+    if isinstance(keys, str):
+        keys = [(keys, 1)]
+    spec = {"keys": list(keys), "options": options}
+    if spec not in INDEXES.setdefault(collection, []):
+        INDEXES[collection].append(spec)
+
+
+def declare_query(name: str, collection: str, filter: dict | None = None, sort=None, pipeline=None):
+    """Register a representative query shape (filter values are placeholders)."""
+    QUERIES.append({
+        "name": name,
+        "collection": collection,
+        "filter": filter or {},
+        "sort": sort,
+        "pipeline": pipeline
+    })
+
+
+def _norm(value):
+    # unique=False and a missing "unique" mean the same thing
+    return None if value is False else value
+
+
+# -------------------------------------------------
+# Startup migration
+# -------------------------------------------------
+async def migrate_indexes(database) -> dict:
+    """Create declared indexes that are missing; report mismatches and extras."""
+    report = {"created": [], "ok": [], "mismatched": [], "undeclared": []}
+
+    for collection, specs in INDEXES.items():
+        existing = await database[collection].index_information()
+        by_keys = {tuple(tuple(k) for k in info["key"]): (name, info) for name, info in existing.items()}
+        declared = set()
+
+        for spec in specs:
+            keys = tuple(tuple(k) for k in spec["keys"])
+            declared.add(keys)
+            label = f"{collection}{list(keys)}"
+
+            if keys not in by_keys:
+                await database[collection].create_index(spec["keys"], **spec["options"])
+                report["created"].append(label)
+                continue
+
+            _, info = by_keys[keys]
+            differs = [
+                opt for opt in _COMPARED_OPTIONS
+                if _norm(info.get(opt)) != _norm(spec["options"].get(opt))
+            ]
+            if differs:
+                # Index options can't be altered in place; leave it to an operator
+                report["mismatched"].append(f"{label} differs in {differs}")
+            else:
+                report["ok"].append(label)
+
+        report["undeclared"] += [
+            f"{collection}.{name}" for keys, (name, _) in by_keys.items()
+            if keys not in declared and name != "_id_"
+        ]
+
+    for line in report["mismatched"]:
+        print(f"⚠️ Index mismatch: {line}")
+    if report["created"]:
+        print(f"✅ Created indexes: {', '.join(report['created'])}")
+
+    return report
+
+
+# -------------------------------------------------
+# Explain-based verification
+# -------------------------------------------------
+def _plan_stages(node) -> list[str]:
+    if not isinstance(node, dict):
+        return []
+    stages = [node["stage"]] if node.get("stage") else []
+    for child in [node.get("inputStage"), node.get("queryPlan"), *node.get("inputStages", [])]:
+        stages += _plan_stages(child)
+    return stages
+
+
+def _explain_command(query: dict) -> dict:
+    if query["pipeline"] is not None:
+        return {"aggregate": query["collection"], "pipeline": query["pipeline"], "cursor": {}}
+
+    command = {"find": query["collection"], "filter": query["filter"]}
+    if query["sort"]:
+        command["sort"] = dict(query["sort"])
+    return command
+
+
+async def verify_query_plans(database) -> list[dict]:
+    """Explain every declared query; `ok` is False for collection scans and in-memory sorts."""
+    results = []
+    for query in QUERIES:
+        try:
+            explain = await database.command({"explain": _explain_command(query), "verbosity": "queryPlanner"})
+            plan = winning_plan(explain)
+            stages = _plan_stages(plan)
+            results.append({
+                "name": query["name"],
+                "plan": summarize_plan(plan),
+                "ok": "COLLSCAN" not in stages and "SORT" not in stages
+            })
+        except OperationFailure as e:
+            results.append({"name": query["name"], "plan": f"explain failed: {e}", "ok": False})
+
+    return results
@@ -0,0 +1,76 @@
+# backend/utils/jobs.py
+"""
+Minimal background jobs with progress tracked in Mongo (chat_jobs), so any
+worker can answer a status request.
+"""
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from utils.mongo import chat_jobs
+from utils.indexes import declare_index
+
+declare_index("chat_jobs", "finished_at", expireAfterSeconds=7 * 24 * 3600)
+
+# Keep strong references so running tasks aren't garbage collected
+_running: set[asyncio.Task] = set()
+
+
+async def start_job(kind: str, target: str, fn) -> str:
+    """
+    Run `await fn(progress)` in the background and return the job id.
+    `progress(done, total=None)` records how far the job has got.
+    """
+    result = await chat_jobs.insert_one({
+        "kind": kind,
+        "target": target,
+        "status": "running",
+        "done": 0,
+        "total": None,
+        "error": None,
+        "created_at": datetime.utcnow(),
+        "finished_at": None
+    })
+    job_id = result.inserted_id
+
+    async def progress(done: int, total: int | None = None):
+        update = {"done": done}
+        if total is not None:
+            update["total"] = total
+        await chat_jobs.update_one({"_id": job_id}, {"$set": update})
+
+    async def run():
+        try:
+            await fn(progress)
+            status, error = "completed", None
+        except Exception as e:
+            print(f"⚠️ Job {kind} for {target} failed: {e}")
+            status, error = "failed", str(e)
+
+        await chat_jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": status, "error": error, "finished_at": datetime.utcnow()}}
+        )
+
+    task = asyncio.create_task(run())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+    return str(job_id)
+
+
+async def get_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        return None
+
+    job = await chat_jobs.find_one({"_id": ObjectId(job_id)})
+    if job:
+        job["_id"] = str(job["_id"])
+    return job
+
+
+async def wait_for_jobs():
+    """Let in-flight jobs finish (used on shutdown)."""
+    if _running:
+        await asyncio.gather(*_running, return_exceptions=True)
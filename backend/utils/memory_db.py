@@ -0,0 +1,642 @@
+# backend/utils/memory_db.py
+"""
+In-process async stand-in for Motor, selected with MONGO_BACKEND=memory.
+
+It implements the subset of the Motor API this backend uses (find/find_one
+with sort/limit/projection, insert/update/delete, find_one_and_update,
+count_documents, bulk_write, a small aggregate, create_index and explain)
+so the data-layer routes can run and be load-tested without a database.
+
+Indexes are real enough to matter for benchmarks: the first field of every
+index is kept as a hash index used for equality / $in lookups, unique
+indexes are enforced, and explain() reports IXSCAN vs COLLSCAN the way
+Mongo's planner would for those shapes. TTL indexes are recorded but
+nothing expires.
+"""
+import copy
+from datetime import datetime
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+_MISSING = object()
+
+
+# -------------------------------------------------
+# Document helpers
+# -------------------------------------------------
+def _get(doc, path: str):
+    parts = path.split(".")
+    for i, part in enumerate(parts):
+        if isinstance(doc, list):
+            # "messages._id" → the _id of every element, matched like an array field
+            rest = ".".join(parts[i:])
+            values = [_get(item, rest) for item in doc]
+            return [v for v in values if v is not _MISSING]
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _set(doc, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset(doc, path: str):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def _compare(a, op: str, b) -> bool:
+    if a is _MISSING or a is None or b is None:
+        return False
+    try:
+        if op == "$lt":
+            return a < b
+        if op == "$lte":
+            return a <= b
+        if op == "$gt":
+            return a > b
+        return a >= b
+    except TypeError:
+        return False
+
+
+def _matches_value(value, cond) -> bool:
+    if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+        for op, arg in cond.items():
+            if op == "$eq" and not _matches_value(value, arg):
+                return False
+            if op == "$ne" and _matches_value(value, arg):
+                return False
+            if op == "$in" and not any(_matches_value(value, a) for a in arg):
+                return False
+            if op == "$nin" and any(_matches_value(value, a) for a in arg):
+                return False
+            if op == "$exists" and (value is not _MISSING) != bool(arg):
+                return False
+            if op in ("$lt", "$lte", "$gt", "$gte") and not _compare(value, op, arg):
+                return False
+        return True
+
+    if value is _MISSING:
+        return cond is None
+    if isinstance(value, list) and not isinstance(cond, list):
+        return cond in value
+    return value == cond
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in cond):
+                return False
+        elif not _matches_value(_get(doc, key), cond):
+            return False
+    return True
+
+
+def project(doc: dict, projection: dict | None) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+
+    if any(projection.values()):
+        include = {k for k, v in projection.items() if v and k != "_id"}
+        out = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+
+    excluded = {k for k, v in projection.items() if not v}
+    return {k: copy.deepcopy(v) for k, v in doc.items() if k not in excluded}
+
+
+def sort_docs(docs: list, spec) -> list:
+    # Stable multi-pass sort; missing/None values sort first like Mongo
+    for field, direction in reversed(spec):
+        def key(d, field=field):
+            v = _get(d, field)
+            return (0, "") if v is _MISSING or v is None else (1, v)
+        docs.sort(key=key, reverse=direction < 0)
+    return docs
+
+
+def _normalize_sort(key_or_list, direction=None) -> list:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+def apply_update(doc: dict, update: dict, inserting: bool):
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if inserting:
+                for k, v in fields.items():
+                    _set(doc, k, copy.deepcopy(v))
+        elif op == "$set":
+            for k, v in fields.items():
+                _set(doc, k, copy.deepcopy(v))
+        elif op == "$unset":
+            for k in fields:
+                _unset(doc, k)
+        elif op == "$inc":
+            for k, v in fields.items():
+                current = _get(doc, k)
+                _set(doc, k, (0 if current is _MISSING else current) + v)
+        elif op in ("$min", "$max"):
+            for k, v in fields.items():
+                current = _get(doc, k)
+                if current is _MISSING or (v < current if op == "$min" else v > current):
+                    _set(doc, k, v)
+        elif op == "$push":
+            for k, v in fields.items():
+                items = v["$each"] if isinstance(v, dict) and "$each" in v else [v]
+                current = _get(doc, k)
+                _set(doc, k, (current if isinstance(current, list) else []) + copy.deepcopy(items))
+        else:
+            raise OperationFailure(f"memory backend: unsupported update operator {op}", code=9)
+
+
+# -------------------------------------------------
+# Cursor
+# -------------------------------------------------
+class MemoryCursor:
+    def __init__(self, produce, projection: dict | None = None):
+        self._produce = produce
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, n: int):
+        self._skip = n
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def _results(self) -> list:
+        docs = self._produce(self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        # Copy only what is actually returned
+        return [project(d, self._projection) for d in docs]
+
+    async def to_list(self, length=None):
+        docs = self._results()
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._results():
+            yield doc
+
+
+# -------------------------------------------------
+# Collection
+# -------------------------------------------------
+class MemoryCollection:
+    def __init__(self, database, name: str):
+        self.database = database
+        self.name = name
+        self._docs: dict = {}
+        self._indexes: dict[str, dict] = {"_id_": {"key": [("_id", 1)], "unique": True}}
+        self._hash: dict[str, dict] = {}       # leading field → value → {_id}
+        self._unique: dict[str, dict] = {}     # index name → key tuple → _id
+
+    # ---------- indexes ----------
+    async def create_index(self, keys, **options):
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        name = options.pop("name", "_".join(f"{f}_{d}" for f, d in keys))
+        if name in self._indexes:
+            return name
+
+        self._indexes[name] = {"key": keys, **options}
+        field = keys[0][0]
+        if field != "_id" and field not in self._hash:
+            self._hash[field] = {}
+            for _id, doc in self._docs.items():
+                self._hash[field].setdefault(_hashable(_get(doc, field)), set()).add(_id)
+        if options.get("unique"):
+            self._unique[name] = {}
+            for _id, doc in self._docs.items():
+                self._unique[name][self._unique_key(keys, doc)] = _id
+        return name
+
+    async def index_information(self):
+        return copy.deepcopy(self._indexes)
+
+    @staticmethod
+    def _unique_key(keys, doc):
+        return tuple(_hashable(_get(doc, f)) for f, _ in keys)
+
+    def _check_unique(self, doc, ignore_id=None):
+        for name, entries in self._unique.items():
+            owner = entries.get(self._unique_key(self._indexes[name]["key"], doc))
+            if owner is not None and owner != ignore_id:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}", 11000)
+
+    def _index_add(self, doc):
+        for field, values in self._hash.items():
+            values.setdefault(_hashable(_get(doc, field)), set()).add(doc["_id"])
+        for name, entries in self._unique.items():
+            entries[self._unique_key(self._indexes[name]["key"], doc)] = doc["_id"]
+
+    def _index_remove(self, doc):
+        for field, values in self._hash.items():
+            ids = values.get(_hashable(_get(doc, field)))
+            if ids:
+                ids.discard(doc["_id"])
+        for name, entries in self._unique.items():
+            entries.pop(self._unique_key(self._indexes[name]["key"], doc), None)
+
+    def _candidates(self, query: dict):
+        """(ids, index name | None): narrowest equality / $in lookup available."""
+        if "_id" in query:
+            cond = query["_id"]
+            if not isinstance(cond, dict):
+                return [cond], "_id_"
+            if "$in" in cond:
+                return list(cond["$in"]), "_id_"
+
+        for field, values in self._hash.items():
+            if field not in query:
+                continue
+            cond = query[field]
+            if isinstance(cond, dict) and "$in" in cond:
+                ids = set()
+                for v in cond["$in"]:
+                    ids |= values.get(_hashable(v), set())
+                return ids, field
+            if not isinstance(cond, dict):
+                return set(values.get(_hashable(cond), set())), field
+        return None, None
+
+    def _find(self, query: dict | None, sort=None) -> list:
+        query = query or {}
+        ids, _ = self._candidates(query)
+        pool = self._docs.values() if ids is None else (self._docs[i] for i in ids if i in self._docs)
+        docs = [d for d in pool if matches(d, query)]
+        if sort:
+            sort_docs(docs, sort)
+        elif ids is not None:
+            # Index lookups come back unordered; ObjectIds follow insertion order
+            docs.sort(key=lambda d: (isinstance(d["_id"], ObjectId), str(d["_id"])))
+        return docs
+
+    # ---------- reads ----------
+    def find(self, filter: dict | None = None, projection: dict | None = None, **kwargs):
+        cursor = MemoryCursor(lambda sort: self._find(filter, sort), projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        if kwargs.get("limit"):
+            cursor.limit(kwargs["limit"])
+        return cursor
+
+    async def find_one(self, filter: dict | None = None, projection: dict | None = None, sort=None, **kwargs):
+        docs = self._find(filter, _normalize_sort(sort) if sort else None)
+        return project(docs[0], projection) if docs else None
+
+    async def count_documents(self, filter: dict | None = None, **kwargs):
+        return len(self._find(filter))
+
+    def aggregate(self, pipeline: list, **kwargs):
+        def produce(_sort):
+            docs = None
+            for stage in pipeline:
+                (op, arg), = stage.items()
+                if op == "$match":
+                    docs = self._find(arg) if docs is None else [d for d in docs if matches(d, arg)]
+                    continue
+                if docs is None:
+                    docs = list(self._docs.values())
+                if op == "$sort":
+                    docs = sort_docs(list(docs), _normalize_sort(arg))
+                elif op == "$limit":
+                    docs = docs[:arg]
+                elif op == "$skip":
+                    docs = docs[arg:]
+                elif op == "$group":
+                    docs = _group(docs, arg)
+                else:
+                    raise OperationFailure(f"memory backend: unsupported stage {op}", code=40324)
+            return list(docs if docs is not None else self._docs.values())
+
+        return MemoryCursor(produce)
+
+    # ---------- writes ----------
+    async def insert_one(self, document: dict, **kwargs):
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+        self._check_unique(document)
+
+        stored = copy.deepcopy(document)
+        self._docs[stored["_id"]] = stored
+        self._index_add(stored)
+        return SimpleNamespace(inserted_id=stored["_id"], acknowledged=True)
+
+    async def insert_many(self, documents, ordered: bool = True, **kwargs):
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted.append((await self.insert_one(document)).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"nInserted": len(inserted), "writeErrors": errors})
+        return SimpleNamespace(inserted_ids=inserted, acknowledged=True)
+
+    async def _update(self, filter: dict, update: dict, upsert: bool, many: bool):
+        targets = self._find(filter)
+        if not many:
+            targets = targets[:1]
+
+        for doc in targets:
+            before = copy.deepcopy(doc)
+            self._index_remove(doc)
+            apply_update(doc, update, inserting=False)
+            try:
+                self._check_unique(doc, ignore_id=doc["_id"])
+            except DuplicateKeyError:
+                doc.clear()
+                doc.update(before)
+                self._index_add(doc)
+                raise
+            self._index_add(doc)
+
+        upserted_id = None
+        if not targets and upsert:
+            seed = {k: v for k, v in filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+            apply_update(seed, update, inserting=True)
+            upserted_id = (await self.insert_one(seed)).inserted_id
+
+        return SimpleNamespace(
+            matched_count=len(targets), modified_count=len(targets),
+            upserted_id=upserted_id, acknowledged=True
+        )
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False, **kwargs):
+        return await self._update(filter, update, upsert, many=False)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False, **kwargs):
+        return await self._update(filter, update, upsert, many=True)
+
+    async def find_one_and_update(self, filter: dict, update: dict, projection: dict | None = None,
+                                  sort=None, upsert: bool = False, return_document: bool = False, **kwargs):
+        docs = self._find(filter, _normalize_sort(sort) if sort else None)
+        if not docs:
+            if not upsert:
+                return None
+            result = await self._update(filter, update, upsert=True, many=False)
+            return project(self._docs[result.upserted_id], projection) if return_document else None
+
+        before = project(docs[0], projection)
+        await self._update({"_id": docs[0]["_id"]}, update, upsert=False, many=False)
+        return project(self._docs[docs[0]["_id"]], projection) if return_document else before
+
+    async def delete_one(self, filter: dict, **kwargs):
+        return await self._delete(filter, many=False)
+
+    async def delete_many(self, filter: dict, **kwargs):
+        return await self._delete(filter, many=True)
+
+    async def _delete(self, filter: dict, many: bool):
+        targets = self._find(filter)
+        if not many:
+            targets = targets[:1]
+        for doc in targets:
+            self._index_remove(doc)
+            del self._docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=len(targets), acknowledged=True)
+
+    async def bulk_write(self, requests, ordered: bool = True, **kwargs):
+        counts = {"inserted": 0, "matched": 0, "upserted": 0, "deleted": 0}
+        for op in requests:
+            if isinstance(op, InsertOne):
+                await self.insert_one(op._doc)
+                counts["inserted"] += 1
+            elif isinstance(op, UpdateOne):
+                result = await self._update(op._filter, op._doc, bool(op._upsert), many=False)
+                counts["matched"] += result.matched_count
+                counts["upserted"] += int(result.upserted_id is not None)
+            elif isinstance(op, DeleteOne):
+                counts["deleted"] += (await self._delete(op._filter, many=False)).deleted_count
+            else:
+                raise OperationFailure(f"memory backend: unsupported bulk op {type(op).__name__}", code=2)
+        return SimpleNamespace(
+            inserted_count=counts["inserted"], matched_count=counts["matched"],
+            modified_count=counts["matched"], upserted_count=counts["upserted"],
+            deleted_count=counts["deleted"], acknowledged=True
+        )
+
+    # ---------- planner ----------
+    def explain_plan(self, query: dict, sort=None) -> dict:
+        """
+        Approximate Mongo's choice: an index is usable when a prefix of its
+        keys is bounded by the query (equality/$in, ending at most at one
+        range), or when its order gives the requested sort. Among usable
+        indexes the longest bounded prefix wins, then one that avoids an
+        in-memory SORT. A top-level $or needs an index for every clause.
+        """
+        sort = sort or []
+        constraints = _constraints(query or {})
+        best = None
+        for name, spec in self._indexes.items():
+            keys = spec["key"]
+            bounded = 0
+            for field, _ in keys:
+                kind = constraints.get(field)
+                if kind is None:
+                    break
+                bounded += 1
+                if kind == "range":
+                    break
+            sorted_ = bool(sort) and _provides_sort(keys, sort, constraints)
+            if not bounded and not sorted_:
+                continue
+            if best is None or (bounded, sorted_) > best[:2]:
+                best = (bounded, sorted_, name)
+
+        if best is not None:
+            plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": best[2]}}
+            provided = best[1]
+        elif "$or" in (query or {}):
+            branches = [self.explain_plan(clause) for clause in query["$or"]]
+            if any(b["stage"] == "COLLSCAN" for b in branches):
+                plan = {"stage": "COLLSCAN"}
+            else:
+                plan = {"stage": "FETCH", "inputStage": {"stage": "OR", "inputStages": branches}}
+            provided = False
+        else:
+            plan = {"stage": "COLLSCAN"}
+            provided = False
+
+        if sort and not provided:
+            plan = {"stage": "SORT", "inputStage": plan}
+        return plan
+
+
+def _constraints(query: dict) -> dict:
+    """field → "eq" | "in" | "range" for the conditions an index can bound."""
+    out = {}
+    for field, cond in query.items():
+        if field == "$and":
+            for clause in cond:
+                out.update(_constraints(clause))
+            continue
+        if field.startswith("$"):
+            continue
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            if "$eq" in cond or ("$in" in cond and len(cond["$in"]) == 1):
+                out[field] = "eq"
+            elif "$in" in cond:
+                out[field] = "in"
+            elif cond.keys() & {"$gt", "$gte", "$lt", "$lte"}:
+                out[field] = "range"
+            # $ne, $nin, $exists, ... don't bound an index scan here
+        else:
+            out[field] = "eq"
+    return out
+
+
+def _provides_sort(keys: list, sort: list, constraints: dict) -> bool:
+    """True if walking `keys` (either way) yields `sort` order; fields pinned by equality may be skipped."""
+    i, way = 0, None
+    for field, direction in sort:
+        while i < len(keys) and keys[i][0] != field and constraints.get(keys[i][0]) == "eq":
+            i += 1
+        if i == len(keys) or keys[i][0] != field:
+            if constraints.get(field) == "eq":
+                continue  # sorting on a constant
+            return False
+        same = 1 if keys[i][1] == direction else -1
+        if way is None:
+            way = same
+        elif way != same:
+            return False
+        i += 1
+    return True
+
+
+def _group(docs: list, spec: dict) -> list:
+    key_expr = spec["_id"]
+    groups: dict = {}
+    for doc in docs:
+        key = _get(doc, key_expr[1:]) if isinstance(key_expr, str) and key_expr.startswith("$") else key_expr
+        key = None if key is _MISSING else key
+        groups.setdefault(_hashable(key), (key, []))[1].append(doc)
+
+    out = []
+    for key, members in groups.values():
+        row = {"_id": key}
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, expr), = acc.items()
+            values = [
+                _get(d, expr[1:]) if isinstance(expr, str) and expr.startswith("$") else expr
+                for d in members
+            ]
+            values = [None if v is _MISSING else v for v in values]
+            if op == "$first":
+                row[field] = values[0]
+            elif op == "$last":
+                row[field] = values[-1]
+            elif op == "$sum":
+                row[field] = sum(v for v in values if isinstance(v, (int, float)))
+            elif op == "$count":
+                row[field] = len(values)
+            else:
+                raise OperationFailure(f"memory backend: unsupported accumulator {op}", code=15952)
+        out.append(row)
+    return out
+
+
+# -------------------------------------------------
+# Database / client
+# -------------------------------------------------
+class MemoryDatabase:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    async def list_collection_names(self):
+        return list(self._collections)
+
+    async def command(self, command: dict, **kwargs):
+        if "explain" not in command:
+            if "ping" in command:
+                return {"ok": 1.0}
+            raise OperationFailure(f"memory backend: unsupported command {next(iter(command))}", code=59)
+
+        inner = command["explain"]
+        if "find" in inner:
+            plan = self[inner["find"]].explain_plan(inner.get("filter", {}), _normalize_sort(inner.get("sort") or []))
+        elif "aggregate" in inner:
+            stages = inner["pipeline"]
+            first = stages[0] if stages else {}
+            # A $sort right after the $match can use the same index
+            after = stages[1] if len(stages) > 1 else {}
+            plan = self[inner["aggregate"]].explain_plan(
+                first.get("$match", {}), _normalize_sort(after.get("$sort") or [])
+            )
+        else:
+            verb = next(iter(inner))
+            writes = inner.get("updates") or inner.get("deletes") or [{}]
+            query = inner.get("query") or inner.get("filter") or writes[0].get("q", {})
+            plan = self[inner[verb]].explain_plan(query)
+        return {"queryPlanner": {"winningPlan": plan}, "ok": 1.0}
+
+
+class MemoryClient:
+    def __init__(self):
+        self._databases: dict[str, MemoryDatabase] = {}
+        self.started_at = datetime.utcnow()
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    async def drop_database(self, name: str):
+        self._databases.pop(name, None)
@@ -2,24 +2,41 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 
+from utils.mongo_monitor import command_monitor
+from utils.indexes import migrate_indexes
+
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("MONGO_DB_NAME", "dog_project")
 
-if not MONGO_URI:
-    raise RuntimeError("MONGO_URI not set in environment variables")
+# "motor" → real MongoDB at MONGO_URI, "memory" → in-process stand-in
+# (utils/memory_db.py) for local runs and load tests
+MONGO_BACKEND = os.getenv("MONGO_BACKEND", "motor")
+
+if MONGO_BACKEND == "memory":
+    from utils.memory_db import MemoryClient
+    client = MemoryClient()
+else:
+    if not MONGO_URI:
+        raise RuntimeError("MONGO_URI not set in environment variables")
+
+    # command_monitor attributes every command to the route that issued it
+    client = AsyncIOMotorClient(MONGO_URI, event_listeners=[command_monitor])
 
-client = AsyncIOMotorClient(MONGO_URI)
 db = client[DB_NAME]
 
 # Collections
 users = db["users"]
 chat_history = db["chat_history"]
 chat_sessions = db["chat_sessions"]  # ← NEW: For chat session management
+chat_buckets = db["chat_buckets"]  # bucketed message storage (utils/chat_store.py)
+chat_jobs = db["chat_jobs"]  # background delete / compaction jobs
 predictions = db["predictions"]
+prediction_rollups = db["prediction_rollups"]  # per-day analytics (utils/prediction_log.py)
 orders = db["orders"]
+suggest_popularity = db["suggest_popularity"]  # typeahead ranking (utils/suggest.py)
 
-# ✅ Ensure indexes (runs once, Mongo ignores duplicates)
+# ✅ Ensure indexes (runs once at startup)
+# Indexes are declared next to the queries they serve (utils/indexes.py);
+# only modules that have been imported have registered theirs.
 async def ensure_indexes():
-    await users.create_index("email", unique=True)
-    await chat_sessions.create_index([("user_id", 1), ("created_at", -1)])
-    await chat_history.create_index([("user_id", 1), ("session_id", 1), ("created_at", 1)])
\ No newline at end of file
+    return await migrate_indexes(db)
@@ -0,0 +1,236 @@
+# backend/utils/mongo_monitor.py
+"""
+Mongo command instrumentation.
+
+`command_monitor` is registered on the Motor client (utils/mongo.py) and
+attributes every command to the FastAPI route that issued it, via the
+`current_route` context variable set by RouteContextMiddleware. Per route
+and command it keeps counts, failures, documents returned and a latency
+histogram. Commands slower than MONGO_SLOW_MS are logged together with a
+summary of their explain() plan.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from collections import OrderedDict
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+MONGO_SLOW_MS = float(os.getenv("MONGO_SLOW_MS", "100"))
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+# Commands whose plans explain() can describe
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Fields pymongo adds to the command document that explain() must not see
+_WIRE_FIELDS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "signature"}
+
+current_route: contextvars.ContextVar[str] = contextvars.ContextVar("current_route", default="background")
+
+
+def _docs_returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+
+def summarize_plan(plan: dict) -> str:
+    """'IXSCAN(idx) → FETCH → SORT' style summary of a winning plan."""
+    stages = []
+    node = plan
+    while isinstance(node, dict) and node.get("stage"):
+        label = node["stage"]
+        if node.get("indexName"):
+            label += f"({node['indexName']})"
+        stages.append(label)
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0]
+    return " → ".join(reversed(stages)) or "unknown"
+
+
+def winning_plan(explain: dict) -> dict:
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        # aggregate explain nests the planner under the first $cursor stage
+        for stage in explain.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    planner = planner or {}
+    plan = planner.get("winningPlan", {})
+    # SBE plans wrap the classic tree in queryPlan
+    return plan.get("queryPlan", plan)
+
+
+class RouteStats:
+    __slots__ = ("count", "failures", "docs", "total_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.docs = 0
+        self.total_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def observe(self, ms: float, docs: int, failed: bool):
+        self.count += 1
+        self.failures += int(failed)
+        self.docs += docs
+        self.total_ms += ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "docs_returned": self.docs,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "latency_ms_buckets": {
+                ("+Inf" if b == float("inf") else str(b)): n
+                for b, n in zip(LATENCY_BUCKETS_MS, self.buckets)
+            }
+        }
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Runs on pymongo's threads: keep callbacks cheap and lock-protected."""
+
+    def __init__(self, slow_ms: float = MONGO_SLOW_MS, max_inflight: int = 1000):
+        self.slow_ms = slow_ms
+        self.max_inflight = max_inflight
+        self._lock = threading.Lock()
+        self._stats: dict[tuple[str, str], RouteStats] = {}
+        self._inflight: OrderedDict = OrderedDict()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._db = None
+        self.slow_queries = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop, database):
+        """Enable explain() on slow commands (needs the app's event loop)."""
+        self._loop = loop
+        self._db = database
+
+    # -------------------------------------------------
+    # pymongo callbacks
+    # -------------------------------------------------
+    def started(self, event):
+        if event.command_name not in EXPLAINABLE:
+            return
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+            while len(self._inflight) > self.max_inflight:
+                self._inflight.popitem(last=False)
+
+    def succeeded(self, event):
+        self._record(event, _docs_returned(event.reply), failed=False)
+
+    def failed(self, event):
+        self._record(event, 0, failed=True)
+
+    def _record(self, event, docs: int, failed: bool):
+        route = current_route.get()
+        ms = event.duration_micros / 1000
+
+        with self._lock:
+            started = self._inflight.pop((event.connection_id, event.request_id), None)
+            stats = self._stats.get((route, event.command_name))
+            if stats is None:
+                stats = self._stats[(route, event.command_name)] = RouteStats()
+            stats.observe(ms, docs, failed)
+            slow = ms >= self.slow_ms and event.command_name != "explain"
+            if slow:
+                self.slow_queries += 1
+
+        if slow:
+            self._log_slow(route, event.command_name, ms, docs, started)
+
+    # -------------------------------------------------
+    # Slow query log
+    # -------------------------------------------------
+    def _log_slow(self, route: str, command_name: str, ms: float, docs: int, started):
+        if started is None or self._loop is None or self._db is None:
+            print(f"🐢 Slow Mongo {command_name} on {route}: {ms:.1f}ms, {docs} docs")
+            return
+
+        _, command = started
+        command = {k: v for k, v in command.items() if k not in _WIRE_FIELDS}
+        asyncio.run_coroutine_threadsafe(
+            self._explain_and_log(route, command_name, ms, docs, command), self._loop
+        )
+
+    async def _explain_and_log(self, route, command_name, ms, docs, command):
+        token = current_route.set("mongo_monitor")
+        try:
+            explain = await self._db.command({"explain": command, "verbosity": "queryPlanner"})
+            plan = summarize_plan(winning_plan(explain))
+        except Exception as e:
+            plan = f"explain failed: {e}"
+        finally:
+            current_route.reset(token)
+
+        print(f"🐢 Slow Mongo {command_name} on {route}: {ms:.1f}ms, {docs} docs, plan: {plan}")
+
+    # -------------------------------------------------
+    # Reporting
+    # -------------------------------------------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes: dict[str, dict] = {}
+            for (route, command), stats in sorted(self._stats.items()):
+                routes.setdefault(route, {})[command] = stats.as_dict()
+        return {"slow_ms": self.slow_ms, "slow_queries": self.slow_queries, "routes": routes}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.slow_queries = 0
+
+
+command_monitor = CommandMonitor()
+
+
+def _route_path(routes, scope) -> str | None:
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match != Match.FULL:
+            continue
+        # Newer FastAPI keeps each included router as a single branch route
+        nested = getattr(route, "effective_candidates", None)
+        if nested is not None:
+            return _route_path(nested(), scope)
+        return getattr(route, "path", None)
+    return None
+
+
+class RouteContextMiddleware:
+    """
+    Pure ASGI middleware that resolves the matching route template
+    (e.g. "GET /api/chat-sessions/user/{user_id}") and stores it in
+    `current_route` for the duration of the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        # Unmatched paths share one label to keep cardinality bounded
+        label = "unmatched"
+        router = scope["app"].router if "app" in scope else None
+        path = _route_path(getattr(router, "routes", []), scope)
+        if path:
+            label = f"{scope.get('method', 'WS')} {path}"
+
+        token = current_route.set(label)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
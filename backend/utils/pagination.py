@@ -0,0 +1,108 @@
+# backend/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from utils.indexes import declare_query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# ------------------------------------
+# Cursor encoding: (created_at, _id) → opaque string
+# ------------------------------------
+def encode_cursor(doc: dict) -> str:
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, oid = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+# ------------------------------------
+# Keyset filter on (created_at, _id)
+# direction 1 → rows after the cursor, -1 → rows before it
+# ------------------------------------
+def keyset_query(query: dict, cursor: str | None, direction: int = 1) -> dict:
+    if not cursor:
+        return query
+
+    created_at, oid = decode_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+
+    return {
+        **query,
+        "$or": [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "_id": {op: oid}}
+        ]
+    }
+
+
+def keyset_sort(direction: int = 1) -> list:
+    return [("created_at", direction), ("_id", direction)]
+
+
+# ------------------------------------
+# Index declarations for a paginated listing: the first page (also what
+# the NDJSON export sends) and every later page, cursor clause included
+# ------------------------------------
+_SAMPLE_CURSOR_DOC = {"created_at": datetime(2000, 1, 1), "_id": ObjectId("0" * 24)}
+
+
+def declare_page_queries(name: str, collection: str, query: dict, direction: int = 1):
+    declare_query(name, collection, query, sort=keyset_sort(direction))
+    declare_query(f"{name}, next page", collection,
+                  keyset_query(query, encode_cursor(_SAMPLE_CURSOR_DOC), direction),
+                  sort=keyset_sort(direction))
+
+
+# ------------------------------------
+# Fetch one page (limit + 1 to detect a next page)
+# Returns (docs, next_cursor | None)
+# ------------------------------------
+async def fetch_page(collection, query: dict, projection: dict, cursor: str | None,
+                     limit: int, direction: int = 1):
+    mongo_cursor = collection.find(
+        keyset_query(query, cursor, direction),
+        projection
+    ).sort(keyset_sort(direction)).limit(limit + 1)
+
+    docs = await mongo_cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+
+    return docs, next_cursor
+
+
+# ------------------------------------
+# NDJSON export: streams every matching doc without buffering
+# ------------------------------------
+def ndjson_stream(docs, serialize=None) -> StreamingResponse:
+    async def rows():
+        async for doc in docs:
+            doc = serialize(doc) if serialize else doc
+            yield json.dumps(jsonable_encoder(doc, custom_encoder={ObjectId: str})) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+def ndjson_response(collection, query: dict, projection: dict, direction: int = 1,
+                    serialize=None) -> StreamingResponse:
+    mongo_cursor = collection.find(query, projection).sort(keyset_sort(direction))
+    return ndjson_stream(mongo_cursor, serialize)
@@ -0,0 +1,166 @@
+# backend/utils/prediction_log.py
+"""
+Prediction logging off the request path.
+
+Routes call `prediction_logger.log(...)`, which only enqueues. A background
+task drains the queue in batches: raw events go to `predictions` with one
+insert_many, and per-day rollup documents in `prediction_rollups` are
+bumped with one $inc per day, so analytics read O(days) documents.
+
+Rollup document (one per UTC day, _id "YYYY-MM-DD"):
+    total, dogs, rejected, sources.{predict|chat},
+    breeds.{breed}, confidence.{bin}   (bin i covers [i/10, (i+1)/10))
+"""
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from utils.mongo import predictions, prediction_rollups
+from utils.indexes import declare_index, declare_query
+from utils.tracing import register_gauge
+
+PREDICTION_LOG_BATCH = int(os.getenv("PREDICTION_LOG_BATCH", "200"))
+PREDICTION_LOG_FLUSH_MS = int(os.getenv("PREDICTION_LOG_FLUSH_MS", "1000"))
+PREDICTION_LOG_QUEUE = int(os.getenv("PREDICTION_LOG_QUEUE", "10000"))
+
+CONFIDENCE_BINS = 10  # 0.0-0.1, ..., 0.9-1.0
+
+# Queued by stop(): everything logged before it is written, then _run returns
+_STOP = object()
+
+declare_index("predictions", "created_at")
+declare_query("rollups since day", "prediction_rollups", {"_id": {"$gte": "2000-01-01"}}, sort=[("_id", 1)])
+
+
+def confidence_bin(confidence: float) -> int:
+    return max(0, min(int(confidence * CONFIDENCE_BINS), CONFIDENCE_BINS - 1))
+
+
+def _field(name: str) -> str:
+    # Mongo field names can't contain "." or start with "$"
+    return name.replace(".", "_").lstrip("$") or "unknown"
+
+
+class PredictionLogger:
+    def __init__(self, max_batch: int = PREDICTION_LOG_BATCH, flush_interval: float = PREDICTION_LOG_FLUSH_MS / 1000,
+                 max_queue: int = PREDICTION_LOG_QUEUE):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.dropped = 0
+
+    # -------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # A sentinel rather than cancel(): _run finishes the batch it holds
+        # (raw events and rollups together) and drains the queue first
+        queue, self._queue = self._queue, None
+        await queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    # -------------------------------------------------
+    # Producer side (never blocks the request)
+    # -------------------------------------------------
+    def log(self, source: str, is_dog: bool, preds: list | None = None, user_id: str | None = None):
+        if self._queue is None:
+            return
+
+        top = preds[0] if preds else None
+        event = {
+            "source": source,
+            "is_dog": is_dog,
+            "breed": top["breed"] if top else None,
+            "confidence": top["confidence"] if top else None,
+            "topk": preds or [],
+            "user_id": user_id,
+            "created_at": datetime.utcnow()
+        }
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    # -------------------------------------------------
+    # Consumer side
+    # -------------------------------------------------
+    async def _run(self):
+        queue = self._queue
+        while True:
+            first = await queue.get()
+            if first is _STOP:
+                return
+            batch, stopping = [first], False
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch: list[dict]):
+        try:
+            await predictions.insert_many(batch, ordered=False)
+            await prediction_rollups.bulk_write(self._rollup_ops(batch), ordered=False)
+        except Exception as e:
+            print(f"⚠️ Prediction log: {len(batch)} events not written: {e}")
+
+    @staticmethod
+    def _rollup_ops(batch: list[dict]) -> list:
+        per_day: dict[str, Counter] = {}
+        for event in batch:
+            inc = per_day.setdefault(event["created_at"].strftime("%Y-%m-%d"), Counter())
+
+            inc["total"] += 1
+            inc[f"sources.{_field(event['source'])}"] += 1
+            if not event["is_dog"]:
+                inc["rejected"] += 1
+                continue
+
+            inc["dogs"] += 1
+            if event["breed"]:
+                inc[f"breeds.{_field(event['breed'])}"] += 1
+            if event["confidence"] is not None:
+                inc[f"confidence.{confidence_bin(event['confidence'])}"] += 1
+
+        return [
+            UpdateOne({"_id": day}, {"$inc": dict(inc)}, upsert=True)
+            for day, inc in per_day.items()
+        ]
+
+
+prediction_logger = PredictionLogger()
+
+register_gauge("dogbreed_prediction_log_queued", "Prediction events waiting to be written",
+               lambda: prediction_logger.queued)
+register_gauge("dogbreed_prediction_log_dropped", "Prediction events dropped because the queue was full",
+               lambda: prediction_logger.dropped)
@@ -0,0 +1,84 @@
+# backend/utils/retention.py
+"""
+Periodic retention sweep:
+
+* sessions idle for CHAT_COMPACT_AFTER_DAYS are compacted into buckets
+* sessions idle for CHAT_RETENTION_DAYS are deleted (messages via a job);
+  bucket documents additionally carry a TTL `expire_at` as a safety net
+* leftover documents of bucketed sessions whose absorbing failed or died
+  are moved into their buckets
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from utils.mongo import chat_sessions
+from utils.chat_store import (
+    ABSORB_LEASE, CHAT_RETENTION_DAYS, STORAGE_BUCKETS,
+    absorb_leftovers, compact_session, delete_session_messages
+)
+from utils.jobs import start_job
+from utils.indexes import declare_index, declare_query
+
+CHAT_COMPACT_AFTER_DAYS = int(os.getenv("CHAT_COMPACT_AFTER_DAYS", "0"))  # 0 → never
+CHAT_RETENTION_SWEEP_MINUTES = int(os.getenv("CHAT_RETENTION_SWEEP_MINUTES", "60"))
+SWEEP_BATCH = 200
+
+declare_index("chat_sessions", "updated_at")
+declare_query("idle sessions", "chat_sessions", {"updated_at": {"$lt": datetime(2000, 1, 1)}})
+declare_query("idle sessions to compact", "chat_sessions",
+              {"updated_at": {"$lt": datetime(2000, 1, 1)}, "storage": {"$ne": STORAGE_BUCKETS}})
+
+
+async def sweep_once():
+    now = datetime.utcnow()
+
+    if CHAT_RETENTION_DAYS > 0:
+        cutoff = now - timedelta(days=CHAT_RETENTION_DAYS)
+        expired = chat_sessions.find({"updated_at": {"$lt": cutoff}}, {"_id": 1}).limit(SWEEP_BATCH)
+        async for session in expired:
+            session_id = str(session["_id"])
+            await chat_sessions.delete_one({"_id": session["_id"]})
+            await start_job(
+                "delete_session", session_id,
+                lambda progress, sid=session_id: delete_session_messages(sid, progress)
+            )
+
+    if CHAT_COMPACT_AFTER_DAYS > 0:
+        cutoff = now - timedelta(days=CHAT_COMPACT_AFTER_DAYS)
+        idle = chat_sessions.find(
+            {"updated_at": {"$lt": cutoff}, "storage": {"$ne": STORAGE_BUCKETS}},
+            {"_id": 1}
+        ).limit(SWEEP_BATCH)
+        async for session in idle:
+            session_id = str(session["_id"])
+            await start_job(
+                "compact_session", session_id,
+                lambda progress, sid=session_id: compact_session(sid, progress)
+            )
+
+    # Sessions compacted through the API also need this, but reads merge
+    # leftovers in meanwhile, so it can wait for a sweep
+    stranded = [
+        s["_id"] async for s in chat_sessions.find({"leftovers": True}, {"_id": 1}).limit(SWEEP_BATCH)
+    ] + [
+        s["_id"] async for s in
+        chat_sessions.find({"absorbing_at": {"$lt": now - ABSORB_LEASE}}, {"_id": 1}).limit(SWEEP_BATCH)
+    ]
+    for oid in set(stranded):
+        try:
+            await absorb_leftovers(str(oid))
+        except Exception as e:
+            print(f"⚠️ Absorbing leftover messages of session {oid} failed: {e}")
+
+
+async def retention_loop():
+    if CHAT_RETENTION_DAYS <= 0 and CHAT_COMPACT_AFTER_DAYS <= 0:
+        return
+
+    while True:
+        try:
+            await sweep_once()
+        except Exception as e:
+            print(f"⚠️ Chat retention sweep failed: {e}")
+        await asyncio.sleep(CHAT_RETENTION_SWEEP_MINUTES * 60)
@@ -0,0 +1,65 @@
+# backend/utils/speculative.py
+"""
+Speculative execution behind a gate.
+
+`run_gated(gate, work)` starts the blocking `gate()` and `work(cancel)` in
+worker threads at the same time, so the request costs max(gate, work)
+instead of gate + work. If the gate says no (or fails), `cancel` is set and
+the work is abandoned: work that checks `cancel` between its stages stops
+at the next check (DogModel skips inference, the remote client skips the
+inference-server round trip) and whatever it already produced is dropped.
+"""
+import asyncio
+import threading
+from collections import Counter
+
+from utils.tracing import register_gauge
+
+_outcomes = Counter()
+
+
+class SpeculationCancelled(Exception):
+    """Raised by work that noticed its gate already rejected the request."""
+
+
+class GateError(Exception):
+    """The gate itself failed; the original error is the __cause__."""
+
+
+def check_cancelled(cancel: threading.Event | None):
+    if cancel is not None and cancel.is_set():
+        raise SpeculationCancelled()
+
+
+async def run_gated(gate, work):
+    """
+    Return (passed, result). `result` is None when the gate rejected.
+    Gate failures raise GateError; errors from `work` only surface if the
+    gate passed.
+    """
+    cancel = threading.Event()
+    work_task = asyncio.create_task(asyncio.to_thread(work, cancel))
+
+    try:
+        passed = await asyncio.to_thread(gate)
+    except BaseException as e:
+        cancel.set()
+        work_task.cancel()
+        _outcomes["discarded"] += 1
+        if isinstance(e, Exception):
+            raise GateError(str(e)) from e
+        raise
+
+    if not passed:
+        cancel.set()
+        # The thread can't be interrupted; cancelling just stops us waiting on it
+        work_task.cancel()
+        _outcomes["discarded"] += 1
+        return False, None
+
+    _outcomes["used"] += 1
+    return True, await work_task
+
+
+register_gauge("dogbreed_speculation_total", "Speculative classifications used vs discarded by the dog gate",
+               lambda: [({"outcome": k}, _outcomes[k]) for k in ("used", "discarded")])
@@ -0,0 +1,295 @@
+# backend/utils/suggest.py
+"""
+Typeahead suggestions for /api/data/suggest.
+
+At load time every sample-question template is expanded with every breed
+from JSONStore.breeds into fully formed questions:
+
+    "Tell me the height of"              → "Tell me the height of the Beagle?"
+    "Is this breed good with children?"  → "Is the Beagle good with children?"
+
+Templates without a breed slot (and the "this breed" ones, as written)
+are kept as generic questions.
+
+Every word start of every question becomes a key in one sorted array, so
+"bea", "beagle good" and "tell me the he" all match by binary search.
+The best SUGGEST_CACHE_DEPTH keys of every prefix up to
+SUGGEST_CACHE_CHARS characters are precomputed; longer prefixes only cover
+a small slice of the array, which is ranked on the fly.
+
+Ranking is learned from the questions users actually send: chat messages
+are matched to (template, breed) here, counted in memory and added to the
+`suggest_popularity` collection every SUGGEST_REFRESH_SECONDS; the totals
+are then re-read (so all workers converge) and the ranking rebuilt.
+"""
+import asyncio
+import heapq
+import math
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+from pymongo import UpdateOne
+
+from utils.mongo import suggest_popularity
+from utils.tracing import register_gauge
+
+SUGGEST_CACHE_CHARS = int(os.getenv("SUGGEST_CACHE_CHARS", "6"))
+SUGGEST_CACHE_DEPTH = int(os.getenv("SUGGEST_CACHE_DEPTH", "20"))
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", "300"))
+SUGGEST_MAX_LIMIT = 20
+
+BREED_SLOT = "this breed"
+# Templates mentioning these are about the uploaded picture, never a named breed
+IMAGE_WORDS = ("image", "predicted dog")
+# Open templates that don't simply end before the breed name
+TEMPLATE_COMPLETIONS = {"what group does the": "{template} {breed} belong to?"}
+
+# Popularity weights: exact question, its template, its breed
+EXACT_WEIGHT, TEMPLATE_WEIGHT, BREED_WEIGHT = 2.0, 1.0, 1.0
+# Matching from the first word beats matching mid-question
+START_BONUS = 0.5
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _SPACES.sub(" ", (text or "").strip().lower())
+
+
+def _pattern(template: str) -> re.Pattern:
+    """Regex recognizing a (normalized) message as an instance of `template`."""
+    norm = normalize(template).rstrip("?.")
+    if BREED_SLOT in norm:
+        before, after = norm.split(BREED_SLOT, 1)
+        return re.compile(re.escape(before) + r".+?" + re.escape(after) + r"[?.!]*$")
+    if template.strip().endswith(("?", ".")):
+        return re.compile(re.escape(norm) + r"[?.!]*$")
+    return re.compile(re.escape(norm) + r"\b")
+
+
+def _display(breed: str) -> str:
+    return " ".join(w.capitalize() for w in breed.split())
+
+
+def expand(template: str, breed: str) -> str | None:
+    """Fully formed question for (template, breed), or None if it has no breed slot."""
+    t = template.strip()
+    lowered = t.lower()
+    name = _display(breed)
+
+    if any(w in lowered for w in IMAGE_WORDS):
+        return None
+    if BREED_SLOT in lowered:
+        start = lowered.index(BREED_SLOT)
+        return f"{t[:start]}the {name}{t[start + len(BREED_SLOT):]}"
+    if t.endswith(("?", ".")):
+        return None
+
+    completion = TEMPLATE_COMPLETIONS.get(lowered)
+    if completion:
+        return completion.format(template=t, breed=name)
+    end = "." if lowered.startswith(("tell ", "give ")) else "?"
+    return f"{t} the {name}{end}"
+
+
+class _Ranked:
+    """One immutable ranking; swapped in whole so readers never see a partial one."""
+    __slots__ = ("keys", "key_question", "key_score", "cache")
+
+    def __init__(self, keys, key_question, key_score, cache):
+        self.keys = keys
+        self.key_question = key_question
+        self.key_score = key_score
+        self.cache = cache
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.questions: list[str] = []
+        self.question_template: list[str] = []
+        self.question_breed: list[str] = []        # "" for generic questions
+        self._by_text: dict[str, int] = {}
+        self._template_patterns: list[tuple[re.Pattern, str]] = []
+        self._breeds: list[str] = []
+        self._breed_pattern: re.Pattern | None = None
+        self._key_list: list[tuple[str, int, bool]] = []
+        self._ranked: _Ranked | None = None
+
+        # (template, breed) → count: `totals` from Mongo, `pending` not yet written
+        self.totals: Counter = Counter()
+        self.pending: Counter = Counter()
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------
+    # Build
+    # -------------------------------------------------
+    def build(self, templates: list[str], breeds):
+        questions, q_template, q_breed = [], [], []
+
+        def add(text, template, breed):
+            questions.append(text)
+            q_template.append(template)
+            q_breed.append(breed)
+
+        for template in templates or []:
+            template = template.strip()
+            if not template:
+                continue
+            expanded = [(expand(template, b), b) for b in breeds]
+            for text, breed in expanded:
+                if text:
+                    add(text, template, breed)
+            # Open templates ("Tell me the height of") only make sense completed
+            if template.endswith(("?", ".")):
+                add(template, template, "")
+
+        keys = []
+        for qid, text in enumerate(questions):
+            norm = normalize(text)
+            keys.append((norm, qid, True))
+            for m in re.finditer(r" (?=\S)", norm):
+                keys.append((norm[m.end():], qid, False))
+        keys.sort()
+
+        self.questions, self.question_template, self.question_breed = questions, q_template, q_breed
+        self._by_text = {normalize(q): i for i, q in enumerate(questions)}
+        # Most specific (longest) template first
+        self._template_patterns = [(_pattern(t), t) for t in sorted(set(q_template), key=len, reverse=True)]
+        # Longest first so "german shepherd" wins over "shepherd"
+        self._breeds = sorted(breeds, key=len, reverse=True)
+        # Whole words only, so "pugnacious" doesn't count as a pug
+        self._breed_pattern = (re.compile(r"\b(?:" + "|".join(re.escape(b) for b in self._breeds) + r")\b")
+                               if self._breeds else None)
+        self._key_list = keys
+        self.rank()
+        print(f"🔹 Suggest index: {len(questions)} questions, {len(keys)} keys")
+
+    def rank(self):
+        templates, breeds = Counter(), Counter()
+        for (template, breed), n in self.totals.items():
+            templates[template] += n
+            breeds[breed] += n
+
+        q_score = [
+            EXACT_WEIGHT * math.log1p(self.totals[(t, b)])
+            + TEMPLATE_WEIGHT * math.log1p(templates[t])
+            + (BREED_WEIGHT * math.log1p(breeds[b]) if b else 0.0)
+            for t, b in zip(self.question_template, self.question_breed)
+        ]
+
+        keys = [k for k, _, _ in self._key_list]
+        key_question = [qid for _, qid, _ in self._key_list]
+        # Shorter questions win ties
+        key_score = [
+            q_score[qid] + (START_BONUS if start else 0.0) - len(self.questions[qid]) * 1e-4
+            for _, qid, start in self._key_list
+        ]
+
+        cache: dict[str, list[int]] = {}
+        for i in sorted(range(len(keys)), key=key_score.__getitem__, reverse=True):
+            key = keys[i]
+            for n in range(min(SUGGEST_CACHE_CHARS, len(key)) + 1):
+                bucket = cache.setdefault(key[:n], [])
+                if len(bucket) < SUGGEST_CACHE_DEPTH:
+                    bucket.append(i)
+
+        self._ranked = _Ranked(keys, key_question, key_score, cache)
+
+    # -------------------------------------------------
+    # Query
+    # -------------------------------------------------
+    def suggest(self, query: str, limit: int = 8) -> list[dict]:
+        ranked = self._ranked
+        if ranked is None:
+            return []
+        q = normalize(query)
+
+        if len(q) <= SUGGEST_CACHE_CHARS:
+            candidates = ranked.cache.get(q, [])
+        else:
+            lo = bisect_left(ranked.keys, q)
+            hi = bisect_left(ranked.keys, q + "\uffff", lo)
+            # Extra rows: several keys of one question can share a prefix
+            candidates = heapq.nlargest(limit * 2, range(lo, hi), key=ranked.key_score.__getitem__)
+
+        results, seen = [], set()
+        for i in candidates:
+            qid = ranked.key_question[i]
+            if qid in seen:
+                continue
+            seen.add(qid)
+            results.append({
+                "question": self.questions[qid],
+                "breed": self.question_breed[qid] or None,
+                "score": round(ranked.key_score[i], 3)
+            })
+            if len(results) == limit:
+                break
+        return results
+
+    # -------------------------------------------------
+    # Popularity
+    # -------------------------------------------------
+    def observe(self, message: str):
+        """Count a user's chat message against the (template, breed) it asks about."""
+        norm = normalize(message)
+        if not norm:
+            return
+
+        qid = self._by_text.get(norm)
+        if qid is not None:
+            key = (self.question_template[qid], self.question_breed[qid])
+        else:
+            template = next((t for pattern, t in self._template_patterns if pattern.match(norm)), "")
+            match = self._breed_pattern.search(norm) if self._breed_pattern else None
+            breed = match.group(0) if match else ""
+            if not template and not breed:
+                return
+            key = (template, breed)
+
+        with self._lock:
+            self.pending[key] += 1
+
+    async def refresh(self):
+        """Write pending counts, re-read everyone's, re-rank."""
+        with self._lock:
+            pending, self.pending = self.pending, Counter()
+
+        if pending:
+            try:
+                await suggest_popularity.bulk_write([
+                    UpdateOne({"_id": f"{t}|{b}"}, {"$set": {"template": t, "breed": b}, "$inc": {"count": n}},
+                              upsert=True)
+                    for (t, b), n in pending.items()
+                ], ordered=False)
+            except Exception as e:
+                print(f"⚠️ Suggest popularity not saved: {e}")
+                with self._lock:
+                    self.pending.update(pending)
+
+        totals = Counter()
+        async for doc in suggest_popularity.find({}, {"template": 1, "breed": 1, "count": 1}):
+            totals[(doc.get("template", ""), doc.get("breed", ""))] += doc.get("count", 0)
+
+        if totals != self.totals:
+            self.totals = totals
+            await asyncio.to_thread(self.rank)
+
+
+suggest_index = SuggestIndex()
+
+
+async def popularity_loop():
+    while True:
+        try:
+            await suggest_index.refresh()
+        except Exception as e:
+            print(f"⚠️ Suggest refresh failed: {e}")
+        await asyncio.sleep(SUGGEST_REFRESH_SECONDS)
+
+
+register_gauge("dogbreed_suggest_questions", "Fully formed questions in the typeahead index",
+               lambda: len(suggest_index.questions))
@@ -0,0 +1,187 @@
+# backend/utils/tracing.py
+"""
+Per-stage request tracing.
+
+Code wraps the expensive parts of a request in `with stage("name"):`.
+TracingMiddleware gives every HTTP request its own trace, reports the
+stages of that request in a `Server-Timing` response header, and every
+stage (traced request or not) is folded into a latency histogram.
+
+`render_prometheus()` emits the stage and request histograms plus any
+gauges registered with `register_gauge()` in Prometheus text format
+(served on GET /metrics).
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.mongo_monitor import current_route
+
+STAGE_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+# {stage: total ms} for the request being served; None outside a request
+_trace: contextvars.ContextVar[dict | None] = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    __slots__ = ("count", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(STAGE_BUCKETS_MS)
+
+    def observe(self, ms: float):
+        self.count += 1
+        self.total += ms
+        for i, bound in enumerate(STAGE_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+
+
+_lock = threading.Lock()
+_stages: dict[str, Histogram] = {}
+_requests: dict[tuple[str, str], Histogram] = {}
+_gauges: list[tuple[str, str, object]] = []
+
+
+def _observe(table: dict, key, ms: float):
+    with _lock:
+        hist = table.get(key)
+        if hist is None:
+            hist = table[key] = Histogram()
+        hist.observe(ms)
+
+
+def record(name: str, ms: float):
+    """Record a stage duration measured elsewhere."""
+    trace = _trace.get()
+    if trace is not None:
+        trace[name] = trace.get(name, 0.0) + ms
+    _observe(_stages, name, ms)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block as stage `name`. Works in sync and async code and in
+    threads started with asyncio.to_thread / run_in_threadpool, which copy
+    the request context (the trace dict itself is shared, not copied).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def register_gauge(name: str, help_text: str, fn):
+    """
+    `fn()` is called at scrape time and returns either a number or a list
+    of (labels dict, number) pairs.
+    """
+    _gauges.append((name, help_text, fn))
+
+
+def server_timing(trace: dict, total_ms: float) -> str:
+    parts = [f"{name};dur={ms:.1f}" for name, ms in trace.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: starts a trace per HTTP request, adds the
+    Server-Timing header and records the request duration per route.
+    Must sit inside RouteContextMiddleware so `current_route` is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace: dict = {}
+        token = _trace.set(trace)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Stages that run while a StreamingResponse body is being sent
+                # only make it into the histograms
+                value = server_timing(trace, (time.perf_counter() - start) * 1000)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _trace.reset(token)
+            ms = (time.perf_counter() - start) * 1000
+            _observe(_requests, (current_route.get(), str(status)), ms)
+
+
+# -------------------------------------------------
+# Prometheus exposition
+# -------------------------------------------------
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, labels: dict, hist: Histogram) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, n in zip(STAGE_BUCKETS_MS, hist.buckets):
+        cumulative += n
+        le = "+Inf" if bound == float("inf") else str(bound / 1000)
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labels)} {hist.total / 1000}")
+    lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+    return lines
+
+
+def render_prometheus() -> str:
+    lines = [
+        "# HELP dogbreed_stage_duration_seconds Time spent per request stage",
+        "# TYPE dogbreed_stage_duration_seconds histogram"
+    ]
+    with _lock:
+        for name, hist in sorted(_stages.items()):
+            lines += _histogram_lines("dogbreed_stage_duration_seconds", {"stage": name}, hist)
+
+        lines += [
+            "# HELP dogbreed_request_duration_seconds HTTP request latency per route",
+            "# TYPE dogbreed_request_duration_seconds histogram"
+        ]
+        for (route, status), hist in sorted(_requests.items()):
+            lines += _histogram_lines(
+                "dogbreed_request_duration_seconds", {"route": route, "status": status}, hist
+            )
+
+    for name, help_text, fn in _gauges:
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"⚠️ Gauge {name} failed: {e}")
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        samples = value if isinstance(value, list) else [({}, value)]
+        for labels, v in samples:
+            lines.append(f"{name}{_labels(labels)} {float(v)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,170 @@
+# backend/utils/uploads.py
+"""
+Image upload handling for /api/predict and /api/chat.
+
+* UploadLimitMiddleware rejects multipart requests over the cap with 413:
+  up front when Content-Length says so, otherwise as soon as the streamed
+  body crosses it (before Starlette spools the rest to disk)
+* read_image_upload() reads the UploadFile in chunks under the same cap and
+  sniffs the real format from the magic bytes (415 if it isn't an image
+  we accept)
+* downscale_image() decodes once and re-encodes a small JPEG that both the
+  Gemini dog check and the local classifier use
+"""
+import io
+import json
+import os
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Room for the multipart boundaries and the other form fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_CHUNK_BYTES = 256 * 1024
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "512"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+
+# magic prefix → MIME type
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    for magic, mime in SIGNATURES:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+async def read_image_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> tuple[bytes, str]:
+    """Return (bytes, sniffed MIME type); 413 over the cap, 415 for non-images."""
+    head = await file.read(UPLOAD_CHUNK_BYTES)
+    mime = sniff_image_type(head)
+    if mime is None:
+        raise HTTPException(status_code=415, detail="Unsupported image format (use JPEG, PNG, WebP, GIF or BMP)")
+
+    buf = bytearray(head)
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Image larger than {max_bytes} bytes")
+
+    if len(buf) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image larger than {max_bytes} bytes")
+    return bytes(buf), mime
+
+
+def check_image_bytes(data: bytes, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """read_image_upload() for bytes already in hand (e.g. a WebSocket frame)."""
+    if len(data) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image larger than {max_bytes} bytes")
+    mime = sniff_image_type(data[:UPLOAD_CHUNK_BYTES])
+    if mime is None:
+        raise HTTPException(status_code=415, detail="Unsupported image format (use JPEG, PNG, WebP, GIF or BMP)")
+    return mime
+
+
+@dataclass
+class PreparedImage:
+    data: bytes          # downscaled JPEG
+    mime_type: str       # always image/jpeg after re-encoding
+    source_type: str     # what was uploaded
+    source_bytes: int
+    size: tuple[int, int]
+
+
+def downscale_image(data: bytes, source_type: str, max_side: int = VISION_MAX_SIDE) -> PreparedImage:
+    """
+    Decode once, fix EXIF orientation, shrink so the longest side is at most
+    `max_side` and re-encode as JPEG. CPU-bound: call via asyncio.to_thread.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        width, height = img.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise HTTPException(status_code=413, detail=f"Image has more than {MAX_IMAGE_PIXELS} pixels")
+
+        # JPEG can decode straight at a reduced scale, skipping most of the IDCT work
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {e}")
+
+    img.thumbnail((max_side, max_side))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=VISION_JPEG_QUALITY)
+    return PreparedImage(out.getvalue(), "image/jpeg", source_type, len(data), img.size)
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI: caps multipart request bodies at MAX_UPLOAD_BYTES (+ form overhead)."""
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers", []))
+        if not headers.get(b"content-type", b"").startswith(b"multipart/"):
+            return await self.app(scope, receive, send)
+
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Stop reading; the app sees a disconnect and we answer 413
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+
+        if exceeded and not started:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Upload larger than {MAX_UPLOAD_BYTES} bytes"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
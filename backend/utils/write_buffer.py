@@ -0,0 +1,256 @@
+# backend/utils/write_buffer.py
+import asyncio
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from utils.mongo import chat_history
+from utils.chat_store import (
+    STORAGE_BUCKETS, STORAGE_COMPACTING,
+    reserve_positions, append_to_buckets, settle_documents
+)
+from utils.tracing import register_gauge
+
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "500"))
+CHAT_WRITE_FLUSH_MS = int(os.getenv("CHAT_WRITE_FLUSH_MS", "250"))
+# Messages queued beyond this are refused with 503 until a flush catches up
+CHAT_WRITE_MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", "10000"))
+# A message the server rejects this many times (e.g. too large) is dropped
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS", "5"))
+
+
+class ChatWriteBuffer:
+    """
+    Write-behind buffer for chat_history.
+
+    Messages are queued in arrival order and flushed, either when
+    `max_batch` messages are pending or every `flush_interval` seconds:
+    each session's messages first reserve their positions (which also
+    tells the session's layout), then documents go out with one ordered
+    insert_many and bucketed messages with one push per bucket. Flushes
+    are serialized, so messages of a session land in order.
+
+    A reservation is remembered per message, so a message whose write
+    failed is retried into the same place and never counted twice.
+
+    At most `max_pending` messages are held; `add` refuses more with a 503.
+    A message the database rejects `max_attempts` times is dropped so it
+    can't block the ones queued behind it.
+    """
+
+    def __init__(self, max_batch: int = CHAT_WRITE_BATCH_SIZE, flush_interval: float = CHAT_WRITE_FLUSH_MS / 1000,
+                 max_pending: int = CHAT_WRITE_MAX_PENDING, max_attempts: int = CHAT_WRITE_MAX_ATTEMPTS):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        self._pending: list[dict] = []
+        self._attempts: dict[ObjectId, int] = {}
+        # _id → (storage, position) of messages reserved but not yet written
+        self._reserved: dict[ObjectId, tuple[str, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._stopping: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._eager: asyncio.Task | None = None
+
+    # -------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------
+    def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Signal instead of cancelling: a flush in progress finishes its
+        # batch rather than losing it halfway through the insert
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._eager is not None:
+            await self._eager
+            self._eager = None
+        # Drain whatever is still queued before the process exits
+        await self.flush()
+        if self._pending:
+            print(f"⚠️ Chat write buffer: {len(self._pending)} messages not written at shutdown")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    # -------------------------------------------------
+    # Producer side
+    # -------------------------------------------------
+    def add(self, docs: list[dict]):
+        if len(self._pending) + len(docs) > self.max_pending:
+            raise HTTPException(status_code=503, detail="Chat messages are backed up, retry shortly")
+
+        for doc in docs:
+            # _id assigned up front so a retried batch can't double insert
+            doc.setdefault("_id", ObjectId())
+            doc.setdefault("created_at", datetime.utcnow())
+        self._pending.extend(docs)
+
+        # Size threshold: flush now instead of waiting for the next tick
+        if len(self._pending) >= self.max_batch and self._task is not None:
+            if self._eager is None or self._eager.done():
+                self._eager = asyncio.create_task(self.flush())
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # -------------------------------------------------
+    # Flush
+    # -------------------------------------------------
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                # Anything not in `written` goes back in front of the queue,
+                # also when the flush is cancelled mid-write; preset _ids make
+                # re-inserting an already written message a no-op and pushes
+                # are idempotent, so nothing is written twice
+                written: set[ObjectId] = set()
+
+                try:
+                    # Sessions whose reservation fails wait for the next flush
+                    await self._reserve(batch)
+                    reserved = [d for d in batch if d["_id"] in self._reserved]
+                    bucketed = [d for d in reserved if self._reserved[d["_id"]][0] == STORAGE_BUCKETS]
+                    documents = [d for d in reserved if self._reserved[d["_id"]][0] != STORAGE_BUCKETS]
+
+                    if bucketed:
+                        written.update(await self._append_buckets(bucketed))
+
+                    inserted, handled = await self._insert(documents) if documents else ([], 0)
+                    written.update(d["_id"] for d in documents[:handled])
+
+                    # Reserved while compacting: the switch may have happened since
+                    compacting = {d["session_id"] for d in inserted
+                                  if self._reserved[d["_id"]][0] == STORAGE_COMPACTING}
+                    if compacting:
+                        await settle_documents(list(compacting))
+                except asyncio.CancelledError:
+                    self._requeue(batch, written)
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Chat write buffer flush failed, will retry: {e}")
+
+                # Go on while the batch made progress, else retry next tick
+                if self._requeue(batch, written) == len(batch):
+                    break
+
+    def _requeue(self, batch: list[dict], written: set) -> int:
+        """Put the unwritten part of `batch` back in front; returns how many."""
+        for _id in written:
+            self._reserved.pop(_id, None)
+        unwritten = [d for d in batch if d["_id"] not in written]
+        self._pending[:0] = unwritten
+        return len(unwritten)
+
+    async def _reserve(self, batch: list[dict]):
+        """Reserve positions for the batch's messages that don't have one yet."""
+        per_session: dict[str, list[dict]] = {}
+        for doc in batch:
+            if doc["_id"] not in self._reserved:
+                per_session.setdefault(doc["session_id"], []).append(doc)
+
+        for session_id, docs in per_session.items():
+            try:
+                storage, first_pos = await reserve_positions(session_id, docs)
+            except Exception as e:
+                print(f"⚠️ Chat write buffer: could not reserve {len(docs)} messages for {session_id}, "
+                      f"will retry: {e}")
+                continue
+            for offset, doc in enumerate(docs):
+                self._reserved[doc["_id"]] = (storage, first_pos + offset)
+
+    async def _append_buckets(self, docs: list[dict]) -> list[ObjectId]:
+        """Push reserved messages into their buckets; returns the _ids written."""
+        # Runs of consecutive positions per session, usually one per session
+        runs: list[list[dict]] = []
+        current: dict[str, list[dict]] = {}
+        for doc in docs:
+            run = current.get(doc["session_id"])
+            if run and self._reserved[run[-1]["_id"]][1] == self._reserved[doc["_id"]][1] - 1:
+                run.append(doc)
+            else:
+                current[doc["session_id"]] = [doc]
+                runs.append(current[doc["session_id"]])
+
+        written, failed = [], set()
+        for run in runs:
+            session_id = run[0]["session_id"]
+            if session_id in failed:
+                continue  # keep the session's later runs behind the failed one
+            try:
+                await append_to_buckets(session_id, run[0]["user_id"], run, self._reserved[run[0]["_id"]][1])
+                written.extend(d["_id"] for d in run)
+            except Exception as e:
+                # Retried at the same positions; the push is idempotent
+                failed.add(session_id)
+                print(f"⚠️ Chat write buffer: {len(run)} messages for {session_id} deferred: {e}")
+        return written
+
+    async def _insert(self, batch: list[dict]) -> tuple[list[dict], int]:
+        """
+        Insert `batch` in order. Returns (inserted docs, n) where the first n
+        docs of the batch are done with: written now, written by an earlier
+        attempt, or dropped as undeliverable.
+        """
+        try:
+            await chat_history.insert_many(batch, ordered=True)
+            for doc in batch:
+                self._attempts.pop(doc["_id"], None)
+            return batch, len(batch)
+        except BulkWriteError as e:
+            written = e.details.get("nInserted", 0)
+            inserted = batch[:written]
+            handled = written
+            for err in e.details.get("writeErrors", []):
+                if err.get("index") != handled:
+                    continue
+                if err.get("code") == 11000:
+                    # A duplicate _id means an earlier attempt already wrote it
+                    handled += 1
+                elif self._give_up(batch[handled], err.get("errmsg", "")):
+                    handled += 1
+            for doc in batch[:handled]:
+                self._attempts.pop(doc["_id"], None)
+            if handled < len(batch):
+                print(f"⚠️ Chat write buffer: {len(batch) - handled} messages deferred: {e}")
+            return inserted, handled
+        except Exception as e:
+            print(f"⚠️ Chat write buffer flush failed, will retry: {e}")
+            return [], 0
+
+    def _give_up(self, doc: dict, reason: str) -> bool:
+        """Count a rejection of `doc`; True once it should be dropped."""
+        attempts = self._attempts.get(doc["_id"], 0) + 1
+        if attempts < self.max_attempts:
+            self._attempts[doc["_id"]] = attempts
+            return False
+        self.dropped += 1
+        print(f"⚠️ Chat write buffer: dropped message {doc['_id']} of session {doc['session_id']} "
+              f"after {attempts} attempts: {reason}")
+        return True
+
+
+chat_write_buffer = ChatWriteBuffer()
+
+register_gauge("dogbreed_chat_write_buffer_pending", "Chat messages waiting to be flushed",
+               lambda: chat_write_buffer.pending)
+register_gauge("dogbreed_chat_write_buffer_dropped", "Chat messages dropped after repeated write errors",
+               lambda: chat_write_buffer.dropped)
@@ -27,6 +27,16 @@ export default function Chat() {
     const fileInputRef = useRef(null);
     const chatEndRef = useRef(null);
 
+    // Cursor of the page before the oldest loaded message (null: all loaded)
+    const [olderCursor, setOlderCursor] = useState(null);
+    const [loadingOlder, setLoadingOlder] = useState(false);
+    // Set while prepending older messages so the view doesn't jump to the bottom
+    const keepScrollRef = useRef(false);
+
+    // Chat WebSocket of the current session and the turn waiting on it
+    const socketRef = useRef(null);
+    const pendingTurnRef = useRef(null);
+
     // Load or create initial session on mount
     useEffect(() => {
         const initializeSession = async () => {
@@ -63,19 +73,116 @@ export default function Chat() {
         initializeSession();
     }, [user.id]);
 
+    const toChatMessage = (chat) => ({
+        role: chat.role === "user" ? "user" : "bot",
+        content: chat.message,
+        // Stored attachments come back as backend-relative thumbnail URLs
+        image: chat.image?.startsWith("/api/")
+            ? `${import.meta.env.VITE_BACKEND_URL}${chat.image}`
+            : chat.image || null
+    });
+
+    // Keep the history sidebar's preview in step with messages saved over
+    // the socket (the server has already stored them), newest session first
+    const updateSessionPreview = (sessionId, saved) =>
+        setSessions((prev) => {
+            const session = prev.find((s) => s._id === sessionId);
+            if (!session || !saved.length) return prev;
+            const last = saved[saved.length - 1];
+            return [
+                {
+                    ...session,
+                    last_message: last.message,
+                    updated_at: last.created_at,
+                    message_count: (session.message_count || 0) + saved.length
+                },
+                ...prev.filter((s) => s._id !== sessionId)
+            ];
+        });
+
+    // One WebSocket per open session: the answer streams back over it and
+    // the backend saves both messages itself (no extra chat-history calls)
+    useEffect(() => {
+        if (!currentSessionId) return;
+
+        const wsBase = import.meta.env.VITE_BACKEND_URL.replace(/^http/, "ws");
+        const ws = new WebSocket(
+            `${wsBase}/api/chat/ws/${currentSessionId}?user_id=${encodeURIComponent(user.id)}`
+        );
+
+        ws.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+
+            // Pushed by the server: messages sent from another tab
+            if (data.type === "messages") {
+                setMessages((prev) => [...prev, ...data.messages.map(toChatMessage)]);
+                updateSessionPreview(currentSessionId, data.messages);
+                return;
+            }
+
+            const turn = pendingTurnRef.current;
+            if (!turn || data.id !== turn.id) return;
+            if (data.type === "chunk") {
+                streamReply(data.text);
+            } else if (data.type === "done") {
+                pendingTurnRef.current = null;
+                updateSessionPreview(currentSessionId, data.messages);
+                turn.resolve(data);
+            } else if (data.type === "error") {
+                pendingTurnRef.current = null;
+                turn.reject(new Error(data.detail));
+            }
+        };
+
+        ws.onclose = () => {
+            if (socketRef.current === ws) socketRef.current = null;
+            const turn = pendingTurnRef.current;
+            if (turn) {
+                pendingTurnRef.current = null;
+                turn.reject(new Error("Chat connection closed"));
+            }
+        };
+
+        socketRef.current = ws;
+        return () => ws.close();
+    }, [currentSessionId, user.id]);
+
+    // Append a streamed piece of the bot's answer
+    const streamReply = (text) =>
+        setMessages((prev) => {
+            const last = prev[prev.length - 1];
+            if (last?.streaming) {
+                return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+            }
+            return [...prev, { role: "bot", content: text, streaming: true }];
+        });
+
+    // Replace the streamed answer (if any) with the final one
+    const finishReply = (content) =>
+        setMessages((prev) => [...prev.filter((m) => !m.streaming), { role: "bot", content }]);
+
+    const sendOverSocket = (ws, text, file) =>
+        new Promise((resolve, reject) => {
+            const id = `${Date.now()}`;
+            pendingTurnRef.current = { id, resolve, reject };
+            ws.send(JSON.stringify({ type: "message", message: text, image: Boolean(file), id }));
+            // The image follows as one binary frame
+            if (file) ws.send(file);
+        });
+
     // Load messages for a specific session
     const loadSessionMessages = async (sessionId) => {
+        setOlderCursor(null);
         try {
-            const res = await api.get(`/api/chat-sessions/${sessionId}/messages`);
+            // Only the newest page; older ones load on demand (loadOlderMessages)
+            const res = await api.get(`/api/chat-sessions/${sessionId}/messages`, {
+                params: { newest: true },
+            });
             const history = res.data;
+            setOlderCursor(res.headers["x-next-cursor"] || null);
 
             if (history && history.length > 0) {
-                const formattedMessages = history.map(chat => ({
-                    role: chat.role === "user" ? "user" : "bot",
-                    content: chat.message,
-                    image: chat.image || null
-                }));
-                setMessages(formattedMessages);
+                setMessages(history.map(toChatMessage));
             } else {
                 // Show welcome message if no messages
                 setMessages([
@@ -107,6 +214,7 @@ export default function Chat() {
             });
 
             setCurrentSessionId(res.data.session_id);
+            setOlderCursor(null);
             setMessages([
                 {
                     role: "bot",
@@ -160,8 +268,35 @@ export default function Chat() {
         }
     };
 
-    // Auto-scroll to bottom when messages change
+    // Prepend the page before the oldest loaded message
+    const loadOlderMessages = async () => {
+        if (!olderCursor || loadingOlder) return;
+        setLoadingOlder(true);
+        try {
+            const res = await api.get(`/api/chat-sessions/${currentSessionId}/messages`, {
+                params: { before: olderCursor },
+            });
+            keepScrollRef.current = true;
+            setMessages((prev) => [...res.data.map(toChatMessage), ...prev]);
+            setOlderCursor(res.headers["x-next-cursor"] || null);
+        } catch (err) {
+            console.error("Failed to load older messages:", err);
+        } finally {
+            setLoadingOlder(false);
+        }
+    };
+
+    // Scrolling to the top of the chat pulls in the previous page
+    const handleChatScroll = (e) => {
+        if (e.currentTarget.scrollTop < 40) loadOlderMessages();
+    };
+
+    // Auto-scroll to bottom when messages change (not when older ones are prepended)
     useEffect(() => {
+        if (keepScrollRef.current) {
+            keepScrollRef.current = false;
+            return;
+        }
         chatEndRef.current?.scrollIntoView({ behavior: "smooth" });
     }, [messages]);
 
@@ -185,13 +320,48 @@ export default function Chat() {
             image: imageFile ? URL.createObjectURL(imageFile) : null,
         };
 
+        const ws = socketRef.current;
+        if (ws && ws.readyState === WebSocket.OPEN && !pendingTurnRef.current) {
+            const text = input;
+            const file = imageFile;
+
+            setMessages((prev) => [...prev, userMessage]);
+            setInput("");
+            setImageFile(null);
+            setLoading(true);
+            if (fileInputRef.current) fileInputRef.current.value = "";
+
+            try {
+                const done = await sendOverSocket(ws, text, file);
+                finishReply(done.answer);
+            } catch (err) {
+                console.error(err);
+                finishReply("Something went wrong. Please try again.");
+            } finally {
+                setLoading(false);
+            }
+            return;
+        }
+
+        // Fallback without a socket: three HTTP calls per turn
+
+        // Persist the image itself (as a data URL) so the backend can store it
+        const imageDataUrl = imageFile
+            ? await new Promise((resolve, reject) => {
+                const reader = new FileReader();
+                reader.onload = () => resolve(reader.result);
+                reader.onerror = reject;
+                reader.readAsDataURL(imageFile);
+            })
+            : null;
+
         // Save to backend with session_id
         await api.post("/api/chat-history", {
             user_id: user.id,
             session_id: currentSessionId,
             role: "user",
             message: userMessage.content,
-            image: userMessage.image,
+            image: imageDataUrl,
         });
 
         setMessages((prev) => [...prev, userMessage]);
@@ -204,6 +374,10 @@ export default function Chat() {
             const formData = new FormData();
             if (input) formData.append("message", input);
             if (imageFile) formData.append("image", imageFile);
+            // Lets the backend keep conversation context (breed, earlier turns)
+            formData.append("session_id", currentSessionId);
+            // Uploads join this user's "similar dogs" index
+            formData.append("user_id", user.id);
 
             const res = await api.post("/api/chat/message", formData, {
                 headers: { "Content-Type": "multipart/form-data" },
@@ -374,6 +548,7 @@ export default function Chat() {
                     initial={{ opacity: 0, scale: 0.98 }}
                     animate={{ opacity: 1, scale: 1 }}
                     transition={{ delay: 0.2 }}
+                    onScroll={handleChatScroll}
                     className="flex-1 bg-white/60 backdrop-blur-xl shadow-2xl rounded-3xl p-6 overflow-y-auto space-y-5 border border-white/20 relative"
                     style={{
                         backgroundImage: `url(${chatbotBackground})`,
@@ -400,6 +575,17 @@ export default function Chat() {
                         </motion.div>
                     ) : (
                         <>
+                            {olderCursor && (
+                                <div className="flex justify-center">
+                                    <button
+                                        onClick={loadOlderMessages}
+                                        disabled={loadingOlder}
+                                        className="px-4 py-1.5 text-sm text-gray-600 bg-white/80 rounded-full shadow hover:bg-white transition disabled:opacity-50"
+                                    >
+                                        {loadingOlder ? "Loading..." : "Load earlier messages"}
+                                    </button>
+                                </div>
+                            )}
                             {messages.map((msg, idx) => (
                                 <motion.div
                                     key={idx}
@@ -11,12 +11,23 @@ export default function Orders() {
     const navigate = useNavigate();
     const [orders, setOrders] = useState([]);
     const [loading, setLoading] = useState(true);
+    // X-Next-Cursor of the last page loaded (null: no older orders)
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    // Orders are paginated newest first; pass the cursor as `before` for older ones
+    const fetchPage = async (before) => {
+        const res = await api.get(`/api/orders/user/${user.id}`, {
+            params: before ? { before } : {},
+        });
+        setNextCursor(res.headers["x-next-cursor"] || null);
+        return res.data;
+    };
 
     useEffect(() => {
         const fetchOrders = async () => {
             try {
-                const res = await api.get(`/api/orders/user/${user.id}`);
-                setOrders(res.data);
+                setOrders(await fetchPage(null));
             } catch (err) {
                 console.error("Failed to fetch orders", err);
             } finally {
@@ -27,6 +38,18 @@ export default function Orders() {
         fetchOrders();
     }, [user]);
 
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const older = await fetchPage(nextCursor);
+            setOrders((prev) => [...prev, ...older]);
+        } catch (err) {
+            console.error("Failed to fetch more orders", err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     if (loading) {
         return (
             <Loader text="Fetching your orders..." />
@@ -275,6 +298,20 @@ export default function Orders() {
                         </motion.div>
                     ))}
                 </div>
+
+                {nextCursor && (
+                    <div className="flex justify-center mt-10">
+                        <motion.button
+                            whileHover={{ scale: 1.05 }}
+                            whileTap={{ scale: 0.95 }}
+                            onClick={loadMore}
+                            disabled={loadingMore}
+                            className="px-6 py-2 bg-gradient-to-r from-primary to-purple-600 text-white rounded-xl font-semibold shadow-md hover:shadow-lg transition disabled:opacity-60"
+                        >
+                            {loadingMore ? "Loading..." : "Load older orders"}
+                        </motion.button>
+                    </div>
+                )}
             </div>
         </div>
     );